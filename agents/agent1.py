@@ -10,7 +10,7 @@ def extract_direction(response):
             return d
     return None
 
-def run(grid_size=6, image_path="data/grid.png", max_steps=30, agent_start=None, goal_pos=None):
+def run(grid_size=6, image_path=None, max_steps=30, agent_start=None, goal_pos=None):
     env = GridWorld(grid_size)
     if agent_start and goal_pos:
         env.initialize_agents_goals_custom(agents=[agent_start], goals=[goal_pos])
@@ -23,10 +23,10 @@ def run(grid_size=6, image_path="data/grid.png", max_steps=30, agent_start=None,
     step = 0
 
     while agent_pos != goal_pos and step < max_steps:
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
         valid_actions = env.get_valid_actions(agent_pos)
         prompt = build_prompt_single(agent_pos, goal_pos, valid_actions, grid_size)
-        response = send_image_to_model_openai(image_path, prompt, temperature=0.0000001)
+        response = send_image_to_model_openai(image, prompt, temperature=0.0000001)
 
         direction = extract_direction(response)
         if not direction:
@@ -3,7 +3,6 @@ from core.prompt import build_yesno_code_prompt_single
 from core.request import send_image_to_model_openai_logprobs
 from core.plot import plot_grid
 from core.utils import shortest_path_length
-import time
 
 def extract_yes_logprob(logprobs):
     """Extract logprob for the token 'yes' from OpenAI response"""
@@ -17,7 +16,7 @@ def extract_yes_logprob(logprobs):
 def run(
     obstacles={(2, 2), (3, 3), (1, 4)},
     grid_size=6,
-    image_path="data/grid.png",
+    image_path=None,
     max_steps=30,
     agent_start: tuple[int, int] = None,
     goal_pos: tuple[int, int] = None
@@ -38,7 +37,7 @@ def run(
     failed = False
 
     while agent_pos != goal_pos and step < max_steps:
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
 
         visits[agent_pos] = visits.get(agent_pos, 0) + 1
         valid_actions = env.get_valid_actions(agent_pos)
@@ -52,12 +51,10 @@ def run(
             prompt = build_yesno_code_prompt_single(
                 agent_pos, goal_pos, grid_size, obstacles, direction, memory, visits
             )
-            time.sleep(0.5)  # Avoid rate limiting
-            sentence, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
+            sentence, logprobs = send_image_to_model_openai_logprobs(image, prompt, temperature=0.0000001)
             logprob_yes = extract_yes_logprob(logprobs)
             action_scores[direction] = logprob_yes
             print(f"{direction.upper():5} → logprob(yes): {logprob_yes:.3f}")
-        time.sleep(1)
 
         if not action_scores:
             print("No direction could be chosen.")
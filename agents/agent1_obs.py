@@ -13,7 +13,7 @@ def extract_direction(response):
 def run(
     obstacles={(2, 2), (3, 3), (1, 4)},
     grid_size=6,
-    image_path="data/grid.png",
+    image_path=None,
     max_steps=30,
     agent_start: tuple[int, int] = None,
     goal_pos: tuple[int, int] = None
@@ -34,7 +34,7 @@ def run(
     failed = False
 
     while agent_pos != goal_pos and step < max_steps:
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
 
         # Update visits count
         visits[agent_pos] = visits.get(agent_pos, 0) + 1
@@ -48,7 +48,7 @@ def run(
         # )
         print(f"Valid actions: {valid_actions}")
         # print(f"Prompt: {prompt}")
-        response = send_image_to_model_openai(image_path, prompt, temperature=0.0000001)
+        response = send_image_to_model_openai(image, prompt, temperature=0.0000001)
         print(f"Response: {response}")
 
         direction = extract_direction(response)
@@ -64,7 +64,7 @@ def select_action_ucg(logprobs_dict, visit_counts, state, c=2.0):
 def run(
     grid_size=6,
     obstacles={(2, 2), (3, 3), (1, 4)},
-    image_path="data/grid.png",
+    image_path=None,
     max_steps=30,
     prompt_mode="yesno",  # "multi" or "yesno"
     agent_start: tuple[int, int] = None,
@@ -87,13 +87,13 @@ def run(
     while agent_pos != goal_pos and step < max_steps:
         print(f"\n--- Step {step} ---")
         print(f"Agent position: {agent_pos}, Goal position: {goal_pos}")
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
         valid_actions = env.get_valid_actions(agent_pos)
         print(f"Valid actions: {valid_actions}")
 
         if prompt_mode == "multi":
             prompt = build_prompt_single_obs(agent_pos, goal_pos, valid_actions, grid_size, obstacles)
-            sentence, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
+            sentence, logprobs = send_image_to_model_openai_logprobs(image, prompt, temperature=0.0000001)
             print(f"Raw logprobs: {logprobs}")
             logprobs_dict = extract_logprob_multichoice(logprobs, valid_actions)
             print(f"Filtered unnormalized logprobs: {logprobs_dict}")
@@ -102,7 +102,7 @@ def run(
             logprobs_dict = {}
             for action in valid_actions:
                 prompt = build_yesno_prompt_single_obs(agent_pos, goal_pos, grid_size, obstacles, action)
-                sentence, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
+                sentence, logprobs = send_image_to_model_openai_logprobs(image, prompt, temperature=0.0000001)
                 print(f"Raw logprobs for '{action}': {logprobs}")
                 logprobs_dict[action] = extract_logprob_yesno(logprobs)
             print(f"Filtered unnormalized logprobs: {logprobs_dict}")
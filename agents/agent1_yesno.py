@@ -3,7 +3,8 @@ from core.prompt import build_yesno_prompt_single_obs_v2, build_yesno_prompt_sin
 from core.request import send_image_to_model_openai_logprobs
 from core.plot import plot_grid
 from core.utils import shortest_path_length
-import time
+from core.direction_scoring import DirectionAgreement, score_directions
+from functools import partial
 
 def extract_yes_logprob(logprobs):
     """Extract logprob for the token 'yes' from OpenAI response"""
@@ -17,10 +18,11 @@ def extract_yes_logprob(logprobs):
 def run(
     obstacles={(2, 2), (3, 3), (1, 4)},
     grid_size=6,
-    image_path="data/grid.png",
+    image_path=None,
     max_steps=30,
     agent_start: tuple[int, int] = None,
-    goal_pos: tuple[int, int] = None
+    goal_pos: tuple[int, int] = None,
+    scoring="yesno"
 ):
     env = GridWorld(grid_size, obstacles=obstacles)
     if agent_start and goal_pos:
@@ -36,9 +38,10 @@ def run(
     memory = []  # list of (r0, c0, direction, r1, c1)
     visits = {}
     failed = False
+    agreement = DirectionAgreement()
 
     while agent_pos != goal_pos and step < max_steps:
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
 
         visits[agent_pos] = visits.get(agent_pos, 0) + 1
         valid_actions = env.get_valid_actions(agent_pos)
@@ -46,21 +49,19 @@ def run(
         print(f"Agent: {agent_pos} → Goal: {goal_pos}")
         print(f"Valid actions: {valid_actions}")
 
-        # Ask yes/no for each valid direction
-        action_scores = {}
-        for direction in valid_actions:
-            prompt = build_yesno_prompt_single_obs_v2(
-                agent_pos, goal_pos, grid_size, obstacles, direction, memory, visits
-            )
-            # prompt = build_yesno_prompt_single_obs(
-            #     agent_pos, goal_pos, grid_size, obstacles, direction
-            # )
-            time.sleep(0.5)  # Avoid rate limiting
-            sentence, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
-            logprob_yes = extract_yes_logprob(logprobs)
-            action_scores[direction] = logprob_yes
-            print(f"{direction.upper():5} → logprob(yes): {logprob_yes:.3f}")
-        time.sleep(1)  # Give time for the model to process
+        # Ask yes/no for each valid direction (or all of them at once in multichoice mode)
+        action_scores, _ = score_directions(
+            valid_actions,
+            partial(send_image_to_model_openai_logprobs, image, temperature=0.0000001),
+            build_yesno_prompt_single_obs_v2,
+            extract_yes_logprob,
+            agent_pos,
+            mode=scoring,
+            agreement=agreement,
+            goal_pos=goal_pos, grid_size=grid_size, obstacles=obstacles, memory=memory, visits=visits
+        )
+        for direction, logprob in action_scores.items():
+            print(f"{direction.upper():5} → logprob({'yes' if scoring != 'multichoice' else direction}): {logprob:.3f}")
 
         if not action_scores:
             print("❌ No direction could be chosen.")
@@ -88,6 +89,8 @@ def run(
 
     optimal = shortest_path_length(init_agent_pos, goal_pos, env)
     failed = failed or step >= max_steps
+    if scoring == "both":
+        print(agreement.summary())
     return step, optimal, failed
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
-import time
 import json
-import csv
+from core.checkpoint import RowLog
 from core.environment import GridWorld
 from core.prompt import (
     build_target_selection_prompt,
@@ -8,6 +7,7 @@ from core.prompt import (
 )
 from core.request import send_image_to_model_openai_logprobs
 from core.plot import plot_grid_unassigned_labeled
+from core.telemetry import timed
 from core.utils import shortest_path_length, select_direction_opt
 from core.request import send_image_to_model_openai_logprobs
 import re
@@ -102,7 +102,6 @@ def select_target(
         target_memory=target_memory,
         distances=distances
     )
-    time.sleep(0.5)
     response, _ = send_image_to_model_openai_logprobs(image_path, prompt, model="gpt-4.1", temperature=0.0000001)
     print(f"Agent {agent_id} target selection response:\n{response}")
     target, explanation, reasoning = parse_target_response(response)
@@ -154,7 +153,6 @@ def select_direction(
             visits=visits,
             agent_targets=agent_targets
         )
-        time.sleep(0.5)
         response, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
         score = extract_yes_logprob(logprobs)
         scores[direction] = score
@@ -173,7 +171,7 @@ def select_direction(
     return best, explanation, logprobs_by_dir[best], scores
 
 def run(
-    image_path="data/grid.png",
+    image_path=None,
     log_path="data/agent_step_logs.csv",
     max_steps=30,
     config_path=None,
@@ -181,8 +179,14 @@ def run(
     grid_size=6,
     num_agents=3,
     agent_starts: list[tuple[int, int]] = None,
-    goal_positions: list[tuple[int, int]] = None
+    goal_positions: list[tuple[int, int]] = None,
+    checkpoint=None
 ):
+    """
+    Args:
+        checkpoint: optional core.checkpoint.EpisodeCheckpoint. State is saved after every agent's
+            decisions and at the end of every step; an existing checkpoint resumes the episode from there.
+    """
     if config_path:
         env = GridWorld(config_path)
         grid_size = env.size
@@ -203,7 +207,7 @@ def run(
     target_goals = [None for _ in range(num_agents)]
     step = 0
     collisions = 0
-    log_rows = []
+    log = RowLog(log_path)
 
     total_opt = sum(
         min([shortest_path_length(start, g, env) for g in env.goals if g is not None], default=0)
@@ -214,143 +218,175 @@ def run(
     print(f"Goal positions: {env.goals}")
     print(f"Obstacles: {obstacles}")
 
+    # Mid-step progress: the agent to decide next and the proposals made so far in this step
+    resume_step = None
+
+    def save_checkpoint(next_agent=None):
+        if checkpoint is None:
+            return
+        checkpoint.save({
+            "env_agents": env.agents, "env_goals": env.goals, "agent_positions": agent_positions,
+            "active": active, "visits": visits, "memories": memories, "target_memories": target_memories,
+            "target_goals": target_goals, "step": step, "collisions": collisions, "log": log.state(),
+            "total_opt": total_opt,
+            "in_step": None if next_agent is None else {
+                "next_agent": next_agent, "proposals": proposals, "proposed_goals": proposed_goals,
+            },
+        })
+
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        env.agents, env.goals = state["env_agents"], state["env_goals"]
+        agent_positions, active, visits = state["agent_positions"], state["active"], state["visits"]
+        memories, target_memories, target_goals = state["memories"], state["target_memories"], state["target_goals"]
+        step, collisions, total_opt = state["step"], state["collisions"], state["total_opt"]
+        log = RowLog(log_path, state["log"])
+        resume_step = state["in_step"]
+        print(f"Resuming from checkpoint at step {step}" + (f", agent {agent_ids[resume_step['next_agent']]}" if resume_step else ""))
+
     while any(active) and step < max_steps:
         print(f"\n--- Step {step} ---")
-        plot_grid_unassigned_labeled(env, image_path=image_path)
+        image = plot_grid_unassigned_labeled(env, image_path=image_path)
         proposals = agent_positions[:]
         proposed_goals = target_goals[:]
-
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            agent_id = agent_ids[i]
-            agent_pos = agent_positions[i]
-            visits[i][agent_pos] = visits[i].get(agent_pos, 0) + 1
-            other_infos = [
-                (agent_ids[j], agent_positions[j])
-                for j in range(num_agents)
-                if j != i and agent_positions[j] is not None
-            ]
-
-            distances = {
-                agent_ids[j]: [
-                    shortest_path_length(agent_positions[j], goal, env) if agent_positions[j] and goal else float("inf")
-                    for goal in env.goals
+        first_agent = 0
+        if resume_step is not None:
+            proposals, proposed_goals = resume_step["proposals"], resume_step["proposed_goals"]
+            first_agent = resume_step["next_agent"]
+            resume_step = None
+
+        with timed("directions"):
+            for i in range(first_agent, num_agents):
+                if not active[i] or agent_positions[i] is None:
+                    continue
+
+                agent_id = agent_ids[i]
+                agent_pos = agent_positions[i]
+                visits[i][agent_pos] = visits[i].get(agent_pos, 0) + 1
+                other_infos = [
+                    (agent_ids[j], agent_positions[j])
+                    for j in range(num_agents)
+                    if j != i and agent_positions[j] is not None
                 ]
-                for j in range(num_agents)
-            }
-
-            new_target, target_explanation = select_target(
-                agent_id=agent_id,
-                agent_pos=agent_pos,
-                goal_positions=env.goals,
-                other_agents=other_infos,
-                grid_size=grid_size,
-                obstacles=obstacles,
-                memory=memories[i],
-                visits=visits[i],
-                agent_targets=target_goals,
-                target_memory=target_memories[i],
-                image_path=image_path,
-                step=step,
-                distances=distances
-            )
-
-            if new_target:
-                proposed_goals[i] = new_target
-                print(f"Agent {agent_id} proposed target: {new_target}")
-
-            best, explanation, logprobs, scores = select_direction(
-                agent_id=agent_id,
-                agent_pos=agent_pos,
-                declared_goal=new_target,
-                goal_positions=env.goals,
-                other_agents=other_infos,
-                grid_size=grid_size,
-                obstacles=obstacles,
-                memory=memories[i],
-                visits=visits[i],
-                agent_targets=target_goals,
-                image_path=image_path,
-                env=env
-            )
-            # best = select_direction_opt(agent_pos, new_target, env.goals, env)
-            # print(f"Agent {agent_id} selected direction: {best}")
-
-
-            if best:
-                proposals[i] = env.move_agent(agent_pos, best)
-                print(f"Agent {agent_id} proposed move to {proposals[i]}")
-
-                top_goals = extract_top_goals(logprobs)
-
-                log_rows.append({
-                    "step": step,
-                    "agent_id": agent_id,
-                    "position_before": agent_pos,
-                    "position_after": proposals[i],
-                    "chosen_direction": best,
-                    "logprob_yes": f"{scores[best]:.5f}",
-                    "target_goal": target_goals[i],
-                    "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
-                    "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
-                    "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
-                    "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
-                    "explanation": explanation,
-                })
-
-                memories[i].append((agent_pos[0], agent_pos[1], best, proposals[i][0], proposals[i][1]))
-                if len(memories[i]) > 5:
-                    memories[i] = memories[i][-5:]
-            else:
-                print(f"Agent {agent_id} has no valid moves and stays at {agent_pos}")
-                proposals[i] = agent_pos
+
+                distances = {
+                    agent_ids[j]: [
+                        shortest_path_length(agent_positions[j], goal, env) if agent_positions[j] and goal else float("inf")
+                        for goal in env.goals
+                    ]
+                    for j in range(num_agents)
+                }
+
+                new_target, target_explanation = select_target(
+                    agent_id=agent_id,
+                    agent_pos=agent_pos,
+                    goal_positions=env.goals,
+                    other_agents=other_infos,
+                    grid_size=grid_size,
+                    obstacles=obstacles,
+                    memory=memories[i],
+                    visits=visits[i],
+                    agent_targets=target_goals,
+                    target_memory=target_memories[i],
+                    image_path=image,
+                    step=step,
+                    distances=distances
+                )
+
+                if new_target:
+                    proposed_goals[i] = new_target
+                    print(f"Agent {agent_id} proposed target: {new_target}")
+
+                best, explanation, logprobs, scores = select_direction(
+                    agent_id=agent_id,
+                    agent_pos=agent_pos,
+                    declared_goal=new_target,
+                    goal_positions=env.goals,
+                    other_agents=other_infos,
+                    grid_size=grid_size,
+                    obstacles=obstacles,
+                    memory=memories[i],
+                    visits=visits[i],
+                    agent_targets=target_goals,
+                    image_path=image,
+                    env=env
+                )
+                # best = select_direction_opt(agent_pos, new_target, env.goals, env)
+                # print(f"Agent {agent_id} selected direction: {best}")
+
+
+                if best:
+                    proposals[i] = env.move_agent(agent_pos, best)
+                    print(f"Agent {agent_id} proposed move to {proposals[i]}")
+
+                    top_goals = extract_top_goals(logprobs)
+
+                    log.append({
+                        "step": step,
+                        "agent_id": agent_id,
+                        "position_before": agent_pos,
+                        "position_after": proposals[i],
+                        "chosen_direction": best,
+                        "logprob_yes": f"{scores[best]:.5f}",
+                        "target_goal": target_goals[i],
+                        "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
+                        "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
+                        "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
+                        "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
+                        "explanation": explanation,
+                    })
+
+                    memories[i].append((agent_pos[0], agent_pos[1], best, proposals[i][0], proposals[i][1]))
+                    if len(memories[i]) > 5:
+                        memories[i] = memories[i][-5:]
+                else:
+                    print(f"Agent {agent_id} has no valid moves and stays at {agent_pos}")
+                    proposals[i] = agent_pos
+
+                save_checkpoint(next_agent=i + 1)
 
         target_goals = proposed_goals[:]
 
-        # Collision resolution
-        new_positions = proposals[:]
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
-                    collisions += 1
-                    print(f"Collision: Agent {agent_ids[i]} and Agent {agent_ids[j]} at {new_positions[i]}")
-                    new_positions[j] = agent_positions[j]
-
-        agent_positions = new_positions
-        env.agents = agent_positions[:]
-
-        # Goal claiming
-        to_remove = []
-        claimed_goals = []
-        for i in range(num_agents):
-            if active[i] and agent_positions[i] in env.goals:
-                print(f"Agent {agent_ids[i]} reached goal at {agent_positions[i]}")
-                active[i] = False
-                to_remove.append(i)
-                claimed_goals.append(agent_positions[i])
-
-        for i in to_remove:
-            agent_positions[i] = None
-            env.agents[i] = None
-            target_goals[i] = None
-
-        for goal in claimed_goals:
-            if goal in env.goals:
-                env.goals[env.goals.index(goal)] = None
+        with timed("resolve"):
+            # Collision resolution
+            new_positions = proposals[:]
+            for i in range(num_agents):
+                for j in range(i + 1, num_agents):
+                    if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
+                        collisions += 1
+                        print(f"Collision: Agent {agent_ids[i]} and Agent {agent_ids[j]} at {new_positions[i]}")
+                        new_positions[j] = agent_positions[j]
+
+            agent_positions = new_positions
+            env.agents = agent_positions[:]
+
+            # Goal claiming
+            to_remove = []
+            claimed_goals = []
+            for i in range(num_agents):
+                if active[i] and agent_positions[i] in env.goals:
+                    print(f"Agent {agent_ids[i]} reached goal at {agent_positions[i]}")
+                    active[i] = False
+                    to_remove.append(i)
+                    claimed_goals.append(agent_positions[i])
+
+            for i in to_remove:
+                agent_positions[i] = None
+                env.agents[i] = None
+                target_goals[i] = None
+
+            for goal in claimed_goals:
+                if goal in env.goals:
+                    env.goals[env.goals.index(goal)] = None
 
         print(f"Remaining agents: {[agent_ids[i] for i in range(num_agents) if active[i]]}")
         print(f"Remaining goals: {env.goals}")
         step += 1
+        save_checkpoint()
 
     failed = step >= max_steps
     print(f"\nRun completed in {step} steps. Collisions: {collisions}. Failed: {failed}")
-    if log_rows:
-        with open(log_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
-            writer.writeheader()
-            writer.writerows(log_rows)
+    log.close()
     return step, total_opt, failed, collisions
 
 
@@ -2,11 +2,11 @@ from core.environment import GridWorld
 from core.prompt import build_yesno_prompt_unassigned_com
 from core.request import send_image_to_model_openai_logprobs_formatted
 from core.plot import plot_grid_unassigned
+from core.telemetry import timed
 from core.utils import shortest_path_length
 from core.schema import OpenAIResponse
 import csv
 import re
-import time
 
 def extract_yes_logprob(logprobs):
     if not logprobs:
@@ -31,7 +31,7 @@ def extract_top_goals(logprobs):
     return top2
 
 def run(
-    image_path="data/grid.png",
+    image_path=None,
     log_path="data/agent_step_logs.csv",
     max_steps=30,
     config_path=None,
@@ -75,129 +75,130 @@ def run(
 
     while any(active) and step < max_steps:
         print(f"\n--- Step {step} ---")
-        plot_grid_unassigned(env, image_path=image_path)
+        image = plot_grid_unassigned(env, image_path=image_path)
         proposals = agent_positions[:]
 
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            print(f"\nAgent {agent_ids[i]} at position {agent_positions[i]}")
-            visits[i][agent_positions[i]] = visits[i].get(agent_positions[i], 0) + 1
-            valid = env.get_valid_actions(agent_positions[i])
-            print(f"Valid moves for Agent {agent_ids[i]}: {valid}")
-            scores = {}  # direction -> score
-            dir_logprobs = {}  # direction -> logprobs
-            dir_targets = {}  # direction -> (target_goal, explanation)
-
-            for d in valid:
-                other_infos = [
-                    (agent_ids[j], agent_positions[j])
-                    for j in range(num_agents)
-                    if j != i and agent_positions[j] is not None
-                ]
-                prompt = build_yesno_prompt_unassigned_com(
-                    agent_id=agent_ids[i],
-                    agent_pos=agent_positions[i],
-                    goal_positions=env.goals,
-                    other_agents=other_infos,
-                    grid_size=grid_size,
-                    obstacles=obstacles,
-                    direction=d,
-                    memory=memories[i],
-                    visits=visits[i],
-                    agent_targets=target_goals
-                )
-                time.sleep(0.5)
-                response_text, logprobs = send_image_to_model_openai_logprobs_formatted(image_path, prompt, temperature=0.0000001)
-                score = extract_yes_logprob(logprobs)
-                scores[d] = score
-                dir_logprobs[d] = logprobs
-
-                target_goal = None
-                explanation = ""
-                try:
-                    parsed = OpenAIResponse.model_validate_json(response_text)
-                    target_goal = parsed.target_goal
-                    explanation = parsed.explanation
-                except Exception as e:
-                    print(f"Warning: Failed to parse structured response: {e}")
+        with timed("directions"):
+            for i in range(num_agents):
+                if not active[i] or agent_positions[i] is None:
+                    continue
+
+                print(f"\nAgent {agent_ids[i]} at position {agent_positions[i]}")
+                visits[i][agent_positions[i]] = visits[i].get(agent_positions[i], 0) + 1
+                valid = env.get_valid_actions(agent_positions[i])
+                print(f"Valid moves for Agent {agent_ids[i]}: {valid}")
+                scores = {}  # direction -> score
+                dir_logprobs = {}  # direction -> logprobs
+                dir_targets = {}  # direction -> (target_goal, explanation)
+
+                for d in valid:
+                    other_infos = [
+                        (agent_ids[j], agent_positions[j])
+                        for j in range(num_agents)
+                        if j != i and agent_positions[j] is not None
+                    ]
+                    prompt = build_yesno_prompt_unassigned_com(
+                        agent_id=agent_ids[i],
+                        agent_pos=agent_positions[i],
+                        goal_positions=env.goals,
+                        other_agents=other_infos,
+                        grid_size=grid_size,
+                        obstacles=obstacles,
+                        direction=d,
+                        memory=memories[i],
+                        visits=visits[i],
+                        agent_targets=target_goals
+                    )
+                    response_text, logprobs = send_image_to_model_openai_logprobs_formatted(image, prompt, temperature=0.0000001)
+                    score = extract_yes_logprob(logprobs)
+                    scores[d] = score
+                    dir_logprobs[d] = logprobs
+
+                    target_goal = None
+                    explanation = ""
                     try:
-                        goal_match = re.search(r'"?target"?\s*[:=]\s*"?(?P<goal>[A-Z])"?', response_text, re.IGNORECASE)
-                        if goal_match:
-                            target_goal = goal_match.group("goal").upper()
-                        exp_match = re.search(r'"?explanation"?\s*[:=]\s*"(.*?)"', response_text, re.IGNORECASE)
-                        if exp_match:
-                            explanation = exp_match.group(1)
-                    except:
-                        pass
-
-                dir_targets[d] = (target_goal, explanation)
-                if score > -5:
-                    target_goals[i] = target_goal
-
-            if scores:
-                best = max(scores, key=scores.get)
-                print(f"Agent {agent_ids[i]} chooses direction {best} with logprob {scores[best]}")
-                print(f"Agent {agent_ids[i]} current target goal: {target_goals[i]}")
-                proposals[i] = env.move_agent(agent_positions[i], best)
-                top_goals = extract_top_goals(dir_logprobs[best])
-                goal_info = dir_targets[best]
-                log_rows.append({
-                    "step": step,
-                    "agent_id": agent_ids[i],
-                    "position_before": agent_positions[i],
-                    "position_after": proposals[i],
-                    "chosen_direction": best,
-                    "logprob_yes": f"{scores[best]:.5f}",
-                    "target_goal": goal_info[0],
-                    "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
-                    "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
-                    "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
-                    "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
-                    "explanation": goal_info[1],
-                })
-                print(f"Agent {agent_ids[i]} moves from {agent_positions[i]} to {proposals[i]}")
-                memories[i].append((agent_positions[i][0], agent_positions[i][1], best, proposals[i][0], proposals[i][1]))
-                if len(memories[i]) > 5:
-                    memories[i] = memories[i][-5:]
-            else:
-                print(f"Agent {agent_ids[i]} has no valid moves and stays at {agent_positions[i]}")
-                proposals[i] = agent_positions[i]
-
-        # Collision resolution
-        new_positions = proposals[:]
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
-                    collisions += 1
-                    print(f"Collision detected between Agent {agent_ids[i]} and Agent {agent_ids[j]} at {new_positions[i]}")
-                    new_positions[j] = agent_positions[j]  # loser stays
-
-        agent_positions = new_positions
-        print(f"Agent positions after moves: {agent_positions}")
-        env.agents = agent_positions[:]
-
-        # Goal claiming logic
-        to_remove = []
-        claimed_goals = []
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-            if agent_positions[i] in env.goals:
-                print(f"Agent {agent_ids[i]} reached a goal at {agent_positions[i]}")
-                active[i] = False
-                to_remove.append(i)
-                claimed_goals.append(agent_positions[i])
-
-        for i in to_remove:
-            agent_positions[i] = None
-            env.agents[i] = None
-            target_goals[i] = None
-
-        for goal in claimed_goals:
-            if goal in env.goals:
-                env.goals[env.goals.index(goal)] = None
+                        parsed = OpenAIResponse.model_validate_json(response_text)
+                        target_goal = parsed.target_goal
+                        explanation = parsed.explanation
+                    except Exception as e:
+                        print(f"Warning: Failed to parse structured response: {e}")
+                        try:
+                            goal_match = re.search(r'"?target"?\s*[:=]\s*"?(?P<goal>[A-Z])"?', response_text, re.IGNORECASE)
+                            if goal_match:
+                                target_goal = goal_match.group("goal").upper()
+                            exp_match = re.search(r'"?explanation"?\s*[:=]\s*"(.*?)"', response_text, re.IGNORECASE)
+                            if exp_match:
+                                explanation = exp_match.group(1)
+                        except:
+                            pass
+
+                    dir_targets[d] = (target_goal, explanation)
+                    if score > -5:
+                        target_goals[i] = target_goal
+
+                if scores:
+                    best = max(scores, key=scores.get)
+                    print(f"Agent {agent_ids[i]} chooses direction {best} with logprob {scores[best]}")
+                    print(f"Agent {agent_ids[i]} current target goal: {target_goals[i]}")
+                    proposals[i] = env.move_agent(agent_positions[i], best)
+                    top_goals = extract_top_goals(dir_logprobs[best])
+                    goal_info = dir_targets[best]
+                    log_rows.append({
+                        "step": step,
+                        "agent_id": agent_ids[i],
+                        "position_before": agent_positions[i],
+                        "position_after": proposals[i],
+                        "chosen_direction": best,
+                        "logprob_yes": f"{scores[best]:.5f}",
+                        "target_goal": goal_info[0],
+                        "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
+                        "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
+                        "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
+                        "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
+                        "explanation": goal_info[1],
+                    })
+                    print(f"Agent {agent_ids[i]} moves from {agent_positions[i]} to {proposals[i]}")
+                    memories[i].append((agent_positions[i][0], agent_positions[i][1], best, proposals[i][0], proposals[i][1]))
+                    if len(memories[i]) > 5:
+                        memories[i] = memories[i][-5:]
+                else:
+                    print(f"Agent {agent_ids[i]} has no valid moves and stays at {agent_positions[i]}")
+                    proposals[i] = agent_positions[i]
+
+        with timed("resolve"):
+            # Collision resolution
+            new_positions = proposals[:]
+            for i in range(num_agents):
+                for j in range(i + 1, num_agents):
+                    if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
+                        collisions += 1
+                        print(f"Collision detected between Agent {agent_ids[i]} and Agent {agent_ids[j]} at {new_positions[i]}")
+                        new_positions[j] = agent_positions[j]  # loser stays
+
+            agent_positions = new_positions
+            print(f"Agent positions after moves: {agent_positions}")
+            env.agents = agent_positions[:]
+
+            # Goal claiming logic
+            to_remove = []
+            claimed_goals = []
+            for i in range(num_agents):
+                if not active[i] or agent_positions[i] is None:
+                    continue
+                if agent_positions[i] in env.goals:
+                    print(f"Agent {agent_ids[i]} reached a goal at {agent_positions[i]}")
+                    active[i] = False
+                    to_remove.append(i)
+                    claimed_goals.append(agent_positions[i])
+
+            for i in to_remove:
+                agent_positions[i] = None
+                env.agents[i] = None
+                target_goals[i] = None
+
+            for goal in claimed_goals:
+                if goal in env.goals:
+                    env.goals[env.goals.index(goal)] = None
 
 
         print(f"Active agents: {[agent_ids[i] for i in range(num_agents) if active[i] and agent_positions[i] is not None]}")
@@ -208,7 +209,7 @@ def run(
     failed = step >= max_steps
     print(f"\nRun finished in {step} steps. Collisions: {collisions}. Failed: {failed}")
     if log_rows:
-        with open(log_path, "w", newline="") as f:
+        with timed("log"), open(log_path, "w", newline="") as f:
             writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
             writer.writeheader()
             writer.writerows(log_rows)
@@ -1,10 +1,10 @@
-import time
 import json
 import csv
 from core.environment import GridWorld
 from core.prompt import build_yesno_prompt_unassigned_com_unstructured
 from core.request import send_image_to_model_openai_logprobs
 from core.plot import plot_grid_unassigned
+from core.telemetry import timed
 from core.utils import shortest_path_length
 
 def extract_yes_logprob(logprobs):
@@ -54,7 +54,7 @@ def parse_json_response(text):
         return None, None, ""
 
 def run(
-    image_path="data/grid.png",
+    image_path=None,
     log_path="data/agent_step_logs.csv",
     max_steps=30,
     config_path=None,
@@ -96,116 +96,117 @@ def run(
 
     while any(active) and step < max_steps:
         print(f"\n--- Step {step} ---")
-        plot_grid_unassigned(env, image_path=image_path)
+        image = plot_grid_unassigned(env, image_path=image_path)
         proposals = agent_positions[:]
 
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            print(f"\nAgent {agent_ids[i]} at position {agent_positions[i]}")
-            visits[i][agent_positions[i]] = visits[i].get(agent_positions[i], 0) + 1
-            valid = env.get_valid_actions(agent_positions[i])
-            print(f"Valid moves for Agent {agent_ids[i]}: {valid}")
-            scores = {}
-            dir_logprobs = {}   # direction -> logprobs
-            dir_targets = {}    # direction -> (target, explanation)
-
-            for d in valid:
-                other_infos = [
-                    (agent_ids[j], agent_positions[j])
-                    for j in range(num_agents)
-                    if j != i and agent_positions[j] is not None
-                ]
-                prompt = build_yesno_prompt_unassigned_com_unstructured(
-                    agent_id=agent_ids[i],
-                    agent_pos=agent_positions[i],
-                    goal_positions=env.goals,
-                    other_agents=other_infos,
-                    grid_size=grid_size,
-                    obstacles=obstacles,
-                    direction=d,
-                    memory=memories[i],
-                    visits=visits[i],
-                    agent_targets=target_goals
-                )
-                time.sleep(0.5)
-                response_text, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
-
-                score = extract_yes_logprob(logprobs)
-                scores[d] = score
-                dir_logprobs[d] = logprobs
-
-                move, target, explanation = parse_json_response(response_text)
-                dir_targets[d] = (target, explanation)
-
-                if target:
-                    target_goals[i] = target
-                    print(f"Agent {agent_ids[i]} declares target: {target}")
-                if explanation:
-                    print(f"Explanation: {explanation}")
-
-
-            if scores:
-                best = max(scores, key=scores.get)
-                print(f"Agent {agent_ids[i]} chooses direction {best} with logprob {scores[best]}")
-                print(f"Agent {agent_ids[i]} current target goal: {target_goals[i]}")
-                proposals[i] = env.move_agent(agent_positions[i], best)
-                top_goals = extract_top_goals(dir_logprobs[best])
-                target, explanation = dir_targets[best]
-                log_rows.append({
-                    "step": step,
-                    "agent_id": agent_ids[i],
-                    "position_before": agent_positions[i],
-                    "position_after": proposals[i],
-                    "chosen_direction": best,
-                    "logprob_yes": f"{scores[best]:.5f}",
-                    "target_goal": target,
-                    "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
-                    "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
-                    "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
-                    "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
-                    "explanation": explanation,
-                })
-                print(f"Agent {agent_ids[i]} moves from {agent_positions[i]} to {proposals[i]}")
-                memories[i].append((agent_positions[i][0], agent_positions[i][1], best, proposals[i][0], proposals[i][1]))
-                if len(memories[i]) > 5:
-                    memories[i] = memories[i][-5:]
-            else:
-                print(f"Agent {agent_ids[i]} has no valid moves and stays at {agent_positions[i]}")
-                proposals[i] = agent_positions[i]
-
-        # Collision resolution
-        new_positions = proposals[:]
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
-                    collisions += 1
-                    print(f"Collision detected between Agent {agent_ids[i]} and Agent {agent_ids[j]} at {new_positions[i]}")
-                    new_positions[j] = agent_positions[j]
-
-        agent_positions = new_positions
-        env.agents = agent_positions[:]
-        print(f"Agent positions after moves: {agent_positions}")
-
-        # Goal claiming
-        to_remove = []
-        claimed_goals = []
-        for i in range(num_agents):
-            if active[i] and agent_positions[i] in env.goals:
-                print(f"Agent {agent_ids[i]} reached a goal at {agent_positions[i]}")
-                active[i] = False
-                to_remove.append(i)
-                claimed_goals.append(agent_positions[i])
-
-        for i in to_remove:
-            agent_positions[i] = None
-            env.agents[i] = None
-            target_goals[i] = None
-
-        for goal in claimed_goals:
-            if goal in env.goals:
-                env.goals[env.goals.index(goal)] = None
+        with timed("directions"):
+            for i in range(num_agents):
+                if not active[i] or agent_positions[i] is None:
+                    continue
+
+                print(f"\nAgent {agent_ids[i]} at position {agent_positions[i]}")
+                visits[i][agent_positions[i]] = visits[i].get(agent_positions[i], 0) + 1
+                valid = env.get_valid_actions(agent_positions[i])
+                print(f"Valid moves for Agent {agent_ids[i]}: {valid}")
+                scores = {}
+                dir_logprobs = {}   # direction -> logprobs
+                dir_targets = {}    # direction -> (target, explanation)
+
+                for d in valid:
+                    other_infos = [
+                        (agent_ids[j], agent_positions[j])
+                        for j in range(num_agents)
+                        if j != i and agent_positions[j] is not None
+                    ]
+                    prompt = build_yesno_prompt_unassigned_com_unstructured(
+                        agent_id=agent_ids[i],
+                        agent_pos=agent_positions[i],
+                        goal_positions=env.goals,
+                        other_agents=other_infos,
+                        grid_size=grid_size,
+                        obstacles=obstacles,
+                        direction=d,
+                        memory=memories[i],
+                        visits=visits[i],
+                        agent_targets=target_goals
+                    )
+                    response_text, logprobs = send_image_to_model_openai_logprobs(image, prompt, temperature=0.0000001)
+
+                    score = extract_yes_logprob(logprobs)
+                    scores[d] = score
+                    dir_logprobs[d] = logprobs
+
+                    move, target, explanation = parse_json_response(response_text)
+                    dir_targets[d] = (target, explanation)
+
+                    if target:
+                        target_goals[i] = target
+                        print(f"Agent {agent_ids[i]} declares target: {target}")
+                    if explanation:
+                        print(f"Explanation: {explanation}")
+
+
+                if scores:
+                    best = max(scores, key=scores.get)
+                    print(f"Agent {agent_ids[i]} chooses direction {best} with logprob {scores[best]}")
+                    print(f"Agent {agent_ids[i]} current target goal: {target_goals[i]}")
+                    proposals[i] = env.move_agent(agent_positions[i], best)
+                    top_goals = extract_top_goals(dir_logprobs[best])
+                    target, explanation = dir_targets[best]
+                    log_rows.append({
+                        "step": step,
+                        "agent_id": agent_ids[i],
+                        "position_before": agent_positions[i],
+                        "position_after": proposals[i],
+                        "chosen_direction": best,
+                        "logprob_yes": f"{scores[best]:.5f}",
+                        "target_goal": target,
+                        "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
+                        "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
+                        "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
+                        "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
+                        "explanation": explanation,
+                    })
+                    print(f"Agent {agent_ids[i]} moves from {agent_positions[i]} to {proposals[i]}")
+                    memories[i].append((agent_positions[i][0], agent_positions[i][1], best, proposals[i][0], proposals[i][1]))
+                    if len(memories[i]) > 5:
+                        memories[i] = memories[i][-5:]
+                else:
+                    print(f"Agent {agent_ids[i]} has no valid moves and stays at {agent_positions[i]}")
+                    proposals[i] = agent_positions[i]
+
+        with timed("resolve"):
+            # Collision resolution
+            new_positions = proposals[:]
+            for i in range(num_agents):
+                for j in range(i + 1, num_agents):
+                    if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
+                        collisions += 1
+                        print(f"Collision detected between Agent {agent_ids[i]} and Agent {agent_ids[j]} at {new_positions[i]}")
+                        new_positions[j] = agent_positions[j]
+
+            agent_positions = new_positions
+            env.agents = agent_positions[:]
+            print(f"Agent positions after moves: {agent_positions}")
+
+            # Goal claiming
+            to_remove = []
+            claimed_goals = []
+            for i in range(num_agents):
+                if active[i] and agent_positions[i] in env.goals:
+                    print(f"Agent {agent_ids[i]} reached a goal at {agent_positions[i]}")
+                    active[i] = False
+                    to_remove.append(i)
+                    claimed_goals.append(agent_positions[i])
+
+            for i in to_remove:
+                agent_positions[i] = None
+                env.agents[i] = None
+                target_goals[i] = None
+
+            for goal in claimed_goals:
+                if goal in env.goals:
+                    env.goals[env.goals.index(goal)] = None
 
         print(f"Active agents: {[agent_ids[i] for i in range(num_agents) if active[i] and agent_positions[i] is not None]}")
         print(f"Remaining goals: {env.goals}")
@@ -215,7 +216,7 @@ def run(
     failed = step >= max_steps
     print(f"\nRun finished in {step} steps. Collisions: {collisions}. Failed: {failed}")
     if log_rows:
-        with open(log_path, "w", newline="") as f:
+        with timed("log"), open(log_path, "w", newline="") as f:
             writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
             writer.writeheader()
             writer.writerows(log_rows)
@@ -1,13 +1,10 @@
-import time
 import json
-import csv
-from core.environment import GridWorld
 from core.prompt import build_target_ranking_prompt_no_distances
-from core.request import send_image_to_model_openai_logprobs
-from core.plot import plot_grid_unassigned_labeled
-from core.utils import shortest_path_length, select_direction_opt
+from core.request import send_image_to_model_openai_logprobs, send_image_to_model_openai_logprobs_async, DEFAULT_MAX_CONCURRENCY
+from core.episode import LLMRankingPolicy, make_env, run_episode
 import re
 import argparse
+from functools import partial
 import random
 
 def parse_ranking_response(text):
@@ -54,9 +51,10 @@ def select_target(
         target_memory=target_memory,
         distances=distances
     )
-    time.sleep(0.5)
     response, _ = send_image_to_model_openai_logprobs(image_path, prompt, model="gpt-4.1", temperature=0.0000001)
+    return finish_target_selection(agent_id, response, goal_positions, target_memory, step)
 
+def finish_target_selection(agent_id, response, goal_positions, target_memory, step):
     raw_ranking, explanation, reasoning = parse_ranking_response(response)
 
     # Filter invalid goals
@@ -89,34 +87,8 @@ def select_target(
 
     return filtered_ranking, explanation, reasoning
 
-def resolve_conflicts(agent_rankings, active_agents):
-    final_goals = [rank[0] if rank else None for rank in agent_rankings]
-    positions = [0 for _ in agent_rankings]
-
-    while True:
-        goal_to_agents = {}
-        for idx, goal in enumerate(final_goals):
-            if active_agents[idx] and goal:
-                goal_to_agents.setdefault(goal, []).append(idx)
-
-        conflicts_exist = any(len(lst) > 1 for lst in goal_to_agents.values())
-        if not conflicts_exist:
-            break
-
-        for goal, agents in goal_to_agents.items():
-            if len(agents) <= 1:
-                continue
-            agents.sort()  # Ensure lower index agent wins
-            for loser_idx in agents[1:]:
-                positions[loser_idx] += 1
-                if positions[loser_idx] < len(agent_rankings[loser_idx]):
-                    final_goals[loser_idx] = agent_rankings[loser_idx][positions[loser_idx]]
-                else:
-                    final_goals[loser_idx] = None
-    return final_goals
-
 def run(
-    image_path="data/grid.png",
+    image_path=None,
     log_path="data/agent_rank_logs.csv",
     max_steps=100,
     config_path=None,
@@ -124,190 +96,18 @@ def run(
     grid_size=6,
     num_agents=3,
     agent_starts: list[tuple[int, int]] = None,
-    goal_positions: list[tuple[int, int]] = None
+    goal_positions: list[tuple[int, int]] = None,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    checkpoint=None
 ):
-    if config_path:
-        env = GridWorld(config_path)
-        grid_size = env.size
-        num_agents = len(env.agents)
-    else:
-        env = GridWorld(grid_size, obstacles=obstacles)
-        if agent_starts and goal_positions:
-            env.initialize_agents_goals_custom(agents=agent_starts, goals=goal_positions)
-        else:
-            env.initialize_agents_goals(num_agents=num_agents)
-
-    agent_positions = env.agents[:]
-    agent_ids = list(range(1, num_agents + 1))
-    active = [True] * num_agents
-    visits = [{} for _ in range(num_agents)]
-    memories = [[] for _ in range(num_agents)]
-    target_memories = [[] for _ in range(num_agents)]
-    target_goals = [None for _ in range(num_agents)]
-    step = 0
-    collisions = 0
-    log_rows = []
-    agent_rankings = [[] for _ in range(num_agents)]
-
-    total_opt = sum(
-        min([shortest_path_length(start, g, env) for g in env.goals if g is not None], default=0)
-        for start in env.agents if start is not None
+    env = make_env(config_path, grid_size, obstacles, num_agents, agent_starts, goal_positions)
+    policy = LLMRankingPolicy(
+        build_target_ranking_prompt_no_distances,
+        partial(send_image_to_model_openai_logprobs_async, model="gpt-4.1", temperature=0.0000001),
+        finish_target_selection,
+        max_concurrency=max_concurrency
     )
-
-    print(f"Initial agent positions: {agent_positions}")
-    print(f"Goal positions: {env.goals}")
-    print(f"Obstacles: {obstacles}")
-
-    while any(active) and step < max_steps:
-        print(f"\n--- Step {step} ---")
-        plot_grid_unassigned_labeled(env, image_path=image_path)
-        proposals = agent_positions[:]
-        proposed_goals = [None for _ in range(num_agents)]
-
-        # ----------- Phase 1: Ranking ----------
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            agent_id = agent_ids[i]
-            agent_pos = agent_positions[i]
-            visits[i][agent_pos] = visits[i].get(agent_pos, 0) + 1
-
-            other_infos = [
-                (agent_ids[j], agent_positions[j])
-                for j in range(num_agents)
-                if j != i and agent_positions[j] is not None
-            ]
-
-            distances = {
-                agent_ids[j]: [
-                    shortest_path_length(agent_positions[j], goal, env) if agent_positions[j] and goal else float("inf")
-                    for goal in env.goals
-                ]
-                for j in range(num_agents)
-            }
-
-            ranking, _, _ = select_target(
-                agent_id=agent_id,
-                agent_pos=agent_pos,
-                goal_positions=env.goals,
-                other_agents=other_infos,
-                grid_size=grid_size,
-                obstacles=obstacles,
-                memory=memories[i],
-                visits=visits[i],
-                agent_targets=target_goals,
-                target_memory=target_memories[i],
-                image_path=image_path,
-                step=step,
-                distances=distances
-            )
-            agent_rankings[i] = ranking
-
-        # ----------- Phase 2: Conflict Resolution ----------
-        proposed_goals = [rank[0] if rank else None for rank in agent_rankings]
-
-        goal_to_agents = {}
-        for idx, tgt in enumerate(proposed_goals):
-            if active[idx] and tgt:
-                goal_to_agents.setdefault(tgt, []).append(idx)
-
-        conflict_pairs = [
-            (a1, a2, goal)
-            for goal, agents in goal_to_agents.items()
-            if len(agents) == 2
-            for a1, a2 in [tuple(sorted(agents))]
-        ]
-
-        print("Conflict pairs detected:", conflict_pairs)
-
-        # Resolve conflicts deterministically
-        proposed_goals = resolve_conflicts(agent_rankings, active)
-
-        # ----------- Phase 3: Direction Selection & Movement ----------
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            agent_id = agent_ids[i]
-            agent_pos = agent_positions[i]
-            new_target = proposed_goals[i]
-
-            other_infos = [
-                (agent_ids[j], agent_positions[j])
-                for j in range(num_agents)
-                if j != i and agent_positions[j] is not None
-            ]
-
-            best = select_direction_opt(
-                agent_pos,
-                new_target,
-                env.goals,
-                env
-            )
-            explanation = "Chose shortest path step deterministically."
-
-            if best:
-                proposals[i] = env.move_agent(agent_pos, best)
-                log_rows.append({
-                    "step": step,
-                    "agent_id": agent_id,
-                    "position_before": agent_pos,
-                    "position_after": proposals[i],
-                    "chosen_direction": best,
-                    "explanation": explanation,
-                })
-                memories[i].append((agent_pos[0], agent_pos[1], best, proposals[i][0], proposals[i][1]))
-                if len(memories[i]) > 5:
-                    memories[i] = memories[i][-5:]
-            else:
-                proposals[i] = agent_pos
-
-        target_goals = proposed_goals[:]
-
-        # ----------- Collision Resolution ----------
-        new_positions = proposals[:]
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
-                    collisions += 1
-                    new_positions[j] = agent_positions[j]
-
-        agent_positions = new_positions
-        env.agents = agent_positions[:]
-
-        # ----------- Goal Claiming ----------
-        to_remove = []
-        claimed_goals = []
-        for i in range(num_agents):
-            if active[i] and agent_positions[i] in env.goals:
-                print(f"Agent {agent_ids[i]} reached goal at {agent_positions[i]}")
-                active[i] = False
-                to_remove.append(i)
-                claimed_goals.append(agent_positions[i])
-
-        for i in to_remove:
-            agent_positions[i] = None
-            env.agents[i] = None
-            target_goals[i] = None
-
-        for goal in claimed_goals:
-            if goal in env.goals:
-                env.goals[env.goals.index(goal)] = None
-
-        print(f"Remaining agents: {[agent_ids[i] for i in range(num_agents) if active[i]]}")
-        print(f"Remaining goals: {env.goals}")
-        step += 1
-
-    failed = step >= max_steps
-    print(f"\nRun completed in {step} steps. Collisions: {collisions}. Failed: {failed}")
-    if log_rows:
-        with open(log_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
-            writer.writeheader()
-            writer.writerows(log_rows)
-    return step, total_opt, failed, collisions
-
+    return run_episode(env, policy, log_path, max_steps, image_path, obstacles=obstacles, checkpoint=checkpoint)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run agent rank simulation.")
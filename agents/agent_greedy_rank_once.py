@@ -1,7 +1,10 @@
 import argparse
 import csv
 from core.environment import GridWorld
-from core.utils import shortest_path_length, select_direction_opt
+from core.utils import shortest_path_length
+from core.episode import Policy, RankOncePolicy, run_episode
+from core.lockstep import run_greedy_episode
+from core.vec_env import run_greedy_batch
 import os
 
 def compute_greedy_rankings(env):
@@ -21,131 +24,35 @@ def compute_greedy_rankings(env):
         rankings.append([chr(65 + idx) for _, idx in dists])
     return rankings
 
-def resolve_conflicts(rankings, active):
-    """Each agent gets its closest available goal; conflicts resolved by lower index."""
-    assigned = [r[0] if r else None for r in rankings]
-    positions = [0] * len(rankings)
+class GreedyPolicy(Policy):
+    """Rank goals by BFS distance from scratch every step; conflicts go to the lower index."""
 
-    while True:
-        goal_to_agents = {}
-        for idx, g in enumerate(assigned):
-            if active[idx] and g:
-                goal_to_agents.setdefault(g, []).append(idx)
+    def rank(self, ep):
+        return compute_greedy_rankings(ep.env)
 
-        conflicts = [agents for agents in goal_to_agents.values() if len(agents) > 1]
-        if not conflicts:
-            break
+    def choose_direction(self, ep, i, target):
+        direction, _ = super().choose_direction(ep, i, target)
+        return direction, {"target_goal": target}
 
-        for group in conflicts:
-            group.sort()
-            for loser in group[1:]:
-                positions[loser] += 1
-                if positions[loser] < len(rankings[loser]):
-                    assigned[loser] = rankings[loser][positions[loser]]
-                else:
-                    assigned[loser] = None
-    return assigned
-
-def run(config_path, log_path="data/greedy_log.csv", max_steps=100):
+def run(config_path, log_path="data/greedy_log.csv", max_steps=100, vectorized=False, checkpoint=None):
     env = GridWorld(config_path)
-    num_agents = len(env.agents)
-    active = [True] * num_agents
-    step = 0
-    collisions = 0
-    log_rows = []
-    agent_ids = list(range(1, num_agents + 1))
-
-    total_opt = sum(
-        min([shortest_path_length(start, g, env) for g in env.goals if g], default=0)
-        for start in env.agents if start
-    )
-
-    print(f"Initial agent positions: {env.agents}")
-    print(f"Goals: {env.goals}")
-    print(f"Obstacles: {env.obstacles}")
-
-    agent_positions = env.agents[:]
-    target_goals = [None] * num_agents
-
-    # Phase 1: Ranking and goal assignment (only once)
-    rankings = compute_greedy_rankings(env)
-    assigned_goals = resolve_conflicts(rankings, active)
-    target_goals = assigned_goals[:]
-
-    print(f"Assigned goals: {target_goals}")
-
-    while any(active) and step < max_steps:
-        print(f"\n--- Step {step} ---")
-        proposals = agent_positions[:]
-
-        # Phase 2: Move Selection (move towards assigned goal)
-        for i in range(num_agents):
-            if not active[i] or not target_goals[i]:
-                continue
-            goal_char = target_goals[i]
-            direction = select_direction_opt(agent_positions[i], goal_char, env.goals, env)
-            if direction:
-                new_pos = env.move_agent(agent_positions[i], direction)
-                log_rows.append({
-                    "step": step,
-                    "agent_id": agent_ids[i],
-                    "position_before": agent_positions[i],
-                    "position_after": new_pos,
-                    "chosen_direction": direction,
-                    "target_goal": goal_char
-                })
-                proposals[i] = new_pos
-            else:
-                proposals[i] = agent_positions[i]
-
-        # Phase 3: Collision resolution
-        new_positions = proposals[:]
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if new_positions[i] == new_positions[j] and active[i] and active[j]:
-                    collisions += 1
-                    new_positions[j] = agent_positions[j]
-
-        agent_positions = new_positions
-        env.agents = new_positions[:]
+    if vectorized:
+        steps, total_opt, failed, collisions = run_greedy_episode(
+            env, log_path=log_path, max_steps=max_steps, rank_once=True
+        )
+        print(f"\n✅ Finished in {steps} steps. Collisions: {collisions}. Failed: {failed}")
+        return steps, total_opt, failed, collisions
 
-        # Phase 4: Goal claiming
-        to_remove = []
-        claimed_goals = []
-        for i in range(num_agents):
-            if active[i] and agent_positions[i] in env.goals:
-                print(f"Agent {agent_ids[i]} reached goal at {agent_positions[i]}")
-                active[i] = False
-                to_remove.append(i)
-                claimed_goals.append(agent_positions[i])
-
-        for i in to_remove:
-            agent_positions[i] = None
-            env.agents[i] = None
-            target_goals[i] = None
-
-        for goal in claimed_goals:
-            if goal in env.goals:
-                env.goals[env.goals.index(goal)] = None
-
-        step += 1
-
-    failed = step >= max_steps
-    print(f"\n✅ Finished in {step} steps. Collisions: {collisions}. Failed: {failed}")
-
-    if log_rows:
-        with open(log_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
-            writer.writeheader()
-            writer.writerows(log_rows)
-
-    return step, total_opt, failed, collisions
+    policy = RankOncePolicy(GreedyPolicy())
+    return run_episode(env, policy, log_path, max_steps, checkpoint=checkpoint)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run centralized greedy agent.")
     parser.add_argument("--config", type=str, help="Path to a single config YAML file")
     parser.add_argument("--configs-dir", type=str, help="Directory containing multiple YAML config files")
     parser.add_argument("--log-dir", type=str, default="results_greedy", help="Where to store CSV logs")
+    parser.add_argument("--vectorized", action="store_true", help="Use the NumPy lockstep engine (core/lockstep.py)")
+    parser.add_argument("--batched", action="store_true", help="With --configs-dir: run all cases together in a VecGridWorld (no per-case logs)")
     args = parser.parse_args()
 
     # Check for correct usage
@@ -155,8 +62,18 @@ if __name__ == "__main__":
     os.makedirs(args.log_dir, exist_ok=True)
 
     if args.config:
-        steps, optimal, failed, collisions = run(config_path=args.config)
+        steps, optimal, failed, collisions = run(config_path=args.config, vectorized=args.vectorized)
         print(f"\n📊 Greedy Results:\nOptimal: {optimal}\nSteps: {steps}\nFailed: {failed}\nCollisions: {collisions}")
+    elif args.batched:
+        summary_path = os.path.join(args.log_dir, "greedy_summary.csv")
+        case_files = [f for f in sorted(os.listdir(args.configs_dir)) if f.endswith(".yaml")]
+        results = run_greedy_batch([os.path.join(args.configs_dir, f) for f in case_files], rank_once=True)
+        with open(summary_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Case", "Steps", "Optimal", "Failed", "Collisions"])
+            for filename, (steps, optimal, failed, collisions) in zip(case_files, results):
+                writer.writerow([os.path.splitext(filename)[0], steps, optimal, int(failed), collisions])
+        print(f"\n✅ Summary written to: {summary_path}")
     else:
         summary_path = os.path.join(args.log_dir, "greedy_summary.csv")
         with open(summary_path, "w", newline="") as f:
@@ -171,7 +88,8 @@ if __name__ == "__main__":
                     log_path = os.path.join(args.log_dir, f"{case_name}_log.csv")
                     steps, optimal, failed, collisions = run(
                         config_path=case_path,
-                        log_path=log_path
+                        log_path=log_path,
+                        vectorized=args.vectorized
                     )
                     writer.writerow([case_name, steps, optimal, int(failed), collisions])
         print(f"\n✅ Summary written to: {summary_path}")
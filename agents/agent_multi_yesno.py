@@ -3,7 +3,8 @@ from core.prompt import build_yesno_prompt_multiagent
 from core.request import send_image_to_model_openai_logprobs
 from core.plot import plot_grid
 from core.utils import shortest_path_length
-import time
+from core.direction_scoring import DirectionAgreement, score_directions
+from functools import partial
 
 def extract_yes_logprob(logprobs):
     if not logprobs:
@@ -14,7 +15,7 @@ def extract_yes_logprob(logprobs):
     return float('-inf')
 
 def run(
-    image_path="data/grid.png",
+    image_path=None,
     log_path="data/agent_step_logs.csv",
     max_steps=30,
     config_path=None,
@@ -22,7 +23,8 @@ def run(
     grid_size=6,
     num_agents=3,
     agent_starts: list[tuple[int, int]] = None,
-    goal_positions: list[tuple[int, int]] = None
+    goal_positions: list[tuple[int, int]] = None,
+    scoring="yesno"
 ):
     if config_path:
         env = GridWorld(config_path)
@@ -44,13 +46,14 @@ def run(
     memories = [[] for _ in range(num_agents)]
     step = 0
     collisions = 0
+    agreement = DirectionAgreement()
     optimal_lengths = [
         shortest_path_length(init_positions[i], goal_positions[i], env)
         for i in range(num_agents)
     ]
 
     while any(active) and step < max_steps:
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
         proposals = [pos for pos in agent_positions]
 
         for i in range(num_agents):
@@ -58,29 +61,28 @@ def run(
                 continue
             visits[i][agent_positions[i]] = visits[i].get(agent_positions[i], 0) + 1
             valid = env.get_valid_actions(agent_positions[i])
-            scores = {}
-            for d in valid:
-                other_infos = [
-                    (agent_ids[j], agent_positions[j])
-                    for j in range(num_agents)
-                    if j != i and agent_positions[j] is not None
-                ]
-                prompt = build_yesno_prompt_multiagent(
-                    agent_id=agent_ids[i],
-                    agent_pos=agent_positions[i],
-                    goal_pos=goal_positions[i],
-                    other_agents=other_infos,
-                    grid_size=grid_size,
-                    obstacles=obstacles,
-                    direction=d,
-                    memory=memories[i],
-                    visits=visits[i]
-                )
-                print(f"\nAgent {agent_ids[i]} at position {agent_positions[i]}, asking about direction '{d}'")
-                print(f"Prompt: {prompt[:200]}...")
-                time.sleep(0.5)
-                _, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
-                scores[d] = extract_yes_logprob(logprobs)
+            other_infos = [
+                (agent_ids[j], agent_positions[j])
+                for j in range(num_agents)
+                if j != i and agent_positions[j] is not None
+            ]
+            print(f"\nAgent {agent_ids[i]} at position {agent_positions[i]}, scoring directions {valid} ({scoring})")
+            scores, _ = score_directions(
+                valid,
+                partial(send_image_to_model_openai_logprobs, image, temperature=0.0000001),
+                build_yesno_prompt_multiagent,
+                extract_yes_logprob,
+                agent_positions[i],
+                mode=scoring,
+                agreement=agreement,
+                agent_id=agent_ids[i],
+                goal_pos=goal_positions[i],
+                other_agents=other_infos,
+                grid_size=grid_size,
+                obstacles=obstacles,
+                memory=memories[i],
+                visits=visits[i]
+            )
             if scores:
                 best = max(scores, key=scores.get)
                 proposals[i] = env.move_agent(agent_positions[i], best)
@@ -124,6 +126,8 @@ def run(
         step += 1
     
     failed = step >= max_steps
+    if scoring == "both":
+        print(agreement.summary())
     return step, max(optimal_lengths), failed, collisions
 
 if __name__ == "__main__":
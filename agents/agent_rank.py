@@ -1,18 +1,15 @@
-import time
 import json
-import csv
-from core.environment import GridWorld
 from core.prompt import (
     build_target_ranking_prompt,
     build_direction_selection_prompt,
     build_negotiation_prompt
 )
-from core.request import send_image_to_model_openai_logprobs, send_text_to_model_openai
-from core.plot import plot_grid_unassigned_labeled
-from core.utils import shortest_path_length, select_direction_opt
+from core.request import send_image_to_model_openai_logprobs, send_text_to_model_openai, send_image_to_model_openai_logprobs_async, DEFAULT_MAX_CONCURRENCY
+from core.episode import LLMDirectionPolicy, make_env, run_episode
 from core.request import send_image_to_model_openai_logprobs
 import re
 import argparse
+from functools import partial
 
 def extract_yes_logprob(logprobs):
     if not logprobs:
@@ -99,8 +96,10 @@ def select_target(
         target_memory=target_memory,
         distances=distances
     )
-    time.sleep(0.5)
     response, _ = send_image_to_model_openai_logprobs(image_path, prompt, model="gpt-4.1", temperature=0.0000001)
+    return finish_target_selection(agent_id, response, goal_positions, target_memory, step)
+
+def finish_target_selection(agent_id, response, goal_positions, target_memory, step):
     # print(f"Agent {agent_id} ranking response:\n{response}")
 
     ranking, explanation, reasoning = parse_ranking_response(response)
@@ -153,7 +152,6 @@ def select_direction(
             visits=visits,
             agent_targets=agent_targets
         )
-        time.sleep(0.5)
         response, logprobs = send_image_to_model_openai_logprobs(image_path, prompt, temperature=0.0000001)
         score = extract_yes_logprob(logprobs)
         scores[direction] = score
@@ -253,7 +251,7 @@ def run_negotiation(env, conflict_tuple, agent_ids, agent_positions, goal_positi
     return None  # fallback if no agreement
 
 def run(
-    image_path="data/grid.png",
+    image_path=None,
     log_path="data/agent_rank_logs.csv",
     max_steps=30,
     config_path=None,
@@ -261,223 +259,21 @@ def run(
     grid_size=6,
     num_agents=3,
     agent_starts: list[tuple[int, int]] = None,
-    goal_positions: list[tuple[int, int]] = None
+    goal_positions: list[tuple[int, int]] = None,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    checkpoint=None
 ):
-    if config_path:
-        env = GridWorld(config_path)
-        grid_size = env.size
-        num_agents = len(env.agents)
-    else:
-        env = GridWorld(grid_size, obstacles=obstacles)
-        if agent_starts and goal_positions:
-            env.initialize_agents_goals_custom(agents=agent_starts, goals=goal_positions)
-        else:
-            env.initialize_agents_goals(num_agents=num_agents)
-
-    agent_positions = env.agents[:]
-    agent_ids = list(range(1, num_agents + 1))
-    active = [True] * num_agents
-    visits = [{} for _ in range(num_agents)]
-    memories = [[] for _ in range(num_agents)]
-    target_memories = [[] for _ in range(num_agents)]
-    target_goals = [None for _ in range(num_agents)]
-    step = 0
-    collisions = 0
-    log_rows = []
-    agent_rankings = [[] for _ in range(num_agents)]
-
-    total_opt = sum(
-        min([shortest_path_length(start, g, env) for g in env.goals if g is not None], default=0)
-        for start in env.agents if start is not None
+    env = make_env(config_path, grid_size, obstacles, num_agents, agent_starts, goal_positions)
+    policy = LLMDirectionPolicy(
+        build_target_ranking_prompt,
+        partial(send_image_to_model_openai_logprobs_async, model="gpt-4.1", temperature=0.0000001),
+        finish_target_selection,
+        select_direction,
+        extract_top_goals,
+        negotiate=run_negotiation,
+        max_concurrency=max_concurrency
     )
-
-    print(f"Initial agent positions: {agent_positions}")
-    print(f"Goal positions: {env.goals}")
-    print(f"Obstacles: {obstacles}")
-
-    while any(active) and step < max_steps:
-        print(f"\n--- Step {step} ---")
-        plot_grid_unassigned_labeled(env, image_path=image_path)
-        proposals = agent_positions[:]
-        proposed_goals = [None for _ in range(num_agents)]
-
-        # ----------- Phase 1: Ranking ----------
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            agent_id = agent_ids[i]
-            agent_pos = agent_positions[i]
-            visits[i][agent_pos] = visits[i].get(agent_pos, 0) + 1
-
-            other_infos = [
-                (agent_ids[j], agent_positions[j])
-                for j in range(num_agents)
-                if j != i and agent_positions[j] is not None
-            ]
-
-            distances = {
-                agent_ids[j]: [
-                    shortest_path_length(agent_positions[j], goal, env) if agent_positions[j] and goal else float("inf")
-                    for goal in env.goals
-                ]
-                for j in range(num_agents)
-            }
-
-            ranking, _, _ = select_target(
-                agent_id=agent_id,
-                agent_pos=agent_pos,
-                goal_positions=env.goals,
-                other_agents=other_infos,
-                grid_size=grid_size,
-                obstacles=obstacles,
-                memory=memories[i],
-                visits=visits[i],
-                agent_targets=target_goals,
-                target_memory=target_memories[i],
-                image_path=image_path,
-                step=step,
-                distances=distances
-            )
-            agent_rankings[i] = ranking
-
-        # ----------- Phase 2: Conflict Resolution ----------
-        proposed_goals = [rank[0] if rank else None for rank in agent_rankings]
-
-        goal_to_agents = {}
-        for idx, tgt in enumerate(proposed_goals):
-            if active[idx] and tgt:
-                goal_to_agents.setdefault(tgt, []).append(idx)
-
-        conflict_pairs = [
-            (a1, a2, goal)
-            for goal, agents in goal_to_agents.items()
-            if len(agents) == 2
-            for a1, a2 in [tuple(sorted(agents))]
-        ]
-
-        print("Conflict pairs detected:", conflict_pairs)
-
-        for conflict in conflict_pairs:
-            resolution = run_negotiation(
-                env=env,
-                conflict_tuple=conflict,
-                agent_ids=agent_ids,
-                agent_positions=agent_positions,
-                goal_positions=env.goals,
-                distances={
-                    agent_ids[j]: [
-                        shortest_path_length(agent_positions[j], goal, env) if agent_positions[j] and goal else float("inf")
-                        for goal in env.goals
-                    ]
-                    for j in range(num_agents)
-                },
-                agent_rankings=agent_rankings
-            )
-            if resolution:
-                for aid_str, tgt in resolution.items():
-                    aid = int(aid_str.split()[-1])
-                    idx = agent_ids.index(aid)
-                    proposed_goals[idx] = tgt
-
-        # ----------- Phase 3: Direction Selection & Movement ----------
-        for i in range(num_agents):
-            if not active[i] or agent_positions[i] is None:
-                continue
-
-            agent_id = agent_ids[i]
-            agent_pos = agent_positions[i]
-            new_target = proposed_goals[i]
-
-            other_infos = [
-                (agent_ids[j], agent_positions[j])
-                for j in range(num_agents)
-                if j != i and agent_positions[j] is not None
-            ]
-
-            best, explanation, logprobs, scores = select_direction(
-                agent_id=agent_id,
-                agent_pos=agent_pos,
-                declared_goal=new_target,
-                goal_positions=env.goals,
-                other_agents=other_infos,
-                grid_size=grid_size,
-                obstacles=obstacles,
-                memory=memories[i],
-                visits=visits[i],
-                agent_targets=target_goals,
-                image_path=image_path,
-                env=env
-            )
-
-            if best:
-                proposals[i] = env.move_agent(agent_pos, best)
-                top_goals = extract_top_goals(logprobs)
-                log_rows.append({
-                    "step": step,
-                    "agent_id": agent_id,
-                    "position_before": agent_pos,
-                    "position_after": proposals[i],
-                    "chosen_direction": best,
-                    "logprob_yes": f"{scores[best]:.5f}",
-                    "target_goal": target_goals[i],
-                    "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
-                    "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
-                    "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
-                    "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
-                    "explanation": explanation,
-                })
-                memories[i].append((agent_pos[0], agent_pos[1], best, proposals[i][0], proposals[i][1]))
-                if len(memories[i]) > 5:
-                    memories[i] = memories[i][-5:]
-            else:
-                proposals[i] = agent_pos
-
-        target_goals = proposed_goals[:]
-
-        # ----------- Collision Resolution ----------
-        new_positions = proposals[:]
-        for i in range(num_agents):
-            for j in range(i + 1, num_agents):
-                if new_positions[i] == new_positions[j] and agent_positions[i] is not None and agent_positions[j] is not None:
-                    collisions += 1
-                    new_positions[j] = agent_positions[j]
-
-        agent_positions = new_positions
-        env.agents = agent_positions[:]
-
-        # ----------- Goal Claiming ----------
-        to_remove = []
-        claimed_goals = []
-        for i in range(num_agents):
-            if active[i] and agent_positions[i] in env.goals:
-                print(f"Agent {agent_ids[i]} reached goal at {agent_positions[i]}")
-                active[i] = False
-                to_remove.append(i)
-                claimed_goals.append(agent_positions[i])
-
-        for i in to_remove:
-            agent_positions[i] = None
-            env.agents[i] = None
-            target_goals[i] = None
-
-        for goal in claimed_goals:
-            if goal in env.goals:
-                env.goals[env.goals.index(goal)] = None
-
-        print(f"Remaining agents: {[agent_ids[i] for i in range(num_agents) if active[i]]}")
-        print(f"Remaining goals: {env.goals}")
-        step += 1
-
-    failed = step >= max_steps
-    print(f"\nRun completed in {step} steps. Collisions: {collisions}. Failed: {failed}")
-    if log_rows:
-        with open(log_path, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
-            writer.writeheader()
-            writer.writerows(log_rows)
-    return step, total_opt, failed, collisions
-
+    return run_episode(env, policy, log_path, max_steps, image_path, obstacles=obstacles, checkpoint=checkpoint)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run agent rank simulation.")
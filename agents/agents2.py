@@ -11,7 +11,7 @@ def extract_direction(response):
             return d
     return None
 
-def run(grid_size=6, image_path="data/grid.png", max_steps=30):
+def run(grid_size=6, image_path=None, max_steps=30):
     env = GridWorld(grid_size)
     env.initialize_agents_goals(num_agents=2)
 
@@ -24,13 +24,13 @@ def run(grid_size=6, image_path="data/grid.png", max_steps=30):
     collisions = 0
 
     while not (done1 and done2) and step < max_steps:
-        plot_grid(env, image_path=image_path)
+        image = plot_grid(env, image_path=image_path)
         new1, new2 = agent1_pos, agent2_pos
 
         if not done1:
             valid1 = env.get_valid_actions(agent1_pos)
             prompt1 = build_prompt_first_agent(agent1_pos, agent2_pos, goal1_pos, valid1, grid_size)
-            resp1 = send_image_to_model_openai(image_path, prompt1, temperature=0.0000001)
+            resp1 = send_image_to_model_openai(image, prompt1, temperature=0.0000001)
             dir1 = extract_direction(resp1)
             if dir1:
                 new1 = env.move_agent(agent1_pos, dir1)
@@ -38,7 +38,7 @@ def run(grid_size=6, image_path="data/grid.png", max_steps=30):
         if not done2:
             valid2 = env.get_valid_actions(agent2_pos)
             prompt2 = build_prompt_second_agent(agent1_pos, agent2_pos, goal2_pos, valid2, grid_size)
-            resp2 = send_image_to_model_openai(image_path, prompt2, temperature=0.0000001)
+            resp2 = send_image_to_model_openai(image, prompt2, temperature=0.0000001)
             dir2 = extract_direction(resp2)
             if dir2:
                 new2 = env.move_agent(agent2_pos, dir2)
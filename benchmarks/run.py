@@ -0,0 +1,366 @@
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+from datetime import date
+from agents.agent_greedy import GreedyPolicy, compute_greedy_rankings
+from core import prompt
+from core.environment import GridWorld
+from core.episode import resolve_conflicts, run_episode
+from core.find_optim_sol import compute_distance_matrix, find_best_assignment
+from core.plot import RENDERERS, plot_grid, plot_grid_unassigned, plot_grid_unassigned_labeled, set_renderer, get_renderer
+from core.utils import shortest_path, shortest_path_length, select_direction_opt
+
+# Timings of the hot paths on seeded random scenarios, compared against a JSON baseline:
+#   python -m benchmarks.run                  # compare with benchmarks/baselines/baseline.json
+#   python -m benchmarks.run --save           # record the current timings as the baseline
+#   python -m benchmarks.run --filter prompt --max-grid 50
+# Everything runs offline; nothing is sent to a model. Baselines are machine-specific, so record one
+# on the machine that runs the comparison.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "baseline.json")
+DEFAULT_TOLERANCE = 0.5  # fail when a benchmark is more than 50% slower than its baseline (timings of fast calls vary by ~30%)
+
+# (grid size, team size) of the scenarios; obstacles cover OBSTACLE_DENSITY of the cells
+SCENARIOS = [(6, 2), (20, 10), (50, 50), (100, 200), (200, 500)]
+OBSTACLE_DENSITY = 0.1
+SEED = 0
+
+def scenario_name(size, agents):
+    return f"g{size}-a{agents}"
+
+class Scenario:
+    """A seeded random GridWorld with `agents` agents and as many goals, plus derived inputs."""
+
+    def __init__(self, size, agents, seed=SEED):
+        rng = random.Random(f"{seed}-{size}-{agents}")
+        cells = [(r, c) for r in range(size) for c in range(size)]
+        obstacles = set(rng.sample(cells, int(OBSTACLE_DENSITY * len(cells))))
+        free = [cell for cell in cells if cell not in obstacles]
+        picked = rng.sample(free, 2 * agents)
+        self.size = size
+        self.name = scenario_name(size, agents)
+        self.obstacles = obstacles
+        self.agents = picked[:agents]
+        self.goals = picked[agents:]
+        self.env = self.make_env()
+        self.distances = compute_distance_matrix(self.env)
+        self.rankings = compute_greedy_rankings(self.env)
+
+    def make_env(self):
+        env = GridWorld(self.size, self.obstacles)
+        env.agents = self.agents[:]
+        env.goals = self.goals[:]
+        return env
+
+def _neighbours(pos):
+    r, c = pos
+    return [(r + 1, c), (r - 1, c), (r, c - 1), (r, c + 1)]
+
+def bench_shortest_path_length(scn):
+    """One agent-to-goal distance per agent from the cached distance fields."""
+    env, pairs = scn.env, list(zip(scn.agents, scn.goals))
+    return lambda: [shortest_path_length(a, g, env) for a, g in pairs]
+
+def bench_shortest_path_length_cold(scn):
+    """One distance after dropping the cached fields, i.e. a full BFS."""
+    env, start, goal = scn.env, scn.agents[0], scn.goals[0]
+
+    def op():
+        env.invalidate_distance_fields()
+        return shortest_path_length(start, goal, env)
+    return op
+
+def _bench_search(method):
+    def bench(scn):
+        """One distance with a single-pair search instead of the cached distance field."""
+        env, start, goal = scn.env, scn.agents[0], scn.goals[0]
+        return lambda: env.distance(start, goal, method)
+    return bench
+
+def bench_shortest_path(scn):
+    """Full path from every agent to its own goal, descending the cached distance fields."""
+    env, pairs = scn.env, list(zip(scn.agents, scn.goals))
+    return lambda: [shortest_path(a, g, env) for a, g in pairs]
+
+def bench_is_reachable(scn):
+    """Every agent to its own goal, from the cached component labels."""
+    env, pairs = scn.env, list(zip(scn.agents, scn.goals))
+    return lambda: [env.is_reachable(a, g) for a, g in pairs]
+
+def bench_components_cold(scn):
+    """Component labelling of the free cells after dropping the cached labels."""
+    env = scn.env
+
+    def op():
+        env.invalidate_distance_fields()
+        return env.components
+    return op
+
+def bench_is_valid(scn):
+    """The four neighbours of every agent."""
+    env, cells = scn.env, [n for pos in scn.agents for n in _neighbours(pos)]
+    return lambda: [env.is_valid(cell) for cell in cells]
+
+def bench_get_valid_actions(scn):
+    env, agents = scn.env, scn.agents
+    return lambda: [env.get_valid_actions(pos) for pos in agents]
+
+def bench_select_direction_opt(scn):
+    """Every agent towards one of the goals lettered A-Z (agent i to goal i mod 26)."""
+    env, agents, goals = scn.env, scn.agents, scn.goals
+    targets = [chr(65 + i % 26) for i in range(len(agents))]
+    return lambda: [select_direction_opt(pos, t, goals, env) for pos, t in zip(agents, targets)]
+
+def bench_find_best_assignment(scn):
+    return lambda: find_best_assignment(scn.distances)
+
+def bench_resolve_conflicts(scn):
+    """Greedy (closest-first) rankings, so most agents start out on contested goals."""
+    active = [True] * len(scn.agents)
+    return lambda: resolve_conflicts(scn.rankings, active)
+
+def bench_greedy_episode(scn):
+    """A full GreedyPolicy run_episode from a fresh environment (distance fields included)."""
+    def op():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return run_episode(scn.make_env(), GreedyPolicy(), log_path=None, max_steps=4 * scn.size)
+    return op
+
+def _bench_renderer(render, backend):
+    def make(scn):
+        # Alternating agent orders changes every frame, so the last-frame cache never answers;
+        # the per-scenario static layers stay cached as they do across the steps of an episode
+        env, states = scn.make_env(), [scn.agents[:], scn.agents[::-1]]
+        turn = [0]
+
+        def op():
+            previous = get_renderer()
+            set_renderer(backend)
+            try:
+                env.agents = states[turn[0] % 2]
+                turn[0] += 1
+                return render(env, image_path=None)
+            finally:
+                set_renderer(previous)
+        return op
+    return make
+
+def prompt_kwargs(scn, builder):
+    """Arguments for `builder` from agent 1's point of view, by parameter name."""
+    n = len(scn.agents)
+    letters = [chr(65 + i) for i in range(n)]
+    pos, goal = scn.agents[0], scn.goals[0]
+    r, c = pos
+    values = {
+        "agent_id": 1, "self_id": 1, "opponent_id": 2,
+        "agent_pos": pos, "self_pos": pos, "agent1_pos": pos,
+        "agent2_pos": scn.agents[1], "opponent_pos": scn.agents[1],
+        "goal_pos": goal, "target_pos": goal, "goal1_pos": goal, "goal2_pos": scn.goals[1],
+        "valid_actions": scn.env.get_valid_actions(pos) or ["up"],
+        "grid_size": scn.size,
+        "obstacles": scn.obstacles,
+        "direction": "up",
+        "memory": [(r - 1, c, "up", r, c)] * 5,
+        "visits": {cell: 1 for cell in [pos, *_neighbours(pos)]},
+        "other_agents": [(j + 1, scn.agents[j]) for j in range(1, n)],
+        "goal_positions": scn.goals,
+        "agent_targets": [ranking[0] for ranking in scn.rankings],
+        "target_memory": [(step, "A", "closest goal") for step in range(5)],
+        "distances": {j + 1: row for j, row in enumerate(scn.distances)},
+        "declared_goal": "A",
+        "env": scn.env,
+        "rankings": {1: scn.rankings[0], 2: scn.rankings[1]},
+        "conflicted_goal": letters[0],
+        "previous_proposal": None,
+        "round_number": 1,
+    }
+    if builder is prompt.build_negotiation_prompt:
+        # Negotiation takes the declared targets keyed by agent id
+        values["agent_targets"] = {j + 1: target for j, target in enumerate(values["agent_targets"])}
+    return {
+        name: values[name]
+        for name, param in inspect.signature(builder).parameters.items()
+        if param.default is inspect.Parameter.empty
+    }
+
+def _bench_prompt(builder):
+    def make(scn):
+        # Caches are cleared on every call: this times a full build, not a memoized one
+        if builder is prompt.build_direction_choice_prompt:
+            inner = prompt.build_yesno_prompt_unassigned_goals
+            kwargs = prompt_kwargs(scn, inner)
+            kwargs.pop("direction")
+            pos = kwargs.pop("agent_pos")
+            args = (inner, scn.env.get_valid_actions(pos) or ["up"], pos)
+        else:
+            args, kwargs = (), prompt_kwargs(scn, builder)
+
+        def op():
+            prompt.clear_prompt_caches()
+            return builder(*args, **kwargs)
+        return op
+    return make
+
+# name -> (make(scenario) -> zero-argument op, largest grid size it runs on); the matplotlib
+# renderers and the step-by-step episode take seconds per call on the larger grids
+BENCHMARKS = {
+    "shortest_path_length": (bench_shortest_path_length, None),
+    "shortest_path_length_cold": (bench_shortest_path_length_cold, None),
+    "shortest_path_length[astar]": (_bench_search("astar"), None),
+    "shortest_path_length[bidirectional]": (_bench_search("bidirectional"), None),
+    "shortest_path": (bench_shortest_path, None),
+    "is_reachable": (bench_is_reachable, None),
+    "components_cold": (bench_components_cold, None),
+    "is_valid": (bench_is_valid, None),
+    "get_valid_actions": (bench_get_valid_actions, None),
+    "select_direction_opt": (bench_select_direction_opt, None),
+    "find_best_assignment": (bench_find_best_assignment, None),
+    "resolve_conflicts": (bench_resolve_conflicts, None),
+    "greedy_episode": (bench_greedy_episode, 50),
+}
+for _backend in RENDERERS:
+    for _render in (plot_grid, plot_grid_unassigned, plot_grid_unassigned_labeled):
+        BENCHMARKS[f"{_render.__name__}[{_backend}]"] = (_bench_renderer(_render, _backend), 20 if _backend == "matplotlib" else None)
+for _name, _builder in inspect.getmembers(prompt, inspect.isfunction):
+    if _name.startswith("build_"):
+        BENCHMARKS[f"prompt.{_name}"] = (_bench_prompt(_builder), None)
+
+def measure(op, min_time=0.05, repeat=5):
+    """
+    Best time per call of `op` over `repeat` runs of `number` calls, with `number` grown until one
+    run takes at least `min_time` seconds. An untimed first call fills the caches (distance fields,
+    figure layers) that an episode would already have.
+
+    Returns:
+        (seconds per call, number of calls per run)
+    """
+    op()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        best = min(best, time.perf_counter() - start)
+    return best / number, number
+
+def run_benchmarks(pattern=None, max_grid=None, min_time=0.05, repeat=5):
+    """Time every benchmark whose "name[scenario]" key matches `pattern`. Returns {key: seconds per call}."""
+    results = {}
+    for size, agents in SCENARIOS:
+        if max_grid is not None and size > max_grid:
+            continue
+        scn = None
+        for name, (make, limit) in BENCHMARKS.items():
+            key = f"{name}@{scenario_name(size, agents)}"
+            if (limit is not None and size > limit) or (pattern and not re.search(pattern, key)):
+                continue
+            scn = scn or Scenario(size, agents)
+            seconds, number = measure(make(scn), min_time, repeat)
+            results[key] = seconds
+            print(f"{key:70} {format_seconds(seconds):>10}  ({number} calls/run)", flush=True)
+    return results
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, results, tolerance):
+    """Write `results` into the baseline at `path`, keeping entries of benchmarks that were not run."""
+    baseline = load_baseline(path) or {}
+    merged = {**baseline.get("results", {}), **results}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "created": date.today().isoformat(),
+            "machine": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "python": platform.python_version(),
+            "tolerance": tolerance,
+            "results": dict(sorted(merged.items())),
+        }, f, indent=2)
+        f.write("\n")
+
+def compare(results, baseline, tolerance):
+    """
+    Print the timings next to their baseline and return the keys that are more than `tolerance`
+    (a fraction) slower. Benchmarks missing from the baseline are reported but never fail.
+    """
+    regressions = []
+    reference = baseline.get("results", {})
+    print(f"\n{'benchmark':70} {'current':>10} {'baseline':>10} {'ratio':>7}")
+    for key, seconds in results.items():
+        base = reference.get(key)
+        if base is None:
+            print(f"{key:70} {format_seconds(seconds):>10} {'-':>10} {'new':>7}")
+            continue
+        ratio = seconds / base
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:70} {format_seconds(seconds):>10} {format_seconds(base):>10} {ratio:>6.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the core hot paths and compare them with a stored baseline.")
+    parser.add_argument("--filter", type=str, default=None, help="Regex on 'benchmark@scenario' keys, e.g. 'prompt|@g20-'")
+    parser.add_argument("--max-grid", type=int, default=None, help="Skip scenarios with larger grids (sizes: 6, 20, 50, 100, 200)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per benchmark (the fastest counts)")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH, help="Baseline JSON to compare with or save to")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"Allowed slowdown as a fraction (default: the baseline's, else {DEFAULT_TOLERANCE})")
+    parser.add_argument("--save", action="store_true", help="Store the timings in the baseline instead of comparing")
+    parser.add_argument("--output", type=str, default=None, help="Also write the timings of this run to a JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter, args.max_grid, args.min_time, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = load_baseline(args.baseline)
+    tolerance = args.tolerance
+    if tolerance is None:
+        tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE) if baseline else DEFAULT_TOLERANCE
+
+    if args.save:
+        save_baseline(args.baseline, results, tolerance)
+        print(f"\nSaved {len(results)} timings to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save to record one.")
+        return 0
+    regressions = compare(results, baseline, tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {100 * tolerance:.0f}% slower than the baseline")
+        return 1
+    print(f"\nAll {len(results)} benchmarks within {100 * tolerance:.0f}% of the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import csv
+import os
+import pickle
+import random
+import re
+import tempfile
+import numpy as np
+from core.telemetry import timed
+
+CHECKPOINT_VERSION = 2  # 2: log rows are streamed to the CSV (RowLog), not stored in the state
+
+def _fsync_dir(directory):
+    # Make the rename itself durable; not supported on every platform
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write_bytes(path, data):
+    """Write `data` to `path` so that readers see either the old file or the complete new one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+def capture_rng():
+    """State of Python's and NumPy's global RNGs, so a resumed episode draws the same numbers."""
+    return {"python": random.getstate(), "numpy": np.random.get_state()}
+
+def restore_rng(state):
+    if state:
+        random.setstate(state["python"])
+        np.random.set_state(state["numpy"])
+
+class CheckpointStore:
+    """
+    Directory of episode checkpoints, one pickle per episode key (e.g. "agent_collab/case_3/t1").
+
+    Every save replaces the file atomically (temp file, fsync, rename), so a crash leaves either the
+    previous checkpoint or the new one, never a torn file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]+", "__", key) + ".ckpt")
+
+    @timed("checkpoint")
+    def save(self, key, state):
+        payload = {"version": CHECKPOINT_VERSION, "key": key, "state": state}
+        atomic_write_bytes(self.path(key), pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def load(self, key):
+        """The saved state for `key`, or None if there is none (or it is from another version)."""
+        try:
+            with open(self.path(key), "rb") as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path(key)}: {e}")
+            return None
+        if payload.get("version") != CHECKPOINT_VERSION or payload.get("key") != key:
+            return None
+        return payload["state"]
+
+    def clear(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def episode(self, key):
+        return EpisodeCheckpoint(self, key)
+
+class EpisodeCheckpoint:
+    """
+    Checkpoint handle for one episode, passed to an agent's run(checkpoint=...).
+
+    The agent calls save(state) at each resumable point (after every agent decision and at the end
+    of every step) with whatever its loop needs to continue: positions, goals, rankings, memories,
+    collisions, log rows, ... The RNG state is stored alongside and restored by load().
+    """
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def load(self):
+        state = self.store.load(self.key)
+        if state is not None:
+            restore_rng(state.pop("_rng", None))
+        return state
+
+    def save(self, state):
+        self.store.save(self.key, dict(state, _rng=capture_rng()))
+
+    def clear(self):
+        self.store.clear(self.key)
+
+class RowLog:
+    """
+    CSV of an episode's per-move log rows, written as they are produced so that a checkpoint stores
+    only the log's position (state()) instead of every row so far. Resuming from a saved position
+    drops the rows written after that checkpoint. The header is taken from the first row's keys.
+
+    Args:
+        path: CSV path; None writes nothing
+        state: RowLog.state() saved in a checkpoint, to continue that log
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self.fieldnames = state["fieldnames"] if state else None
+        self.size = state["size"] if state else 0
+        self._file = None
+        self._writer = None
+
+    def _open(self, row):
+        if self.fieldnames is not None and os.path.exists(self.path):
+            os.truncate(self.path, self.size)
+            self._file = open(self.path, "a", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+            return
+        self.fieldnames = list(row.keys())
+        self._file = open(self.path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+        self._writer.writeheader()
+
+    def append(self, row):
+        if self.path is None:
+            return
+        with timed("log"):
+            if self._file is None:
+                self._open(row)
+            self._writer.writerow(row)
+
+    def state(self):
+        """Position to resume from: the header fields and the size of the CSV written so far."""
+        if self._file is not None:
+            self._file.flush()
+            self.size = os.fstat(self._file.fileno()).st_size
+        return {"fieldnames": self.fieldnames, "size": self.size}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
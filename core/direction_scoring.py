@@ -0,0 +1,85 @@
+from core.prompt import build_direction_choice_prompt
+
+# How the yes/no agents score their valid directions:
+#   "yesno"       one YES/NO request per direction, scored by logprob(YES) (the original behaviour)
+#   "multichoice" one request listing all directions, scored by the first-token logprob of each direction word
+#   "both"        send both and move by the yes/no scores, counting how often the two modes agree
+SCORING_MODES = ("yesno", "multichoice", "both")
+
+def extract_direction_logprobs(logprobs, valid_actions):
+    """
+    Logprob of each valid direction as the first answer token (-inf when it is not among the top
+    logprobs). Tokens are compared stripped and lowercased, keeping the best of e.g. "up" / " Up".
+    """
+    scores = {a: float('-inf') for a in valid_actions}
+    if not logprobs:
+        return scores
+    for item in logprobs[0].top_logprobs:
+        token = item.token.strip().lower()
+        if token in scores:
+            scores[token] = max(scores[token], item.logprob)
+    return scores
+
+class DirectionAgreement:
+    """Tally of how often multi-choice scoring picks the same direction as the yes/no scoring."""
+
+    def __init__(self):
+        self.decisions = 0
+        self.agreed = 0
+
+    def record(self, yesno_scores, choice_scores):
+        best_yesno = max(yesno_scores, key=yesno_scores.get)
+        best_choice = max(choice_scores, key=choice_scores.get)
+        self.decisions += 1
+        self.agreed += best_yesno == best_choice
+        return best_yesno == best_choice
+
+    @property
+    def rate(self):
+        return self.agreed / self.decisions if self.decisions else None
+
+    def summary(self):
+        if not self.decisions:
+            return "Direction scoring agreement: no decisions recorded"
+        return f"Direction scoring agreement: {self.agreed}/{self.decisions} ({100 * self.rate:.1f}%) multichoice picks match yes/no"
+
+def score_directions(valid_actions, send, build_yesno_prompt, extract_yes, agent_pos, mode="yesno", agreement=None, **prompt_kwargs):
+    """
+    Score every valid direction of one agent in the selected mode.
+
+    Args:
+        valid_actions: directions to score
+        send: prompt -> (text, logprobs), e.g. a partial of send_image_to_model_openai_logprobs
+        build_yesno_prompt: the agent's yes/no prompt builder
+        extract_yes: the agent's logprobs -> logprob(YES) parser
+        agent_pos: agent's (row, col)
+        mode: one of SCORING_MODES
+        agreement: DirectionAgreement updated in "both" mode
+        **prompt_kwargs: remaining arguments of build_yesno_prompt, except direction and agent_pos
+
+    Returns:
+        (scores, responses): scores maps direction -> logprob used to pick the move; responses maps
+        direction -> (text, logprobs) of the request that scored it (shared by all directions in
+        "multichoice" mode)
+    """
+    if mode not in SCORING_MODES:
+        raise ValueError(f"Unknown direction scoring mode '{mode}', expected one of {SCORING_MODES}")
+    if not valid_actions:
+        return {}, {}
+
+    scores, responses = {}, {}
+    if mode != "multichoice":
+        for direction in valid_actions:
+            prompt = build_yesno_prompt(agent_pos=agent_pos, direction=direction, **prompt_kwargs)
+            responses[direction] = send(prompt)
+            scores[direction] = extract_yes(responses[direction][1])
+    if mode != "yesno":
+        prompt = build_direction_choice_prompt(build_yesno_prompt, valid_actions, agent_pos, **prompt_kwargs)
+        response = send(prompt)
+        choice_scores = extract_direction_logprobs(response[1], valid_actions)
+        if mode == "multichoice":
+            return choice_scores, {d: response for d in valid_actions}
+        agreement = agreement if agreement is not None else DirectionAgreement()
+        agrees = agreement.record(scores, choice_scores)
+        print(f"Multichoice scores: {choice_scores} ({'agrees' if agrees else 'disagrees'} with yes/no)")
+    return scores, responses
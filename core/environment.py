@@ -1,17 +1,153 @@
 import random
+from collections import Counter
 import yaml
-from collections import deque
-from core.utils import shortest_path_length
+import numpy as np
+from core.search import SEARCHES, resolve_search_method
+from core.utils import (
+    bfs_path_length, compute_distance_field, compute_distance_fields, label_components, UNREACHABLE,
+    NO_COMPONENT
+)
+
+# Bit codes of GridWorld.occupancy; a cell holding both an agent and a goal is AGENT | GOAL
+FREE = 0
+OBSTACLE = 1
+AGENT = 2
+GOAL = 4
+
+def _cell(pos):
+    return tuple(pos) if pos is not None else None
+
+class CellList(list):
+    """
+    The agent or goal positions of a GridWorld: a plain list of (row, col) tuples (None for agents
+    and goals that left the grid) that keeps the world's occupancy array and position hash in sync
+    on every assignment, append or pop. Copies (`agents[:]`, pickling) are plain lists.
+    """
+
+    def __init__(self, env, code, positions=()):
+        super().__init__(_cell(pos) for pos in positions)
+        self._env = env
+        self._code = code
+        self.counts = {}  # position -> number of entries there
+        for pos in self:
+            self._add(pos)
+
+    def _add(self, pos):
+        if pos is None:
+            return
+        count = self.counts.get(pos, 0)
+        self.counts[pos] = count + 1
+        if count == 0 and self._env is not None:
+            self._env._mark(pos, self._code, True)
+
+    def _remove(self, pos):
+        if pos is None:
+            return
+        count = self.counts[pos] - 1
+        if count:
+            self.counts[pos] = count
+        else:
+            del self.counts[pos]
+            if self._env is not None:
+                self._env._mark(pos, self._code, False)
+
+    def _recount(self):
+        if self._env is not None:
+            for pos in self.counts:
+                self._env._mark(pos, self._code, False)
+        self.counts = {}
+        for pos in self:
+            self._add(pos)
+
+    def detach(self):
+        """Stop updating the world (the list was replaced); its cells are cleared from the occupancy."""
+        if self._env is not None:
+            for pos in self.counts:
+                self._env._mark(pos, self._code, False)
+        self._env = None
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super().__setitem__(index, [_cell(pos) for pos in value])
+            self._recount()
+            return
+        old, new = self[index], _cell(value)
+        super().__setitem__(index, new)
+        self._remove(old)
+        self._add(new)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._recount()
+
+    def __iadd__(self, positions):
+        self.extend(positions)
+        return self
+
+    def __imul__(self, times):
+        super().__imul__(times)
+        self._recount()
+        return self
+
+    def append(self, pos):
+        pos = _cell(pos)
+        super().append(pos)
+        self._add(pos)
+
+    def extend(self, positions):
+        positions = [_cell(pos) for pos in positions]
+        super().extend(positions)
+        for pos in positions:
+            self._add(pos)
+
+    def insert(self, index, pos):
+        pos = _cell(pos)
+        super().insert(index, pos)
+        self._add(pos)
+
+    def pop(self, index=-1):
+        pos = super().pop(index)
+        self._remove(pos)
+        return pos
+
+    def remove(self, pos):
+        super().remove(pos)
+        self._remove(_cell(pos))
+
+    def clear(self):
+        super().clear()
+        self._recount()
+
+    def __reduce_ex__(self, protocol):
+        return (list, (list(self),))
 
 class GridWorld:
+    """
+    Square grid of `size` x `size` cells with obstacles, agents and goals.
+
+    `obstacles` is a set and `agents` / `goals` are lists of (row, col) tuples, as before; alongside
+    them the world keeps `occupancy`, a dense (size, size) uint8 array of FREE / OBSTACLE / AGENT / GOAL
+    bits, and a hash of the occupied agent cells, both updated on every change through those
+    attributes. Validity checks are O(1) and array code (BFS, rendering, the vectorized engines) can
+    read the grid directly. The connected components of the free cells are labelled once per obstacle
+    set, so reachability and solvability checks are O(1) per pair.
+    """
+
     def __init__(self, size_or_config, obstacles=None):
+        self._size = 0
+        self._obstacles = set()
+        self._agents = CellList(self, AGENT)
+        self._goals = CellList(self, GOAL)
+        self._distance_fields = {}
+        self._components = None
+        self.obstacle_key = frozenset()  # frozen copy of `obstacles` for cache keys (rendering)
         if isinstance(size_or_config, str):
             # Assume it's a path to a YAML config file
             self._load_from_config(size_or_config)
         else:
             # Manual size + optional obstacles mode
             self.size = size_or_config
-            self.obstacles = set(obstacles or [])
+            self.obstacles = obstacles or []
             self.agents = []
             self.goals = []
 
@@ -26,35 +162,289 @@ class GridWorld:
             raise ValueError("Config file missing required 'size' field or is not a valid dictionary.")
 
         self.size = cfg["size"]
-        self.obstacles = {tuple(pos) for pos in cfg.get("obstacles", [])}
+        self.obstacles = [tuple(pos) for pos in cfg.get("obstacles", [])]
         self.agents = [tuple(pos) for pos in cfg.get("agents", [])]
         self.goals = [tuple(pos) for pos in cfg.get("goals", [])]
 
+    def __getstate__(self):
+        """Pickle / deepcopy the plain lists; the occupancy, the CellLists and the caches are rebuilt on load."""
+        return {
+            "size": self._size,
+            "obstacles": sorted(self._obstacles),
+            "agents": list(self._agents),
+            "goals": list(self._goals),
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["size"], state["obstacles"])
+        self.agents = state["agents"]
+        self.goals = state["goals"]
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        self._size = size
+        self._rebuild_occupancy()
+
+    @property
+    def obstacles(self):
+        return self._obstacles
+
+    @obstacles.setter
+    def obstacles(self, obstacles):
+        self._obstacles = set(obstacles)
+        self.invalidate_distance_fields()
+
+    @property
+    def agents(self):
+        return self._agents
+
+    @agents.setter
+    def agents(self, positions):
+        self._agents.detach()
+        self._agents = CellList(self, AGENT, positions)
+
+    @property
+    def goals(self):
+        return self._goals
+
+    @goals.setter
+    def goals(self, positions):
+        self._goals.detach()
+        self._goals = CellList(self, GOAL, positions)
+
+    def invalidate_distance_fields(self):
+        """
+        Drop all cached distance fields and component labels and redraw the obstacles in `occupancy`.
+        Assigning `env.obstacles` does this automatically; call it by hand after mutating the obstacle
+        set in place.
+        """
+        self._distance_fields = {}
+        self._components = None
+        self.obstacle_key = frozenset(self._obstacles)
+        self._draw_obstacles()
+
+    def _rebuild_occupancy(self):
+        self.occupancy = np.zeros((self._size, self._size), dtype=np.uint8)
+        self._components = None
+        self._draw_obstacles()
+        for cells in (self._agents, self._goals):
+            for pos in cells.counts:
+                self._mark(pos, cells._code, True)
+
+    def _draw_obstacles(self):
+        self.occupancy &= ~np.uint8(OBSTACLE)
+        for pos in self._obstacles:
+            self._mark(pos, OBSTACLE, True)
+
+    def _mark(self, pos, code, present):
+        row, col = pos
+        if 0 <= row < self._size and 0 <= col < self._size:
+            if present:
+                self.occupancy[row, col] |= code
+            else:
+                self.occupancy[row, col] &= ~np.uint8(code)
+
+    def free_cells(self):
+        """(size, size) bool array, True where there is no obstacle (agents and goals do not block)."""
+        return (self.occupancy & OBSTACLE) == 0
+
+    def _component_labels(self):
+        if self._components is None:
+            self._components = label_components(self.free_cells())
+        return self._components
+
+    @property
+    def components(self):
+        """(size, size) int32 array of component ids of the free cells, NO_COMPONENT on obstacles."""
+        return self._component_labels()[0]
+
+    @property
+    def component_sizes(self):
+        """Number of cells of each component, indexed by component id."""
+        return self._component_labels()[1]
+
+    def component(self, pos):
+        """Component id of `pos`, NO_COMPONENT for obstacles and cells outside the grid."""
+        row, col = pos
+        if 0 <= row < self._size and 0 <= col < self._size:
+            return int(self.components[row, col])
+        return NO_COMPONENT
+
+    def is_reachable(self, start, goal):
+        """
+        Whether a 4-connected path around obstacles leads from `start` to `goal` (other agents are
+        ignored), with the same semantics as a BFS from `start` (and as distance() being finite).
+        """
+        start, goal = tuple(start), tuple(goal)
+        if start == goal:
+            return True
+        label = self.component(goal)
+        if label == NO_COMPONENT:
+            return False
+        if self.component(start) == label:
+            return True
+        if 0 <= start[0] < self._size and 0 <= start[1] < self._size and start not in self._obstacles:
+            return False
+
+        # Start outside the free cells: a BFS would still step into any free neighbour
+        row, col = start
+        return any(
+            self.component((row + dr, col + dc)) == label
+            for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        )
+
+    def is_solvable(self):
+        """
+        Whether every agent on the grid can be assigned a distinct goal it can reach, i.e. no
+        component holds more agents than goals (agents and goals that left the grid are skipped).
+        """
+        agents = Counter(self.component(pos) for pos in self._agents if pos is not None)
+        goals = Counter(self.component(pos) for pos in self._goals if pos is not None)
+        if agents[NO_COMPONENT]:
+            return False
+        return all(goals[label] >= count for label, count in agents.items())
+
+    def distance_field(self, goal):
+        """
+        Return the BFS distance field towards `goal`, computing it on first use.
+
+        Returns:
+            np.ndarray: (size, size) int32 array of step counts to `goal`, UNREACHABLE (-1) where blocked.
+        """
+        goal = tuple(goal)
+        field = self._distance_fields.get(goal)
+        if field is None or field.shape[0] != self.size:
+            field = compute_distance_field(goal, self.size, self._obstacles)
+            self._distance_fields[goal] = field
+        return field
+
+    def distance_fields(self, goals):
+        """
+        Stack the distance fields for several goals, computing all missing ones in one batched BFS.
+
+        Returns:
+            np.ndarray: (len(goals), size, size) int32 array.
+        """
+        goals = [tuple(g) for g in goals]
+        missing = [
+            g for g in dict.fromkeys(goals)
+            if g not in self._distance_fields or self._distance_fields[g].shape[0] != self.size
+        ]
+        if missing:
+            fields = compute_distance_fields(missing, self.size, self._obstacles, free=self.free_cells())
+            for goal, field in zip(missing, fields):
+                self._distance_fields[goal] = field
+        if not goals:
+            return np.empty((0, self.size, self.size), dtype=np.int32)
+        return np.stack([self._distance_fields[g] for g in goals])
+
+    def distance(self, start, goal, method=None):
+        """
+        Shortest 4-connected path length from `start` to `goal` around obstacles (other agents are
+        ignored), with the same semantics as a BFS from `start`: float('inf') if there is no path.
+
+        Args:
+            method: one of core.search.SEARCH_METHODS, default the selected one ("field": the
+                cached distance field of `goal`; "astar" / "bidirectional" for one-off queries on
+                large grids, which skip the O(size^2) field and component labelling)
+        """
+        if start == goal:
+            return 0
+        method = resolve_search_method(method)
+        if method != "field":
+            if self._components is not None and not self.is_reachable(start, goal):
+                return float('inf')
+            if method in SEARCHES:
+                return SEARCHES[method](start, goal, self.free_cells())
+            return bfs_path_length(start, goal, self)
+        if not self.is_reachable(start, goal):
+            return float('inf')
+        field = self.distance_field(goal)
+        row, col = start
+        if 0 <= row < self.size and 0 <= col < self.size and start not in self._obstacles:
+            dist = field[row, col]
+            return int(dist) if dist != UNREACHABLE else float('inf')
+
+        # Start outside the free cells: a BFS would still step into any free neighbour
+        best = float('inf')
+        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            nr, nc = row + dr, col + dc
+            if 0 <= nr < self.size and 0 <= nc < self.size and (nr, nc) not in self._obstacles:
+                dist = field[nr, nc]
+                if dist != UNREACHABLE:
+                    best = min(best, int(dist) + 1)
+        return best
+
     def is_valid(self, pos):
         row, col = pos
         return (
-            0 <= row < self.size and
-            0 <= col < self.size and
-            pos not in self.obstacles and
-            pos not in self.agents
+            0 <= row < self._size and
+            0 <= col < self._size and
+            pos not in self._obstacles and
+            pos not in self._agents.counts
         )
 
-    def sample_position(self, exclude=None):
-        exclude = set(exclude or [])
-        candidates = [
-            (r, c)
-            for r in range(self.size)
-            for c in range(self.size)
-            if self.is_valid((r, c)) and (r, c) not in exclude
-        ]
+    def _open_cells(self, exclude, component=None):
+        mask = (self.occupancy & (OBSTACLE | AGENT)) == 0
+        if component is not None:
+            mask &= self.components == component
+        return [(r, c) for r, c in np.argwhere(mask).tolist() if (r, c) not in exclude]
+
+    def sample_position(self, exclude=None, component=None):
+        """
+        Random cell free of obstacles and agents and not in `exclude`, optionally restricted to one
+        component; None if there is none.
+        """
+        candidates = self._open_cells(set(exclude or []), component)
         return random.choice(candidates) if candidates else None
 
-    def initialize_agents_goals(self, num_agents=1):
+    def sample_pair(self, exclude=None):
+        """
+        Random start and goal cell in the same component (so the goal is reachable from the start),
+        both free of obstacles and agents and not in `exclude`.
+
+        Returns:
+            tuple: (start, goal), or None if no component has two such cells.
+        """
+        open_cells = self._open_cells(set(exclude or []))
+        components = self.components
+        labels = [int(components[r, c]) for r, c in open_cells]
+        counts = Counter(labels)
+        candidates = [(pos, label) for pos, label in zip(open_cells, labels) if counts[label] > 1]
+        if not candidates:
+            return None
+        start, label = random.choice(candidates)
+        goal = random.choice([pos for pos, other in candidates if other == label and pos != start])
+        return start, goal
+
+    def initialize_agents_goals(self, num_agents=1, solvable=False):
+        """
+        Place `num_agents` agents and as many goals on random free cells.
+
+        Args:
+            solvable: sample each agent together with a goal in its component (sample_pair), so that
+                is_solvable() holds, instead of placing all agents and then all goals independently
+        """
         self.agents = []
         self.goals = []
 
         used = set(self.obstacles)
 
+        if solvable:
+            for _ in range(num_agents):
+                pair = self.sample_pair(used)
+                if pair is None:
+                    raise ValueError(f"No room for {num_agents} agent/goal pairs in connected cells.")
+                agent, goal = pair
+                used.update(pair)
+                self.agents.append(agent)
+                self.goals.append(goal)
+            return
+
         for _ in range(num_agents):
             agent = self.sample_position(used)
             used.add(agent)
@@ -127,12 +517,13 @@ class GridWorld:
         else:
             raise IndexError("Goal index out of range.")
 
-    def assignment_cost(self, assignment: dict[int, str]) -> int:
+    def assignment_cost(self, assignment: dict[int, str], method=None) -> int:
         """
         Compute the maximum BFS path length (cost) of a given agent-to-goal assignment.
 
         Args:
             assignment (dict[int, str]): Mapping from agent ID (1-based) to goal letter ('A', 'B', ...)
+            method: search method of distance(), default the selected one
 
         Returns:
             int: The maximum path length among all agent-goal pairs (team cost).
@@ -154,7 +545,6 @@ class GridWorld:
             if agent_pos is None or goal_pos is None:
                 costs.append(float('inf'))
             else:
-                dist = shortest_path_length(agent_pos, goal_pos, self)
-                costs.append(dist)
+                costs.append(self.distance(agent_pos, goal_pos, method))
 
         return max(costs) if costs else float('inf')
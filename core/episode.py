@@ -0,0 +1,480 @@
+import bisect
+from collections import deque
+from functools import partial
+from core.checkpoint import RowLog
+from core.environment import GridWorld
+from core.plot import plot_grid_unassigned_labeled
+from core.request import gather_requests, DEFAULT_MAX_CONCURRENCY
+from core.telemetry import timed
+from core.utils import shortest_path_length, select_direction_opt
+
+MEMORY_LENGTH = 5  # moves (and target choices) each agent remembers
+
+def resolve_conflicts(agent_rankings, active_agents):
+    """Each agent gets its highest-ranked goal not taken by a lower-index agent."""
+    final_goals = [rank[0] if rank else None for rank in agent_rankings]
+    positions = [0 for _ in agent_rankings]
+
+    while True:
+        goal_to_agents = {}
+        for idx, goal in enumerate(final_goals):
+            if active_agents[idx] and goal:
+                goal_to_agents.setdefault(goal, []).append(idx)
+
+        conflicts_exist = any(len(lst) > 1 for lst in goal_to_agents.values())
+        if not conflicts_exist:
+            break
+
+        for goal, agents in goal_to_agents.items():
+            if len(agents) <= 1:
+                continue
+            agents.sort()  # Ensure lower index agent wins
+            for loser_idx in agents[1:]:
+                positions[loser_idx] += 1
+                if positions[loser_idx] < len(agent_rankings[loser_idx]):
+                    final_goals[loser_idx] = agent_rankings[loser_idx][positions[loser_idx]]
+                else:
+                    final_goals[loser_idx] = None
+    return final_goals
+
+def resolve_collisions(positions, proposals):
+    """
+    Agents proposing a cell already held by a lower-index agent stay where they are.
+
+    Gives the same positions and collision count as the pairwise loop the agents used
+    (for i < j: if new[i] == new[j], count a collision and send j back), but indexes final cells
+    in a dict, so it is O(n log n) instead of O(n²). Agents whose position is None are ignored.
+
+    Returns:
+        (new_positions, collisions)
+    """
+    new_positions = list(proposals)
+    holders = {}  # cell -> increasing indices of agents whose final position is that cell
+    collisions = 0
+    for j, start in enumerate(positions):
+        if start is None:
+            continue
+        blockers = holders.get(new_positions[j])
+        if blockers:
+            # The first blocker sends j back; every later agent already holding j's start cell
+            # counts as one more collision in the pairwise loop
+            collisions += 1
+            new_positions[j] = start
+            at_start = holders.get(start, [])
+            collisions += len(at_start) - bisect.bisect_right(at_start, blockers[0])
+        holders.setdefault(new_positions[j], []).append(j)
+    return new_positions, collisions
+
+def negotiate_conflicts(ep, rankings, run_negotiation):
+    """
+    Each agent takes its top-ranked goal; every pair of active agents that picked the same goal
+    settles it with `run_negotiation` (an agent's conflict_tuple -> {"Agent <id>": goal} function).
+    Goals picked by three or more agents are left as they are.
+    """
+    proposed_goals = [rank[0] if rank else None for rank in rankings]
+
+    goal_to_agents = {}
+    for idx, tgt in enumerate(proposed_goals):
+        if ep.active[idx] and tgt:
+            goal_to_agents.setdefault(tgt, []).append(idx)
+
+    conflict_pairs = [
+        (a1, a2, goal)
+        for goal, agents in goal_to_agents.items()
+        if len(agents) == 2
+        for a1, a2 in [tuple(sorted(agents))]
+    ]
+    print("Conflict pairs detected:", conflict_pairs)
+
+    for conflict in conflict_pairs:
+        resolution = run_negotiation(
+            env=ep.env,
+            conflict_tuple=conflict,
+            agent_ids=ep.agent_ids,
+            agent_positions=ep.agent_positions,
+            goal_positions=ep.env.goals,
+            distances=ep.distance_table(),
+            agent_rankings=rankings
+        )
+        if resolution:
+            for aid_str, tgt in resolution.items():
+                aid = int(aid_str.split()[-1])
+                proposed_goals[ep.agent_ids.index(aid)] = tgt
+    return proposed_goals
+
+def claim_goals(env: GridWorld, positions, active):
+    """
+    Retire active agents standing on a goal and clear the claimed goals from env.goals.
+    Returns the indices of the claiming agents.
+    """
+    goal_slots = {}
+    for idx, goal in enumerate(env.goals):
+        if goal is not None:
+            goal_slots.setdefault(goal, deque()).append(idx)
+
+    claimers = [i for i, pos in enumerate(positions) if active[i] and pos in goal_slots]
+    for i in claimers:
+        slots = goal_slots[positions[i]]
+        if slots:
+            env.goals[slots.popleft()] = None
+    return claimers
+
+def make_env(config_path=None, grid_size=6, obstacles=None, num_agents=3, agent_starts=None, goal_positions=None):
+    """The GridWorld for an agent's run(): loaded from `config_path`, else built from the other arguments."""
+    if config_path:
+        return GridWorld(config_path)
+    env = GridWorld(grid_size, obstacles=obstacles)
+    if agent_starts and goal_positions:
+        env.initialize_agents_goals_custom(agents=agent_starts, goals=goal_positions)
+    else:
+        env.initialize_agents_goals(num_agents=num_agents)
+    return env
+
+class Episode:
+    """
+    State of one run, shared by run_episode and the policy: positions, active flags, per-agent
+    visits / move memories / target memories, the targets of the previous step, rankings, counters
+    and the log of moves (written to the CSV as it grows).
+
+    Args:
+        env: GridWorld with the starting positions
+        obstacles: obstacle set shown to the policy's prompts (defaults to env.obstacles)
+        log_path: CSV for the per-move log rows; None keeps no log
+    """
+
+    def __init__(self, env: GridWorld, obstacles=None, log_path=None):
+        self.env = env
+        self.grid_size = env.size
+        self.obstacles = env.obstacles if obstacles is None else obstacles
+        self.num_agents = len(env.agents)
+        self.agent_ids = list(range(1, self.num_agents + 1))
+        self.agent_positions = env.agents[:]
+        self.active = [True] * self.num_agents
+        self.visits = [{} for _ in range(self.num_agents)]
+        self.memories = [[] for _ in range(self.num_agents)]
+        self.target_memories = [[] for _ in range(self.num_agents)]
+        self.target_goals = [None] * self.num_agents
+        self.rankings = [[] for _ in range(self.num_agents)]
+        self.step = 0
+        self.collisions = 0
+        self.log = RowLog(log_path)
+        self.image = None
+        self._distance_table = None
+
+        self.total_opt = sum(
+            min([shortest_path_length(start, g, env) for g in env.goals if g is not None], default=0)
+            for start in env.agents if start is not None
+        )
+
+    def active_agents(self):
+        return [i for i in range(self.num_agents) if self.active[i] and self.agent_positions[i] is not None]
+
+    def other_agents(self, i):
+        """(agent id, position) of every agent still on the grid except agent i."""
+        return [
+            (self.agent_ids[j], self.agent_positions[j])
+            for j in range(self.num_agents)
+            if j != i and self.agent_positions[j] is not None
+        ]
+
+    def distance_table(self):
+        """Agent id -> BFS distance to every goal (inf for finished agents / claimed goals), once per step."""
+        if self._distance_table is None:
+            env = self.env
+            self._distance_table = {
+                self.agent_ids[j]: [
+                    shortest_path_length(pos, goal, env) if pos and goal else float("inf")
+                    for goal in env.goals
+                ]
+                for j, pos in enumerate(self.agent_positions)
+            }
+        return self._distance_table
+
+    def visit(self, i):
+        pos = self.agent_positions[i]
+        self.visits[i][pos] = self.visits[i].get(pos, 0) + 1
+
+    def remember_move(self, i, before, direction, after):
+        self.memories[i].append((before[0], before[1], direction, after[0], after[1]))
+        if len(self.memories[i]) > MEMORY_LENGTH:
+            self.memories[i] = self.memories[i][-MEMORY_LENGTH:]
+
+    _STATE_FIELDS = (
+        "agent_positions", "active", "visits", "memories", "target_memories", "target_goals",
+        "rankings", "step", "collisions", "total_opt",
+    )
+
+    def state(self):
+        state = {name: getattr(self, name) for name in self._STATE_FIELDS}
+        state.update(env_agents=self.env.agents, env_goals=self.env.goals, log=self.log.state())
+        return state
+
+    def load_state(self, state):
+        for name in self._STATE_FIELDS:
+            setattr(self, name, state[name])
+        self.env.agents, self.env.goals = state["env_agents"], state["env_goals"]
+        self.log.close()
+        self.log = RowLog(self.log.path, state["log"])
+        self._distance_table = None
+
+class Policy:
+    """
+    Decision hooks for run_episode. The default is the shortest-path baseline: keep the current
+    rankings, resolve conflicts by agent index and step along a BFS shortest path.
+
+    Subclasses override only the phases they change:
+        rank(ep)                         -> per-agent goal rankings (lists of letters) for this step
+        assign(ep, rankings)             -> per-agent target goal letter
+        choose_directions(ep, targets)   -> {agent index: (direction or None, extra log fields)}
+        choose_direction(ep, i, target)  -> (direction or None, extra log fields), one agent at a time
+    """
+
+    render = None  # plot function called once per step (e.g. plot_grid_unassigned_labeled); result in ep.image
+
+    def rank(self, ep: Episode):
+        return ep.rankings
+
+    def assign(self, ep: Episode, rankings):
+        return resolve_conflicts(rankings, ep.active)
+
+    def targets(self, ep: Episode):
+        with timed("rank"):
+            ep.rankings = self.rank(ep)
+        with timed("assign"):
+            return self.assign(ep, ep.rankings)
+
+    def choose_directions(self, ep: Episode, targets):
+        return {i: self.choose_direction(ep, i, targets[i]) for i in ep.active_agents()}
+
+    def choose_direction(self, ep: Episode, i, target):
+        return select_direction_opt(ep.agent_positions[i], target, ep.env.goals, ep.env), {}
+
+    def state(self):
+        """Extra policy state for checkpoints."""
+        return {}
+
+    def load_state(self, state):
+        pass
+
+class RankOncePolicy(Policy):
+    """Wraps a policy so goals are ranked and assigned on the first step only, then kept."""
+
+    def __init__(self, policy: Policy):
+        self.policy = policy
+        self.render = policy.render
+        self.fixed_targets = None
+
+    def targets(self, ep: Episode):
+        if self.fixed_targets is None:
+            self.fixed_targets = self.policy.targets(ep)
+            print("Proposed goals after conflict resolution:", self.fixed_targets)
+        return self.fixed_targets
+
+    def choose_directions(self, ep: Episode, targets):
+        return self.policy.choose_directions(ep, targets)
+
+    def state(self):
+        return {"fixed_targets": self.fixed_targets, "inner": self.policy.state()}
+
+    def load_state(self, state):
+        self.fixed_targets = state.get("fixed_targets")
+        self.policy.load_state(state.get("inner", {}))
+
+class LLMRankingPolicy(Policy):
+    """
+    Ranks goals with one vision-LLM request per active agent, sent concurrently, then moves along
+    BFS shortest paths.
+
+    Args:
+        build_prompt: ranking prompt builder (core.prompt.build_target_ranking_prompt or a variant)
+        request: async request function taking (image, prompt), e.g. a partial of
+            send_image_to_model_openai_logprobs_async with the model bound
+        finish: agent's finish_target_selection(agent_id, response, goal_positions, target_memory, step)
+        response_index: position of the response text in the request's result tuple
+        max_concurrency: bound on in-flight requests
+        negotiate: optional run_negotiation function; conflicting pairs then negotiate
+            (negotiate_conflicts) instead of yielding to the lower index
+        explanation: text logged with each deterministic move
+    """
+
+    render = staticmethod(plot_grid_unassigned_labeled)
+
+    def __init__(self, build_prompt, request, finish, response_index=0, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 negotiate=None, explanation="Chose shortest path step deterministically."):
+        self.build_prompt = build_prompt
+        self.request = request
+        self.finish = finish
+        self.response_index = response_index
+        self.max_concurrency = max_concurrency
+        self.negotiate = negotiate
+        self.explanation = explanation
+
+    def ranking_prompt(self, ep: Episode, i):
+        return self.build_prompt(
+            agent_id=ep.agent_ids[i],
+            agent_pos=ep.agent_positions[i],
+            goal_positions=ep.env.goals,
+            other_agents=ep.other_agents(i),
+            grid_size=ep.grid_size,
+            obstacles=ep.obstacles,
+            memory=ep.memories[i],
+            visits=ep.visits[i],
+            agent_targets=ep.target_goals,
+            target_memory=ep.target_memories[i],
+            distances=ep.distance_table()
+        )
+
+    def rank(self, ep: Episode):
+        jobs = []
+        for i in ep.active_agents():
+            ep.visit(i)
+            jobs.append((i, self.ranking_prompt(ep, i)))
+
+        responses = gather_requests(
+            [partial(self.request, ep.image, prompt) for _, prompt in jobs],
+            max_concurrency=self.max_concurrency
+        )
+        rankings = ep.rankings[:]
+        for (i, _), result in zip(jobs, responses):
+            ranking, _, _ = self.finish(ep.agent_ids[i], result[self.response_index], ep.env.goals, ep.target_memories[i], ep.step)
+            rankings[i] = ranking
+        return rankings
+
+    def assign(self, ep: Episode, rankings):
+        if self.negotiate is None:
+            return super().assign(ep, rankings)
+        return negotiate_conflicts(ep, rankings, self.negotiate)
+
+    def choose_direction(self, ep: Episode, i, target):
+        direction, _ = super().choose_direction(ep, i, target)
+        return direction, {"explanation": self.explanation}
+
+class LLMDirectionPolicy(LLMRankingPolicy):
+    """
+    LLMRankingPolicy that also lets the model pick every move, scoring each valid direction by the
+    logprob of a YES answer.
+
+    Args:
+        select_direction: agent's select_direction(...) -> (best, explanation, logprobs, scores)
+        extract_top_goals: agent's extract_top_goals(logprobs) -> [(goal, logprob), ...]
+        Remaining arguments as for LLMRankingPolicy.
+    """
+
+    def __init__(self, build_prompt, request, finish, select_direction, extract_top_goals, **kwargs):
+        super().__init__(build_prompt, request, finish, **kwargs)
+        self.select_direction = select_direction
+        self.extract_top_goals = extract_top_goals
+
+    def choose_direction(self, ep: Episode, i, target):
+        best, explanation, logprobs, scores = self.select_direction(
+            agent_id=ep.agent_ids[i],
+            agent_pos=ep.agent_positions[i],
+            declared_goal=target,
+            goal_positions=ep.env.goals,
+            other_agents=ep.other_agents(i),
+            grid_size=ep.grid_size,
+            obstacles=ep.obstacles,
+            memory=ep.memories[i],
+            visits=ep.visits[i],
+            agent_targets=ep.target_goals,
+            image_path=ep.image,
+            env=ep.env
+        )
+        if not best:
+            return None, {}
+        top_goals = self.extract_top_goals(logprobs)
+        return best, {
+            "logprob_yes": f"{scores[best]:.5f}",
+            "target_goal": ep.target_goals[i],
+            "goal_top1": top_goals[0][0] if len(top_goals) > 0 else "",
+            "goal_top1_logprob": f"{top_goals[0][1]:.5f}" if len(top_goals) > 0 else "",
+            "goal_top2": top_goals[1][0] if len(top_goals) > 1 else "",
+            "goal_top2_logprob": f"{top_goals[1][1]:.5f}" if len(top_goals) > 1 else "",
+            "explanation": explanation,
+        }
+
+def run_episode(env: GridWorld, policy: Policy, log_path=None, max_steps=100, image_path=None,
+                obstacles=None, checkpoint=None):
+    """
+    Run one episode: every step the policy ranks and assigns goals and picks moves; then
+    collisions are resolved (lower index wins), agents on goals claim them, and the step is logged.
+
+    Args:
+        env: GridWorld with the starting positions; updated in place
+        policy: Policy deciding targets and moves
+        log_path: CSV for the per-move log rows, written as they are made (skipped when None or nothing moved)
+        max_steps: step cap
+        image_path: also write the rendered grid here (policies with `render`); None keeps it in memory
+        obstacles: obstacle set shown to the policy's prompts, defaults to env.obstacles
+        checkpoint: optional core.checkpoint.EpisodeCheckpoint, saved after every step and resumed from
+
+    Returns:
+        (steps, total_opt, failed, collisions)
+    """
+    ep = Episode(env, obstacles, log_path)
+
+    print(f"Initial agent positions: {ep.agent_positions}")
+    print(f"Goal positions: {env.goals}")
+    print(f"Obstacles: {ep.obstacles}")
+
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        ep.load_state(state["episode"])
+        policy.load_state(state["policy"])
+        print(f"Resuming from checkpoint at step {ep.step}")
+
+    while any(ep.active) and ep.step < max_steps:
+        print(f"\n--- Step {ep.step} ---")
+        if policy.render is not None:
+            ep.image = policy.render(env, image_path=image_path)
+
+        # Phases 1-2: ranking and goal assignment
+        targets = policy.targets(ep)
+
+        # Phase 3: direction selection
+        proposals = ep.agent_positions[:]
+        with timed("directions"):
+            choices = policy.choose_directions(ep, targets)
+        for i, (direction, fields) in choices.items():
+            before = ep.agent_positions[i]
+            if not direction:
+                continue
+            proposals[i] = env.move_agent(before, direction)
+            ep.log.append({
+                "step": ep.step,
+                "agent_id": ep.agent_ids[i],
+                "position_before": before,
+                "position_after": proposals[i],
+                "chosen_direction": direction,
+                **fields,
+            })
+            ep.remember_move(i, before, direction, proposals[i])
+
+        ep.target_goals = targets[:]
+
+        with timed("resolve"):
+            # Collision resolution
+            ep.agent_positions, step_collisions = resolve_collisions(ep.agent_positions, proposals)
+            ep.collisions += step_collisions
+            env.agents = ep.agent_positions[:]
+
+            # Goal claiming
+            for i in claim_goals(env, ep.agent_positions, ep.active):
+                print(f"Agent {ep.agent_ids[i]} reached goal at {ep.agent_positions[i]}")
+                ep.active[i] = False
+                ep.agent_positions[i] = None
+                env.agents[i] = None
+                ep.target_goals[i] = None
+
+        print(f"Remaining agents: {[ep.agent_ids[i] for i in range(ep.num_agents) if ep.active[i]]}")
+        print(f"Remaining goals: {env.goals}")
+        ep.step += 1
+        ep._distance_table = None
+
+        if checkpoint is not None:
+            checkpoint.save({"episode": ep.state(), "policy": policy.state()})
+
+    failed = ep.step >= max_steps
+    print(f"\nRun completed in {ep.step} steps. Collisions: {ep.collisions}. Failed: {failed}")
+    ep.log.close()
+    return ep.step, ep.total_opt, failed, ep.collisions
@@ -1,4 +1,3 @@
-import itertools
 from core.environment import GridWorld
 from core.utils import shortest_path_length
 
@@ -15,25 +14,85 @@ def compute_distance_matrix(env):
         distances.append(row)
     return distances
 
+def _match_under_threshold(distances, threshold):
+    """
+    Kuhn's augmenting-path matching restricted to agent-goal edges with distance <= threshold.
+    Returns goal_of_agent (list of goal indices) if every agent can be matched, else None.
+    """
+    num_agents = len(distances)
+    allowed = [
+        [j for j in range(num_agents) if distances[i][j] <= threshold]
+        for i in range(num_agents)
+    ]
+    agent_of_goal = [None] * num_agents
+    goal_of_agent = [None] * num_agents
+
+    for root in range(num_agents):
+        if not allowed[root]:
+            return None
+        # Iterative DFS over alternating paths: stack holds (agent, next edge index)
+        parent_goal = {}
+        visited = set()
+        stack = [[root, 0]]
+        augmented = False
+        while stack and not augmented:
+            frame = stack[-1]
+            agent, k = frame
+            if k >= len(allowed[agent]):
+                stack.pop()
+                continue
+            frame[1] += 1
+            goal = allowed[agent][k]
+            if goal in visited:
+                continue
+            visited.add(goal)
+            parent_goal[goal] = agent
+            if agent_of_goal[goal] is None:
+                # Flip the alternating path back to the root
+                while goal is not None:
+                    owner = parent_goal[goal]
+                    previous = goal_of_agent[owner]
+                    goal_of_agent[owner] = goal
+                    agent_of_goal[goal] = owner
+                    goal = previous
+                augmented = True
+            else:
+                stack.append([agent_of_goal[goal], 0])
+        if not augmented:
+            return None
+    return goal_of_agent
+
 def find_best_assignment(distances):
     """
     distances: list of list of distances[agent][goal]
     Returns: (assignment, cost)
       assignment: list of goal indices assigned to each agent (in order)
       cost: the max distance
+
+    Solves the min-max (bottleneck) assignment exactly: binary search over the sorted
+    distinct distances for the smallest threshold that still admits a perfect matching.
+    When several assignments share the optimal cost, any one of them may be returned.
     """
     num_agents = len(distances)
-    all_goal_indices = list(range(num_agents))
-    best_cost = float('inf')
-    best_assignment = None
+    thresholds = sorted({
+        distances[i][j]
+        for i in range(num_agents)
+        for j in range(num_agents)
+        if distances[i][j] != float('inf')
+    })
 
-    for perm in itertools.permutations(all_goal_indices):
-        # perm is a tuple of goal indices assigned to agents in order
-        agent_dists = [distances[i][goal_idx] for i, goal_idx in enumerate(perm)]
-        cost = max(agent_dists)
-        if cost < best_cost:
-            best_cost = cost
-            best_assignment = perm
+    best_assignment = None
+    best_cost = float('inf')
+    lo, hi = 0, len(thresholds) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        matching = _match_under_threshold(distances, thresholds[mid])
+        if matching is not None:
+            best_assignment = tuple(matching)
+            best_cost = thresholds[mid]
+            hi = mid - 1
+        else:
+            lo = mid + 1
 
     return best_assignment, best_cost
 
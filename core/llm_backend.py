@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from openai.types.chat import ChatCompletionTokenLogprob
+from core.prompt_tokens import prompt_text
+from core.response_cache import ResponseCache, ReplayMiss, deserialize_logprobs
+
+# Offline stand-ins for the model APIs behind core/request.py (install with request.set_backend).
+# They return the same (text, logprobs) the real calls do, with logprobs as ChatCompletionTokenLogprob
+# objects (.token / .logprob / .top_logprobs), so agents run unchanged without network or API key.
+
+MOVES = {"up": (1, 0), "down": (-1, 0), "left": (0, -1), "right": (0, 1)}
+
+class Backend:
+    """
+    Base class: subclasses implement respond(endpoint, params, image_bytes) -> (text, logprobs).
+
+    Args:
+        latency: simulated model time per request in seconds, or a (low, high) range drawn uniformly
+        seed: seed of the latency RNG (kept apart from the global RNG the agents use)
+    """
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            self.requests += 1
+            if isinstance(self.latency, (tuple, list)):
+                return self._rng.uniform(*self.latency)
+            return self.latency
+
+    def complete(self, endpoint, params, image_bytes=None):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self.respond(endpoint, params, image_bytes)
+
+    async def complete_async(self, endpoint, params, image_bytes=None):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self.respond(endpoint, params, image_bytes)
+
+    def respond(self, endpoint, params, image_bytes=None):
+        raise NotImplementedError
+
+class TraceBackend(Backend):
+    """
+    Replays recorded responses from a JSONL trace (see export_trace), matched by the same request key
+    as the response cache. Requests missing from the trace go to `fallback`, or raise ReplayMiss.
+    """
+
+    def __init__(self, path, fallback=None, latency=0.0, seed=0):
+        super().__init__(latency, seed)
+        self.fallback = fallback
+        self.misses = 0
+        self.entries = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = (entry["text"], entry.get("logprobs"))
+
+    def respond(self, endpoint, params, image_bytes=None):
+        key = ResponseCache.make_key(endpoint, params, image_bytes)
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry[0], deserialize_logprobs(entry[1])
+        self.misses += 1
+        if self.fallback is None:
+            raise ReplayMiss(f"No traced response for {endpoint} request to {params.get('model')} (key {key[:12]})")
+        return self.fallback.respond(endpoint, params, image_bytes)
+
+def export_trace(cache_path, trace_path):
+    """Write every response recorded in a ResponseCache file to a JSONL trace. Returns the entry count."""
+    cache = ResponseCache(cache_path, read_only=True)
+    count = 0
+    try:
+        with open(trace_path, "w", encoding="utf-8") as out:
+            for key, endpoint, model, text, logprobs in cache._conn.execute(
+                "SELECT key, endpoint, model, text, logprobs FROM responses ORDER BY created"
+            ):
+                out.write(json.dumps({"key": key, "endpoint": endpoint, "model": model, "text": text, "logprobs": logprobs}) + "\n")
+                count += 1
+    finally:
+        cache.close()
+    return count
+
+def _token(token, logprob=0.0, alternatives=()):
+    """One ChatCompletionTokenLogprob; `alternatives` are extra (token, logprob) entries in top_logprobs."""
+    top = [(token, logprob)] + [alt for alt in alternatives if alt[0] != token]
+    return ChatCompletionTokenLogprob.model_validate({
+        "token": token,
+        "logprob": logprob,
+        "bytes": list(token.encode("utf-8")),
+        "top_logprobs": [{"token": t, "logprob": lp, "bytes": list(t.encode("utf-8"))} for t, lp in top],
+    })
+
+def _join(pieces):
+    """Response text and token logprobs from (token, logprob, alternatives) pieces."""
+    return "".join(p[0] for p in pieces), [_token(*p) for p in pieces]
+
+class PromptState:
+    """The grid facts a synthetic answer needs, read back from a prompt built by core.prompt."""
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+        size = re.search(r"(\d+)\s*×\s*(\d+) grid", prompt)
+        self.size = int(size.group(1)) if size else None
+        agent = re.search(r"You are Agent \**A?(\d+)|for Agent (\d+)", prompt)
+        self.agent_id = next((int(g) for g in agent.groups() if g), None) if agent else None
+        position = re.search(r"(?:Your position|[Aa]gent\s+position)\s*…\s*\*\*\(row (\d+), col (\d+)\)", prompt)
+        self.position = (int(position.group(1)), int(position.group(2))) if position else None
+
+        self.goals = {
+            letter: (int(r), int(c))
+            for letter, r, c in re.findall(r"Goal ([A-Z])(?: is at|:) \((?:row )?(\d+), ?(?:col )?(\d+)\)", prompt)
+        }
+        if not self.goals:
+            single = re.search(r"[Gg]oal[^\n(]*\*\*\(row (\d+), col(?:umn)? (\d+)\)", prompt)
+            if single:
+                self.goals = {"A": (int(single.group(1)), int(single.group(2)))}
+        declared = re.search(r"Your current target goal is \*\*Goal ([A-Z])\*\*, located at \(row (\d+), col (\d+)\)", prompt)
+        self.declared = None
+        if declared:
+            self.declared = declared.group(1)
+            self.goals.setdefault(self.declared, (int(declared.group(2)), int(declared.group(3))))
+
+        # the first "Obstacles …" line that lists cells (the ranking prompt mentions obstacles earlier)
+        obstacles = next((m for m in re.finditer(r"Obstacles[^\n…:]*[…:]\s*([^\n]*)", prompt)
+                          if re.search(r"\(\d+, \d+\)|row \d+:", m.group(1))), None)
+        self.obstacles = set()
+        if obstacles:
+            self.obstacles = {(int(r), int(c)) for r, c in re.findall(r"\((\d+), (\d+)\)", obstacles.group(1))}
+            # compact encoding: "row 2: cols 6, 10-11; row 3: col 4"
+            for r, runs in re.findall(r"row (\d+): cols? ([\d, -]+)", obstacles.group(1)):
+                for run in runs.split(","):
+                    low, _, high = run.strip().partition("-")
+                    self.obstacles.update((int(r), c) for c in range(int(low), int(high or low) + 1))
+
+        own_distances = re.search(rf"Agent {self.agent_id}: ([^\n]*)", prompt) if self.agent_id else None
+        self.table = {}
+        if own_distances:
+            for letter, value in re.findall(r"([A-Z]) = (\d+|∞)", own_distances.group(1)):
+                self.table[letter] = math.inf if value == "∞" else int(value)
+            # compact encoding: a "Agent \ Goal: A B C" header over rows of bare distances
+            header = re.search(r"Agent \\ Goal: ([A-Z ]+)", prompt)
+            if header and not self.table:
+                for letter, value in zip(header.group(1).split(), own_distances.group(1).split()):
+                    self.table[letter] = math.inf if value == "∞" else int(value)
+        self._fields = {}
+
+    def distance_field(self, goal):
+        """BFS distances from `goal` over the parsed grid (Manhattan distance when the grid size is unknown)."""
+        if goal not in self._fields:
+            if self.size is None:
+                self._fields[goal] = None
+            else:
+                field = {goal: 0}
+                queue = deque([goal])
+                while queue:
+                    r, c = queue.popleft()
+                    for dr, dc in MOVES.values():
+                        nxt = (r + dr, c + dc)
+                        if nxt not in field and nxt not in self.obstacles and 0 <= nxt[0] < self.size and 0 <= nxt[1] < self.size:
+                            field[nxt] = field[(r, c)] + 1
+                            queue.append(nxt)
+                self._fields[goal] = field
+        return self._fields[goal]
+
+    def distance(self, start, goal):
+        field = self.distance_field(goal)
+        if field is None:
+            return abs(start[0] - goal[0]) + abs(start[1] - goal[1])
+        return field.get(start, math.inf)
+
+    def ranking(self):
+        """Goal letters nearest first: the agent's row of the distance table if present, else BFS from its position."""
+        def key(letter):
+            if letter in self.table:
+                return (self.table[letter], letter)
+            if self.position is None:
+                return (math.inf, letter)
+            return (self.distance(self.position, self.goals[letter]), letter)
+        return sorted(self.goals, key=key)
+
+    def target(self):
+        if self.declared:
+            return self.declared
+        ranking = self.ranking()
+        return ranking[0] if ranking else None
+
+class SyntheticBackend(Backend):
+    """
+    Network-free stand-in that answers every prompt family in core.prompt with a greedy policy:
+    rankings by distance, YES for moves that shorten the BFS distance to the (declared or nearest)
+    goal, goal-letter logprobs favouring that goal, and negotiations settled in favour of the
+    lower agent id. Deterministic for a given prompt.
+    """
+
+    def respond(self, endpoint, params, image_bytes=None):
+        prompt = prompt_text(params)
+        state = PromptState(prompt)
+        question = re.search(r"move \*\*(up|down|left|right)\*\*\?", prompt)
+
+        if '"proposal"' in prompt:
+            return self.negotiation(prompt, state)
+        if '"ranking"' in prompt:
+            ranking = state.ranking()
+            text = json.dumps({"reasoning": "Nearest goals first.", "explanation": f"Goal {ranking[0] if ranking else '-'} is closest.", "ranking": ranking})
+            return f"```json\n{text}\n```", [_token(text)]
+        if '"target"' in prompt and question is None:
+            target = state.target() or "A"
+            text = json.dumps({"reasoning": "Nearest goal.", "explanation": f"Goal {target} is closest.", "target": target})
+            return f"```json\n{text}\n```", [_token(text)]
+        if question is not None:
+            return self.yes_no(endpoint, state, question.group(1), '"move"' in prompt)
+        return self.action_word(prompt, state)
+
+    def goal_alternatives(self, state, target):
+        ranking = state.ranking()
+        if target in ranking:
+            ranking.remove(target)
+            ranking.insert(0, target)
+        return [(letter, math.log(0.9) - 2.0 * rank) for rank, letter in enumerate(ranking)]
+
+    def yes_no(self, endpoint, state, direction, as_json):
+        target = state.target()
+        yes = math.log(0.5)
+        if state.position is not None and target is not None:
+            dr, dc = MOVES[direction]
+            goal = state.goals[target]
+            nxt = (state.position[0] + dr, state.position[1] + dc)
+            before, after = state.distance(state.position, goal), state.distance(nxt, goal)
+            if after < before:
+                yes = math.log(0.95) - 0.001 * after
+            else:
+                yes = math.log(0.05) - 0.01 * min(after - before, 100) if after != math.inf else math.log(0.01)
+        answer = "YES" if yes > math.log(0.5) else "NO"
+        no = math.log(max(1e-6, 1.0 - math.exp(yes)))
+        decision = (answer, yes if answer == "YES" else no, [("YES", yes), ("NO", no)])
+        goal_letter = target or "A"
+        goal = (goal_letter, math.log(0.9), self.goal_alternatives(state, goal_letter))
+        explanation = f"Moving {direction} {'approaches' if answer == 'YES' else 'does not approach'} Goal {goal_letter}."
+
+        if endpoint == "beta.chat.completions.parse":
+            # Structured output (core.schema.OpenAIResponse); the decision is the 5th token
+            pieces = [('{"',), ("choose",), ("_direction",), ('":"',), decision, ('","',), ("target",), ("_goal",),
+                      ('":"',), goal, ('","',), ("explanation",), ('":"',), (explanation,), ('"}',)]
+        elif as_json:
+            pieces = [('{"',), ("move",), ('": "',), decision, ('", "',), ("target",), ('": "',), goal,
+                      ('", "',), ("explanation",), ('": "',), (explanation,), ('"}',)]
+        else:
+            pieces = [decision]
+        return _join(pieces)
+
+    def action_word(self, prompt, state):
+        """
+        Prompts that ask for one direction word: the move that gets closest to the goal, with the other
+        directions among the first token's top logprobs in order of the distance they leave.
+        """
+        target = state.target()
+        ranking = list(MOVES)
+        if state.position is not None and target is not None:
+            goal = state.goals[target]
+            ranking.sort(key=lambda d: state.distance((state.position[0] + MOVES[d][0], state.position[1] + MOVES[d][1]), goal))
+        alternatives = [(d, math.log(0.9) - 2.0 * rank) for rank, d in enumerate(ranking)]
+        return ranking[0], [_token(*alternatives[0], alternatives)]
+
+    def negotiation(self, prompt, state):
+        self_id = int(re.search(r"perspective of \*\*Agent (\d+)\*\*", prompt).group(1))
+        proposal_keys = re.findall(r'"Agent (\d+)"', prompt)
+        opponent_id = next((int(a) for a in proposal_keys if int(a) != self_id), self_id)
+        conflicted = re.search(r"\*\*Goal ([A-Z])\*\* as your top choice", prompt)
+        conflicted = conflicted.group(1) if conflicted else None
+        others = [g for g in sorted(state.goals) if g != conflicted]
+        low, high = sorted((self_id, opponent_id))
+        proposal = {f"Agent {low}": conflicted, f"Agent {high}": others[0] if others else conflicted}
+        text = json.dumps({"proposal": proposal, "action": "accept", "justification": "Lower id keeps the contested goal."})
+        return f"```json\n{text}\n```", [_token(text)]
+
+# What a trace replay does with requests missing from the trace: "none" raises ReplayMiss (the trial
+# fails), "synthetic" answers them with SyntheticBackend; either way the misses are counted and reported
+TRACE_FALLBACKS = ("none", "synthetic")
+
+def make_backend(kind, trace_path=None, latency=0.0, trace_fallback="none"):
+    """
+    Backend for a --llm-backend choice: "api" (None: real requests), "synthetic", or "trace"
+    (replays `trace_path`; unrecorded requests raise ReplayMiss unless `trace_fallback` is "synthetic").
+    """
+    if kind in (None, "api"):
+        return None
+    if kind == "synthetic":
+        return SyntheticBackend(latency=latency)
+    if kind == "trace":
+        if not trace_path:
+            raise ValueError("The trace backend needs a trace file (--llm-trace)")
+        if trace_fallback not in TRACE_FALLBACKS:
+            raise ValueError(f"Unknown trace fallback '{trace_fallback}', expected one of {TRACE_FALLBACKS}")
+        fallback = SyntheticBackend() if trace_fallback == "synthetic" else None
+        return TraceBackend(trace_path, fallback=fallback, latency=latency)
+    raise ValueError(f"Unknown LLM backend '{kind}'")
+
+def trace_miss_summary(misses, trace_fallback="none"):
+    """Report line on the requests a trace replay did not find (None when there were none)."""
+    if not misses:
+        return None
+    if trace_fallback == "synthetic":
+        return f"⚠️ {misses} request(s) were not in the LLM trace and were answered synthetically; those results are not a replay"
+    return f"⚠️ {misses} request(s) were not in the LLM trace (ReplayMiss); the trials that sent them failed"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export recorded LLM responses to a JSONL trace for --llm-backend trace.")
+    parser.add_argument("cache", type=str, help="Response cache SQLite file (see --llm-cache)")
+    parser.add_argument("trace", type=str, help="Output JSONL trace")
+    args = parser.parse_args()
+    print(f"Exported {export_trace(args.cache, args.trace)} responses to {args.trace}")
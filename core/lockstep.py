@@ -0,0 +1,253 @@
+import csv
+import numpy as np
+from core.environment import GridWorld
+
+# Same order as core.utils.select_direction_opt, so ties break identically
+DIRECTIONS = ["up", "down", "left", "right"]
+DIRECTION_DELTAS = np.array([(1, 0), (-1, 0), (0, -1), (0, 1)], dtype=np.int64)
+
+NO_GOAL = -1
+FAR = np.iinfo(np.int32).max // 2  # stands in for float('inf') in integer distance arrays
+
+class LockstepEngine:
+    """
+    Vectorized version of the heuristic agents' step loop.
+
+    Agent positions, goals and active flags live in NumPy arrays; every step moves all agents at
+    once using the distance fields cached on the GridWorld. The rules match the list-based loops
+    in agents/agent_greedy.py and the BFS-movement agents:
+      * an agent may only step into a free, in-bounds cell that no agent occupied at the start of the step
+      * it takes the first direction (up, down, left, right) that strictly minimises distance to its target
+      * agents proposing the same cell collide; the lowest index moves, the others stay put
+      * an agent standing on any unclaimed goal claims it and leaves the grid
+    """
+
+    def __init__(self, env: GridWorld):
+        self.env = env
+        self.size = env.size
+        self.num_agents = len(env.agents)
+        self.num_goals = len(env.goals)
+
+        self.active = np.array([a is not None for a in env.agents], dtype=bool)
+        self.positions = np.array(
+            [a if a is not None else (0, 0) for a in env.agents], dtype=np.int64
+        ).reshape(self.num_agents, 2)
+        self.goal_open = np.array([g is not None for g in env.goals], dtype=bool)
+        self.goals = np.array(
+            [g if g is not None else (0, 0) for g in env.goals], dtype=np.int64
+        ).reshape(self.num_goals, 2)
+
+        self.free = env.free_cells()
+
+        # Cell -> goal index, so claiming is a lookup instead of env.goals.index
+        self.goal_at = np.full((self.size, self.size), NO_GOAL, dtype=np.int64)
+        open_idx = np.flatnonzero(self.goal_open)
+        self.goal_at[self.goals[open_idx, 0], self.goals[open_idx, 1]] = open_idx
+
+        self.occupied = np.zeros((self.size, self.size), dtype=bool)
+        self.occupied[self.positions[self.active, 0], self.positions[self.active, 1]] = True
+
+        # Cell-major distance table: fields[r * size + c, j] is the distance from (r, c) to goal j,
+        # so gathering all goal distances for a set of cells reads contiguous rows
+        fields = env.distance_fields([tuple(g) for g in self.goals])
+        fields = fields.reshape(self.num_goals, self.size * self.size).T.copy()
+        fields[fields < 0] = FAR
+        self.fields = fields
+
+    def agent_goal_distances(self):
+        """(num_agents, num_goals) matrix of BFS distances, FAR where unreachable."""
+        return self.fields[self.positions[:, 0] * self.size + self.positions[:, 1]]
+
+    def greedy_targets(self):
+        """
+        Closest-goal assignment with conflicts resolved by agent index.
+
+        Equivalent to ranking goals by (distance, goal index) and running resolve_conflicts from
+        agents/agent_greedy.py: each agent in index order takes its nearest goal not taken by a
+        lower-index agent. Returns goal indices per agent, NO_GOAL for inactive or unassigned agents.
+        """
+        targets = np.full(self.num_agents, NO_GOAL, dtype=np.int64)
+        dists = self.agent_goal_distances()
+        available = self.goal_open.copy()
+        for i in np.flatnonzero(self.active):
+            if not available.any():
+                break
+            row = np.where(available, dists[i], FAR + 1)
+            goal = int(np.argmin(row))
+            targets[i] = goal
+            available[goal] = False
+        return targets
+
+    def propose_moves(self, targets):
+        """
+        Pick a direction for every active agent towards its target goal.
+
+        Returns:
+            (proposals, directions): proposed positions (num_agents, 2) and the index into
+            DIRECTIONS of each move, -1 where the agent stays.
+        """
+        proposals = self.positions.copy()
+        directions = np.full(self.num_agents, -1, dtype=np.int64)
+
+        movers = np.flatnonzero(self.active & (targets != NO_GOAL))
+        if movers.size == 0:
+            return proposals, directions
+        movers = movers[self.goal_open[targets[movers]]]
+        if movers.size == 0:
+            return proposals, directions
+
+        neighbours = self.positions[movers, None, :] + DIRECTION_DELTAS[None, :, :]
+        rows, cols = neighbours[..., 0], neighbours[..., 1]
+        in_bounds = (rows >= 0) & (rows < self.size) & (cols >= 0) & (cols < self.size)
+        rows_c = np.clip(rows, 0, self.size - 1)
+        cols_c = np.clip(cols, 0, self.size - 1)
+        valid = in_bounds & self.free[rows_c, cols_c] & ~self.occupied[rows_c, cols_c]
+
+        dist = self.fields[rows_c * self.size + cols_c, targets[movers, None]]
+        dist = np.where(valid, dist, FAR)
+        best = np.argmin(dist, axis=1)
+        can_move = dist[np.arange(movers.size), best] < FAR
+
+        moved = movers[can_move]
+        proposals[moved] = neighbours[can_move, best[can_move]]
+        directions[moved] = best[can_move]
+        return proposals, directions
+
+    def resolve_collisions(self, proposals):
+        """
+        Agents proposing the same cell collide: the lowest index keeps its move, the rest stay.
+        Target cells are hashed to flat ids, so this is linear instead of the O(n²) pairwise pass.
+
+        Returns:
+            (new_positions, collisions)
+        """
+        new_positions = proposals.copy()
+        movers = np.flatnonzero(self.active & np.any(proposals != self.positions, axis=1))
+        if movers.size < 2:
+            return new_positions, 0
+
+        cell_ids = proposals[movers, 0] * self.size + proposals[movers, 1]
+        _, first = np.unique(cell_ids, return_index=True)
+        losers = np.ones(movers.size, dtype=bool)
+        losers[first] = False
+        new_positions[movers[losers]] = self.positions[movers[losers]]
+        return new_positions, int(losers.sum())
+
+    def claim_goals(self):
+        """Retire active agents standing on an open goal. Returns the claiming agent indices."""
+        idx = np.flatnonzero(self.active)
+        goal_idx = self.goal_at[self.positions[idx, 0], self.positions[idx, 1]]
+        hit = goal_idx != NO_GOAL
+        claimers, claimed = idx[hit], goal_idx[hit]
+
+        self.active[claimers] = False
+        self.goal_open[claimed] = False
+        self.goal_at[self.goals[claimed, 0], self.goals[claimed, 1]] = NO_GOAL
+        self.occupied[self.positions[claimers, 0], self.positions[claimers, 1]] = False
+        return claimers
+
+    def step(self, targets):
+        """
+        Advance every agent one step towards `targets` (goal index per agent).
+
+        Returns:
+            dict with the proposals, chosen direction indices, collision count and claiming agents.
+        """
+        proposals, directions = self.propose_moves(targets)
+        new_positions, collisions = self.resolve_collisions(proposals)
+
+        active = self.active
+        self.occupied[self.positions[active, 0], self.positions[active, 1]] = False
+        self.occupied[new_positions[active, 0], new_positions[active, 1]] = True
+        before = self.positions
+        self.positions = new_positions
+
+        claimers = self.claim_goals()
+        return {
+            "positions_before": before,
+            "proposals": proposals,
+            "directions": directions,
+            "collisions": collisions,
+            "claimed_by": claimers,
+        }
+
+    def sync_env(self):
+        """Write the array state back into env.agents / env.goals (None for finished entries)."""
+        self.env.agents = [
+            tuple(int(v) for v in self.positions[i]) if self.active[i] else None
+            for i in range(self.num_agents)
+        ]
+        self.env.goals = [
+            tuple(int(v) for v in self.goals[j]) if self.goal_open[j] else None
+            for j in range(self.num_goals)
+        ]
+
+    def run(self, max_steps=100, targets=None, log_rows=None):
+        """
+        Run the episode until every agent has claimed a goal or `max_steps` is reached.
+
+        Args:
+            max_steps: step cap, counted the same way as the agents' run() loops
+            targets: fixed goal index per agent (rank-once agents); None re-runs greedy_targets every step
+            log_rows: optional list that receives one dict per proposed move, like the agents' CSV logs
+
+        Returns:
+            (steps, collisions, failed)
+        """
+        step = 0
+        collisions = 0
+        while self.active.any() and step < max_steps:
+            step_targets = self.greedy_targets() if targets is None else targets
+            info = self.step(step_targets)
+            collisions += info["collisions"]
+
+            if log_rows is not None:
+                for i in np.flatnonzero(info["directions"] >= 0):
+                    log_rows.append({
+                        "step": step,
+                        "agent_id": int(i) + 1,
+                        "position_before": tuple(int(v) for v in info["positions_before"][i]),
+                        "position_after": tuple(int(v) for v in info["proposals"][i]),
+                        "chosen_direction": DIRECTIONS[info["directions"][i]],
+                        "target_goal": chr(65 + int(step_targets[i])),
+                    })
+            step += 1
+
+        self.sync_env()
+        return step, collisions, step >= max_steps
+
+def sum_of_closest_goal_distances(engine: LockstepEngine):
+    """The `total_opt` figure the heuristic agents report: each agent's distance to its nearest goal."""
+    dists = engine.agent_goal_distances()[engine.active][:, engine.goal_open]
+    if dists.shape[1] == 0:
+        return 0
+    closest = dists.min(axis=1)
+    return float('inf') if (closest >= FAR).any() else int(closest.sum())
+
+def run_greedy_episode(env: GridWorld, log_path=None, max_steps=100, rank_once=False):
+    """
+    Vectorized drop-in for the greedy agents' run() loop.
+
+    Args:
+        env: GridWorld holding the scenario; updated in place with the final state
+        log_path: CSV path for the per-move log, or None to skip logging
+        max_steps: step cap
+        rank_once: assign goals once up front (agent_greedy_rank_once) instead of every step (agent_greedy)
+
+    Returns:
+        (steps, total_opt, failed, collisions), same as the agents' run()
+    """
+    engine = LockstepEngine(env)
+    total_opt = sum_of_closest_goal_distances(engine)
+    targets = engine.greedy_targets() if rank_once else None
+    log_rows = [] if log_path else None
+
+    steps, collisions, failed = engine.run(max_steps=max_steps, targets=targets, log_rows=log_rows)
+
+    if log_rows:
+        with open(log_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=log_rows[0].keys())
+            writer.writeheader()
+            writer.writerows(log_rows)
+
+    return steps, total_opt, failed, collisions
@@ -1,276 +1,199 @@
-import matplotlib.pyplot as plt
 import numpy as np
+from collections import OrderedDict
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
 from core.environment import GridWorld
+from core.telemetry import timed
 import argparse
+import base64
+import io
 import json
 import os
-
-def plot_grid(env: GridWorld, image_path="data/grid.png"):
-    grid = np.ones((env.size, env.size, 3))
-
-    # Draw obstacles (black)
-    for pos in env.obstacles:
-        grid[pos] = [0.0, 0.0, 0.0]  # Black
-
-    # Draw agents (blue)
-    agent_color = [0.0, 0.4, 1.0]  # Blue
-    for agent in env.agents:
-        if agent is not None:
-            grid[agent] = agent_color
-
-    # Draw goals (red)
-    goal_color = [1.0, 0.0, 0.0]  # Red
-    for goal in env.goals:
-        if goal is not None:
-            grid[goal] = goal_color
-
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.imshow(grid, extent=[0, env.size, 0, env.size], origin='lower')
-
-    # Grid lines
-    for x in range(env.size + 1):
-        ax.axhline(x, color='gray', linewidth=0.5)
-        ax.axvline(x, color='gray', linewidth=0.5)
-
-    # Axis ticks
-    ax.set_xticks(np.arange(env.size) + 0.5)
-    ax.set_yticks(np.arange(env.size) + 0.5)
-    ax.set_xticklabels([f"col {i}" for i in range(env.size)])
-    ax.set_yticklabels([f"row {i}" for i in range(env.size)])
-    ax.tick_params(axis='both', which='both', length=0)
-
-    # Add text annotations
-    for r in range(env.size):
-        for c in range(env.size):
-            label = ""
-            if (r, c) in env.obstacles:
-                label = "O"
-            elif any((r, c) == pos for pos in env.agents if pos is not None):
-                idx = next(i for i, pos in enumerate(env.agents) if pos == (r, c))
-                label = f"A{idx + 1}"
-            elif any((r, c) == pos for pos in env.goals if pos is not None):
-                idx = next(i for i, pos in enumerate(env.goals) if pos == (r, c))
-                label = f"G{idx + 1}"
-            if label:
-                ax.text(
-                    c + 0.5, r + 0.5, label,
-                    color="white",
-                    fontsize=12,
-                    ha='center',
-                    va='center',
-                    weight='bold'
-                )
-
-    # Border directions
-    margin = 0.5
-    ax.axvline(env.size + margin, color='blue', linewidth=16)    # Right
-    ax.axvline(0 - margin, color='yellow', linewidth=16)         # Left
-    ax.axhline(env.size + margin, color='green', linewidth=16)   # Top
-    ax.axhline(0 - margin, color='orange', linewidth=16)         # Bottom
-
-    ax.set_xlim([-margin, env.size + margin])
-    ax.set_ylim([-margin, env.size + margin])
-    plt.axis('off')
-
-        # Draw diagonal walls between diagonally adjacent obstacles
-    for r in range(env.size - 1):
-        for c in range(env.size - 1):
-            # Check 2x2 square corners for diagonally placed obstacles
-            tl = (r + 1, c)     # top-left
-            tr = (r + 1, c + 1) # top-right
-            bl = (r, c)         # bottom-left
-            br = (r, c + 1)     # bottom-right
-
-            if tl in env.obstacles and br in env.obstacles and tr not in env.obstacles and bl not in env.obstacles:
-                # draw line from center of tl to br
-                ax.plot(
-                    [c + 0.5, c + 1.5],
-                    [r + 1.5, r + 0.5],
-                    color='black',
-                    linewidth=10,
-                    solid_capstyle='round'
-                )
-            elif tr in env.obstacles and bl in env.obstacles and tl not in env.obstacles and br not in env.obstacles:
-                # draw line from center of tr to bl
-                ax.plot(
-                    [c + 1.5, c + 0.5],
-                    [r + 1.5, r + 0.5],
-                    color='black',
-                    linewidth=10,
-                    solid_capstyle='round'
-                )
-
-    plt.savefig(image_path, bbox_inches='tight')
-    plt.close()
-
-def plot_grid_unassigned(env: GridWorld, image_path="data/grid.png"):
-    grid = np.ones((env.size, env.size, 3))
-
-    # Draw obstacles (black)
-    for pos in env.obstacles:
-        grid[pos] = [0.0, 0.0, 0.0]
-
-    # Draw agents (blue)
-    agent_color = [0.0, 0.4, 1.0]
-    for agent in env.agents:
-        if agent is not None:
-            grid[agent] = agent_color
-
-    # Draw goals (red)
-    goal_color = [1.0, 0.0, 0.0]
-    for goal in env.goals:
-        if goal is not None:
-            grid[goal] = goal_color
-
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.imshow(grid, extent=[0, env.size, 0, env.size], origin='lower')
-
-    # Grid lines
-    for x in range(env.size + 1):
-        ax.axhline(x, color='gray', linewidth=0.5)
-        ax.axvline(x, color='gray', linewidth=0.5)
-
-    # Axis ticks
-    ax.set_xticks(np.arange(env.size) + 0.5)
-    ax.set_yticks(np.arange(env.size) + 0.5)
-    ax.set_xticklabels([f"col {i}" for i in range(env.size)])
-    ax.set_yticklabels([f"row {i}" for i in range(env.size)])
-    ax.tick_params(axis='both', which='both', length=0)
-
-    # Add text annotations: Agents as numbers, goals as letters
-    for r in range(env.size):
-        for c in range(env.size):
-            label = ""
-            if (r, c) in env.obstacles:
-                label = "O"
-            elif any((r, c) == pos for pos in env.agents if pos is not None):
-                idx = next(i for i, pos in enumerate(env.agents) if pos == (r, c))
-                label = f"{idx + 1}"  # Agent labels: 1, 2, 3...
-            elif any((r, c) == pos for pos in env.goals if pos is not None):
-                idx = next(i for i, pos in enumerate(env.goals) if pos == (r, c))
-                label = chr(65 + idx)  # Goal labels: A, B, C...
-            if label:
-                ax.text(
-                    c + 0.5, r + 0.5, label,
-                    color="white",
-                    fontsize=12,
-                    ha='center',
-                    va='center',
-                    weight='bold'
-                )
-
-    # Border directions
-    margin = 0.5
-    ax.axvline(env.size + margin, color='blue', linewidth=16)    # Right
-    ax.axvline(0 - margin, color='yellow', linewidth=16)         # Left
-    ax.axhline(env.size + margin, color='green', linewidth=16)   # Top
-    ax.axhline(0 - margin, color='orange', linewidth=16)         # Bottom
-
-    # Diagonal blockers between obstacles
-    for r in range(env.size - 1):
-        for c in range(env.size - 1):
-            tl = (r + 1, c)
-            tr = (r + 1, c + 1)
-            bl = (r, c)
-            br = (r, c + 1)
-            if tl in env.obstacles and br in env.obstacles and tr not in env.obstacles and bl not in env.obstacles:
-                ax.plot([c + 0.5, c + 1.5], [r + 1.5, r + 0.5], color='black', linewidth=10, solid_capstyle='round')
-            elif tr in env.obstacles and bl in env.obstacles and tl not in env.obstacles and br not in env.obstacles:
-                ax.plot([c + 1.5, c + 0.5], [r + 1.5, r + 0.5], color='black', linewidth=10, solid_capstyle='round')
-
-    ax.set_xlim([-margin, env.size + margin])
-    ax.set_ylim([-margin, env.size + margin])
-    plt.axis('off')
-    plt.savefig(image_path, bbox_inches='tight')
-    plt.close()
-
-def plot_grid_unassigned_labeled(env: GridWorld, image_path="data/grid_labeled.png"):
-    grid = np.ones((env.size, env.size, 3))
-
-    # Obstacles
-    for pos in env.obstacles:
-        grid[pos] = [0.0, 0.0, 0.0]
-
-    # Goals
-    goal_color = [1.0, 0.0, 0.0]
-    for goal in env.goals:
-        if goal is not None:
-            grid[goal] = goal_color
-
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.imshow(grid, extent=[0, env.size, 0, env.size], origin='lower')
-
-    # Agents (blue circles)
-    agent_color = [0.0, 0.4, 1.0]
-    for idx, agent in enumerate(env.agents):
-        if agent is not None:
-            r, c = agent
-            circle = plt.Circle((c + 0.5, r + 0.5), 0.45, color=agent_color, zorder=3)
-            ax.add_patch(circle)
-
-    # Grid lines
-    for x in range(env.size + 1):
-        ax.axhline(x, color='gray', linewidth=0.5)
-        ax.axvline(x, color='gray', linewidth=0.5)
-
-    # Axis ticks
-    ax.set_xticks(np.arange(env.size) + 0.5)
-    ax.set_yticks(np.arange(env.size) + 0.5)
-    ax.set_xticklabels([f"col {i}" for i in range(env.size)])
-    ax.set_yticklabels([f"row {i}" for i in range(env.size)])
-    ax.tick_params(axis='both', which='both', length=0)
-
-    # --- NEW: label empty cells with "001", "002", ... padded to total digits ---
-    total_cells = env.size * env.size
-    num_digits = len(str(total_cells))
-    cell_counter = 1
-
-    for r in range(env.size):
-        for c in range(env.size):
-            pos = (r, c)
-            label = ""
-            if pos in env.obstacles:
-                label = "O"
-            elif any(pos == a for a in env.agents if a is not None):
-                idx = next(i for i, a in enumerate(env.agents) if a == pos)
-                label = f"{idx + 1}"
-            elif any(pos == g for g in env.goals if g is not None):
-                idx = next(i for i, g in enumerate(env.goals) if g == pos)
-                label = chr(65 + idx)
-
-            if label:       # Agent / goal / obstacle
-                ax.text(c + 0.5, r + 0.5, label,
-                        color="white", fontsize=12, ha='center', va='center', weight='bold')
-            else:           # Empty cell → show padded number
-                padded_num = str(cell_counter).zfill(num_digits)
-                ax.text(c + 0.5, r + 0.5, padded_num,
-                        color="gray", fontsize=6, ha='center', va='center', alpha=0.6)
-            cell_counter += 1
-
-    # Border directions
-    margin = 0.5
-    ax.axvline(env.size + margin, color='blue', linewidth=16)    # Right
-    ax.axvline(-margin,          color='yellow', linewidth=16)   # Left
-    ax.axhline(env.size + margin, color='green', linewidth=16)   # Top
-    ax.axhline(-margin,          color='orange', linewidth=16)   # Bottom
-
-    # Diagonal blockers
-    for r in range(env.size - 1):
-        for c in range(env.size - 1):
-            tl, tr = (r + 1, c), (r + 1, c + 1)
-            bl, br = (r, c), (r, c + 1)
-            if tl in env.obstacles and br in env.obstacles and tr not in env.obstacles and bl not in env.obstacles:
-                ax.plot([c + 0.5, c + 1.5], [r + 1.5, r + 0.5],
-                        color='black', linewidth=10, solid_capstyle='round')
-            elif tr in env.obstacles and bl in env.obstacles and tl not in env.obstacles and br not in env.obstacles:
-                ax.plot([c + 1.5, c + 0.5], [r + 1.5, r + 0.5],
-                        color='black', linewidth=10, solid_capstyle='round')
-
-    ax.set_xlim([-margin, env.size + margin])
-    ax.set_ylim([-margin, env.size + margin])
-    plt.axis('off')
-    plt.savefig(image_path, bbox_inches='tight')
-    plt.close()
+from core import raster
+
+RENDERERS = ("matplotlib", "raster")
+_renderer = os.environ.get("GRID_RENDERER", "matplotlib")
+
+# Figures with the static artists of recent scenarios, keyed by (style, size, obstacles)
+MAX_CACHED_FIGURES = 8
+_figure_layers = OrderedDict()
+
+# Last frame per (renderer, style): (state key, PNG bytes), reused while the grid is unchanged
+_last_frames = {}
+
+def set_renderer(name):
+    """
+    Select the backend used by the plot_grid* functions for the rest of the run.
+
+    Args:
+        name: "matplotlib" (figures, the default) or "raster" (core.raster, direct pixel drawing)
+    """
+    global _renderer
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown renderer '{name}', expected one of {RENDERERS}")
+    _renderer = name
+
+def get_renderer():
+    return _renderer
+
+def clear_render_cache():
+    """Drop cached figures, raster layers and last frames (e.g. to free memory between evaluations)."""
+    _figure_layers.clear()
+    _last_frames.clear()
+    raster.clear_static_layers()
+
+class _FigureLayer:
+    """
+    A persistent figure for one scenario and plot style.
+
+    Grid lines, ticks, borders, obstacle labels, diagonal blockers and empty-cell numbers are drawn
+    once; each frame only updates the cell colours and adds the agent / goal artists, which are
+    removed again after saving.
+    """
+
+    def __init__(self, size, obstacles, style):
+        self.size = size
+        self.obstacles = obstacles
+        self.style = style
+        self.fig = Figure(figsize=(6, 6))
+        FigureCanvasAgg(self.fig)
+        ax = self.ax = self.fig.subplots()
+        self.image = ax.imshow(np.ones((size, size, 3)), extent=[0, size, 0, size], origin='lower')
+        self.dynamic = []
+
+        # Grid lines
+        for x in range(size + 1):
+            ax.axhline(x, color='gray', linewidth=0.5)
+            ax.axvline(x, color='gray', linewidth=0.5)
+
+        # Axis ticks
+        ax.set_xticks(np.arange(size) + 0.5)
+        ax.set_yticks(np.arange(size) + 0.5)
+        ax.set_xticklabels([f"col {i}" for i in range(size)])
+        ax.set_yticklabels([f"row {i}" for i in range(size)])
+        ax.tick_params(axis='both', which='both', length=0)
+
+        for r, c in obstacles:
+            if 0 <= r < size and 0 <= c < size:
+                ax.text(c + 0.5, r + 0.5, "O", color="white", fontsize=12, ha='center', va='center', weight='bold')
+
+        # Labeled style: number every free cell "001", "002", ... padded to total digits; hidden under agents / goals
+        self.numbers = {}
+        if style == "labeled":
+            num_digits = len(str(size * size))
+            for r in range(size):
+                for c in range(size):
+                    if (r, c) not in obstacles:
+                        self.numbers[(r, c)] = ax.text(
+                            c + 0.5, r + 0.5, str(r * size + c + 1).zfill(num_digits),
+                            color="gray", fontsize=6, ha='center', va='center', alpha=0.6
+                        )
+
+        # Border directions
+        margin = 0.5
+        ax.axvline(size + margin, color='blue', linewidth=16)    # Right
+        ax.axvline(-margin, color='yellow', linewidth=16)        # Left
+        ax.axhline(size + margin, color='green', linewidth=16)   # Top
+        ax.axhline(-margin, color='orange', linewidth=16)        # Bottom
+
+        # Diagonal walls between diagonally adjacent obstacles
+        for (r, c), (r2, c2) in raster.diagonal_blockers(obstacles, size):
+            ax.plot([c + 0.5, c2 + 0.5], [r + 0.5, r2 + 0.5], color='black', linewidth=10, solid_capstyle='round')
+
+        ax.set_xlim([-margin, size + margin])
+        ax.set_ylim([-margin, size + margin])
+        ax.axis('off')
+
+    def render(self, env: GridWorld):
+        """Draw the agents and goals of `env` over the static artists and return the PNG bytes."""
+        grid = np.ones((self.size, self.size, 3))
+        for pos in self.obstacles:
+            grid[pos] = [0.0, 0.0, 0.0]
+        if self.style != "labeled":
+            for agent in env.agents:
+                if agent is not None:
+                    grid[agent] = [0.0, 0.4, 1.0]
+        for goal in env.goals:
+            if goal is not None:
+                grid[goal] = [1.0, 0.0, 0.0]
+        self.image.set_data(grid)
+
+        if self.style == "plain":
+            labels = raster.occupant_labels(env, lambda i: f"A{i + 1}", lambda j: f"G{j + 1}")
+        else:
+            labels = raster.occupant_labels(env, lambda i: f"{i + 1}", lambda j: chr(65 + j))
+
+        if self.style == "labeled":
+            for agent in env.agents:
+                if agent is not None:
+                    r, c = agent
+                    circle = Circle((c + 0.5, r + 0.5), 0.45, color=[0.0, 0.4, 1.0], zorder=3)
+                    self.dynamic.append(self.ax.add_patch(circle))
+            for pos, text in self.numbers.items():
+                text.set_visible(pos not in labels)
+
+        for (r, c), label in labels.items():
+            self.dynamic.append(self.ax.text(
+                c + 0.5, r + 0.5, label, color="white", fontsize=12, ha='center', va='center', weight='bold'
+            ))
+
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format='png', bbox_inches='tight')
+        for artist in self.dynamic:
+            artist.remove()
+        self.dynamic = []
+        return buffer.getvalue()
+
+def _figure_layer(env: GridWorld, style):
+    obstacles = env.obstacle_key
+    key = (style, env.size, obstacles)
+    layer = _figure_layers.get(key)
+    if layer is None:
+        layer = _FigureLayer(env.size, obstacles, style)
+        _figure_layers[key] = layer
+        if len(_figure_layers) > MAX_CACHED_FIGURES:
+            _figure_layers.popitem(last=False)
+    else:
+        _figure_layers.move_to_end(key)
+    return layer
+
+@timed("render")
+def _render(env: GridWorld, style, image_path, as_base64=False):
+    """
+    Render `env` in `style` with the selected backend, reusing the previous frame when nothing
+    changed. Writes the PNG to `image_path` and returns the path, or, when `image_path` is None,
+    returns the PNG bytes (base64 text if `as_base64`).
+    """
+    state = (env.size, env.obstacle_key, tuple(env.agents), tuple(env.goals))
+    frame_key = (_renderer, style)
+    last = _last_frames.get(frame_key)
+    if last is not None and last[0] == state:
+        png = last[1]
+    else:
+        if _renderer == "raster":
+            png = raster.encode_png(raster.render_grid(env, style=style))
+        else:
+            png = _figure_layer(env, style).render(env)
+        _last_frames[frame_key] = (state, png)
+
+    if image_path is not None:
+        with open(image_path, "wb") as f:
+            f.write(png)
+        return image_path
+    return base64.b64encode(png).decode("utf-8") if as_base64 else png
+
+def plot_grid(env: GridWorld, image_path="data/grid.png", as_base64=False):
+    """Agents (blue, A1, A2, ...) and goals (red, G1, G2, ...) as coloured cells."""
+    return _render(env, "plain", image_path, as_base64)
+
+def plot_grid_unassigned(env: GridWorld, image_path="data/grid.png", as_base64=False):
+    """Agents as numbers, goals as letters."""
+    return _render(env, "unassigned", image_path, as_base64)
+
+def plot_grid_unassigned_labeled(env: GridWorld, image_path="data/grid_labeled.png", as_base64=False):
+    """Agents as numbered blue circles, goals as lettered red cells, empty cells numbered 001, 002, ..."""
+    return _render(env, "labeled", image_path, as_base64)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,180 @@
+import re
+from functools import lru_cache
+
+# Requests put the grid image at PROMPT_BREAK (see core.request._image_message). Everything before it is
+# the same for every agent, direction and step of a scenario (instructions, grid size, obstacles), so the
+# provider can serve it from its prompt cache, and the image after it is shared by all calls of a step;
+# the per-step, per-agent and per-direction parts come last.
+PROMPT_BREAK = "\n<image>\n"
+
+# Fragments are memoized on snapshots of their inputs: obstacle lists and the static prefixes once per
+# scenario, history / move analysis / goal / agent / distance lines once per distinct state, so the
+# prompts of all agents and directions of a step are mostly joins of cached strings.
+HISTORY_GOT_TO = "  • {0}. you moved from (row {1}, col {2}) **{3}** → got to (row {4}, col {5})"
+HISTORY_ARROW = "  • {0}. you moved from (row {1}, col {2}) **{3}** → (row {4}, col {5})"
+HISTORY_YOU = "  • {0}. You moved from (row {1}, col {2}) **{3}** → (row {4}, col {5})"
+NO_HISTORY = "  • (no prior moves — this is the first step)"
+MOVE_OFFSETS = {
+    'up': (1, 0),
+    'down': (-1, 0),
+    'left': (0, -1),
+    'right': (0, 1)
+}
+PREFIX_CACHE_SIZE = 512
+_prefixes = {}
+
+# "verbose" renders fragments as the prompts were written; "compact" carries the same information in
+# fewer tokens: obstacles as per-row column runs, the distance table as a goal-by-agent matrix and
+# coordinates as (r,c). Only the shared fragments below change, the builders' own text does not.
+PROMPT_ENCODINGS = ("verbose", "compact")
+_encoding = "verbose"
+
+def set_prompt_encoding(encoding):
+    """Select how the fragments of every builder are rendered, one of PROMPT_ENCODINGS."""
+    global _encoding
+    if encoding not in PROMPT_ENCODINGS:
+        raise ValueError(f"Unknown prompt encoding '{encoding}', expected one of {PROMPT_ENCODINGS}")
+    _encoding = encoding
+
+def get_prompt_encoding():
+    return _encoding
+
+def clear_prompt_caches():
+    """Drop the memoized prefixes and fragments (e.g. to time full prompt builds or free memory between evaluations)."""
+    _prefixes.clear()
+    for render in (_render_obstacle_runs, _render_obstacles, _render_history, _render_move_analysis,
+                   _render_agents, _render_goals, _render_distances):
+        render.cache_clear()
+
+def _abbreviate(line):
+    """Compact form of a fragment template: (row {1}, col {2}) -> ({1},{2})."""
+    return re.sub(r"\(row (\{\d\}), col (\{\d\})\)", r"(\1,\2)", line)
+
+def _scenario_prefix(builder, grid_size, obstacles_text, render):
+    """
+    Static part of a builder's prompt (up to and including PROMPT_BREAK), rendered by `render()` the
+    first time a (builder, grid size, obstacles) combination is seen.
+    """
+    key = (builder, grid_size, obstacles_text)
+    prefix = _prefixes.get(key)
+    if prefix is None:
+        if len(_prefixes) >= PREFIX_CACHE_SIZE:
+            _prefixes.clear()
+        prefix = _prefixes[key] = render()
+    return prefix
+
+def _obstacle_coords(obstacles, line="({0}, {1})", sep=", "):
+    """Sorted obstacle cells, e.g. "(1, 2), (3, 4)", or "row 1: cols 2-4, 7; row 3: col 4" when compact."""
+    if _encoding == "compact" and line == "({0}, {1})":
+        return _render_obstacle_runs(frozenset(obstacles))
+    return _render_obstacles(frozenset(obstacles), line, sep)
+
+@lru_cache(maxsize=256)
+def _render_obstacle_runs(obstacles):
+    rows = {}
+    for r, c in sorted(obstacles):
+        runs = rows.setdefault(r, [])
+        if runs and runs[-1][1] == c - 1:
+            runs[-1][1] = c
+        else:
+            runs.append([c, c])
+    parts = []
+    for r, runs in rows.items():
+        cols = ", ".join(f"{a}-{b}" if a != b else f"{a}" for a, b in runs)
+        label = "col" if len(runs) == 1 and runs[0][0] == runs[0][1] else "cols"
+        parts.append(f"row {r}: {label} {cols}")
+    return "; ".join(parts)
+
+@lru_cache(maxsize=256)
+def _render_obstacles(obstacles, line, sep):
+    return sep.join([line.format(r, c) for r, c in sorted(obstacles)])
+
+def _history_lines(memory, line):
+    """Last five moves (r0, c0, dir, r1, c1) in the `line` format, numbered from 1."""
+    if not memory:
+        return NO_HISTORY
+    if _encoding == "compact":
+        line = _abbreviate(line)
+    return _render_history(tuple(tuple(move) for move in memory[:5]), line)
+
+@lru_cache(maxsize=1024)
+def _render_history(memory, line):
+    return "\n".join([line.format(i + 1, *move) for i, move in enumerate(memory)])
+
+def _move_analysis(agent_pos, visits, directions=('up', 'down', 'left', 'right')):
+    """Target cell and visit count of each move in `directions`, one line each."""
+    r, c = agent_pos
+    counts = tuple(
+        (d, visits.get((r + MOVE_OFFSETS[d][0], c + MOVE_OFFSETS[d][1]), 0))
+        for d in directions if d in MOVE_OFFSETS
+    )
+    return _render_move_analysis(r, c, counts, _encoding == "compact")
+
+@lru_cache(maxsize=1024)
+def _render_move_analysis(r, c, counts, compact):
+    if compact:
+        return "\n".join([
+            f"  • {d:5} → ({r + MOVE_OFFSETS[d][0]},{c + MOVE_OFFSETS[d][1]}) visited {count}x"
+            for d, count in counts
+        ])
+    return "\n".join([
+        f"  • {d:5} → (row {r + MOVE_OFFSETS[d][0]}, col {c + MOVE_OFFSETS[d][1]}) — visited {count} time(s)"
+        for d, count in counts
+    ])
+
+def _other_agent_lines(other_agents, line="  • Agent {0} is at (row {1}, col {2})", empty="  • (no other agents present)"):
+    """One `line` per (id, (row, col)) of the other agents, `empty` when there are none."""
+    if not other_agents:
+        return empty
+    if _encoding == "compact":
+        line = _abbreviate(line)
+    return _render_agents(tuple((aid, tuple(pos)) for aid, pos in other_agents), line)
+
+@lru_cache(maxsize=1024)
+def _render_agents(agents, line):
+    return "\n".join([line.format(aid, r, c) for aid, (r, c) in agents])
+
+def _goal_lines(goal_positions):
+    """Location of every goal that is still on the grid, labelled A, B, C, ... by index."""
+    return _render_goals(tuple(tuple(pos) if pos is not None else None for pos in goal_positions), _encoding == "compact")
+
+@lru_cache(maxsize=256)
+def _render_goals(goal_positions, compact):
+    if compact:
+        return "\n".join([
+            f"  • Goal {chr(65+i)}: ({pos[0]},{pos[1]})"
+            for i, pos in enumerate(goal_positions) if pos is not None
+        ])
+    return "\n".join([
+        f"  • Goal {chr(65+i)} is at (row {pos[0]}, col {pos[1]})"
+        for i, pos in enumerate(goal_positions) if pos is not None
+    ])
+
+def _distance_table(distances):
+    """Path length from every agent to every goal ({agent id: [distance per goal]}), ∞ when unreachable."""
+    return _render_distances(tuple((aid, tuple(dist_list)) for aid, dist_list in distances.items()), _encoding == "compact")
+
+@lru_cache(maxsize=256)
+def _render_distances(distances, compact):
+    if compact:
+        goals = max((len(dist_list) for _, dist_list in distances), default=0)
+        rows = [f"  Agent \\ Goal: {' '.join(chr(65 + i) for i in range(goals))}"]
+        rows += [
+            f"  Agent {aid}: " + " ".join(f"{d}" if d != float('inf') else '∞' for d in dist_list)
+            for aid, dist_list in distances
+        ]
+        return "\n".join(rows)
+    return "\n".join([
+        f"  • Agent {aid}: " + ", ".join(
+            f"{chr(65 + i)} = {d if d != float('inf') else '∞'}"
+            for i, d in enumerate(dist_list)
+        )
+        for aid, dist_list in distances
+    ])
 
 def build_prompt_single(agent_pos, target_pos, valid_actions, grid_size):
     action_list = ', '.join([f"**{a}**" for a in valid_actions])
-    return f"""
+    prefix = _scenario_prefix("build_prompt_single", grid_size, None, lambda: f"""
 You are looking at an 8x8 grid world that has colored borders to indicate direction:
 
 - The **top** border is **green** — this is the **up** direction.
@@ -17,7 +190,8 @@ Each square can be referenced by a (row, column) coordinate.
 - Coordinates are zero-indexed.
 - (0, 0) is the **bottom-left** corner of the grid.
 - ({grid_size-1}, {grid_size-1}) is the **top-right** corner.
-
+{PROMPT_BREAK}""")
+    return prefix + f"""
 Current situation:
 - Agent is at **(row {agent_pos[0]}, column {agent_pos[1]})**
 - Goal is at **(row {target_pos[0]}, column {target_pos[1]})**
@@ -33,7 +207,7 @@ Respond with **one word only**: {', '.join([f'**{a}**' for a in valid_actions])}
 
 def build_prompt_first_agent(agent1_pos, agent2_pos, goal1_pos, valid_actions, grid_size):
     action_list = ', '.join([f"**{a}**" for a in valid_actions])
-    return f"""
+    prefix = _scenario_prefix("build_prompt_first_agent", grid_size, None, lambda: f"""
 You are looking at an 8x8 grid world. You are Agent 1 (black square).
 
 Inside the grid:
@@ -47,6 +221,11 @@ Each square can be referenced by a (row, column) coordinate.
 - (0, 0) is the bottom-left corner
 - ({grid_size-1}, {grid_size-1}) is the top-right corner
 
+Your task:
+Move one step closer to YOUR goal (red square), using only valid directions.
+Avoid colliding with the other agent if possible.
+{PROMPT_BREAK}""")
+    return prefix + f"""
 Current situation:
 - You (Agent 1) are at **(row {agent1_pos[0]}, column {agent1_pos[1]})**
 - Agent 2 is at **(row {agent2_pos[0]}, column {agent2_pos[1]})**
@@ -55,16 +234,12 @@ Current situation:
 Valid moves from your current position:
 {action_list}
 
-Your task:
-Move one step closer to YOUR goal (red square), using only valid directions.
-Avoid colliding with the other agent if possible.
-
 Respond with one word only: {', '.join([f'**{a}**' for a in valid_actions])}
 """
 
 def build_prompt_second_agent(agent1_pos, agent2_pos, goal2_pos, valid_actions, grid_size):
     action_list = ', '.join([f"**{a}**" for a in valid_actions])
-    return f"""
+    prefix = _scenario_prefix("build_prompt_second_agent", grid_size, None, lambda: f"""
 You are looking at an 8x8 grid world. You are Agent 2 (gray square).
 
 Inside the grid:
@@ -78,6 +253,11 @@ Each square can be referenced by a (row, column) coordinate.
 - (0, 0) is the bottom-left corner
 - ({grid_size-1}, {grid_size-1}) is the top-right corner
 
+Your task:
+Move one step closer to YOUR goal (orange square), using only valid directions.
+Avoid colliding with the other agent if possible.
+{PROMPT_BREAK}""")
+    return prefix + f"""
 Current situation:
 - You (Agent 2) are at **(row {agent2_pos[0]}, column {agent2_pos[1]})**
 - Agent 1 is at **(row {agent1_pos[0]}, column {agent1_pos[1]})**
@@ -86,18 +266,14 @@ Current situation:
 Valid moves from your current position:
 {action_list}
 
-Your task:
-Move one step closer to YOUR goal (orange square), using only valid directions.
-Avoid colliding with the other agent if possible.
-
 Respond with one word only: {', '.join([f'**{a}**' for a in valid_actions])}
 """
 
 def build_prompt_single_obs(agent_pos, goal_pos, valid_actions, grid_size, obstacles):
     action_list = ', '.join([f"{a}" for a in valid_actions])
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
-    return f"""
+    prefix = _scenario_prefix("build_prompt_single_obs", grid_size, obs_coords, lambda: f"""
 You are looking at an {grid_size}x{grid_size} grid world that has colored borders to indicate direction:
 
 - The **top** border is **green** — this is the **up** direction.
@@ -116,19 +292,21 @@ Coordinates are zero-indexed.
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
+- Obstacles are at: {obs_coords}
+
+Your task:
+Help the agent move **one step closer** to the goal while avoiding obstacles.
+Only choose from the valid directions listed.
+{PROMPT_BREAK}""")
+    return prefix + f"""
 Current situation:
 - Agent is at **(row {agent_pos[0]}, column {agent_pos[1]})**
 - Goal is at **(row {goal_pos[0]}, column {goal_pos[1]})**
-- Obstacles are at: {obs_coords}
 
 Valid directions from the agent's current position:
 {action_list}
 You can only move one step in one of these directions.
 
-Your task:
-Help the agent move **one step closer** to the goal while avoiding obstacles.
-Only choose from the valid directions listed.
-
 Respond with **one word only**: {', '.join([f'{a}' for a in valid_actions])}
 
 MAKE SURE to respond with one word only, CHOSEN FROM {action_list}, all lowercase, not bolded, not capitalized, and without any extra context or explanation.
@@ -146,36 +324,15 @@ def build_prompt_single_obs_v2(
     action_list = ", ".join([f"{a}" for a in valid_actions])
 
     # Memory
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {x0}, col {y0}) **{dir_}** → got to (row {x1}, col {y1})"
-             for i, (x0, y0, dir_, x1, y1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Obstacles
-    obs_coords = ", ".join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Move analysis
-    move_analysis = []
-    for direction in valid_actions:
-        r, c = agent_pos
-        if direction == "up":
-            target = (r + 1, c)
-        elif direction == "down":
-            target = (r - 1, c)
-        elif direction == "left":
-            target = (r, c - 1)
-        elif direction == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis.append(f"  • {direction:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis_block = "\n".join(move_analysis)
+    move_analysis_block = _move_analysis(agent_pos, visits, valid_actions)
 
-    return f"""
+    prefix = _scenario_prefix("build_prompt_single_obs_v2", grid_size, obs_coords, lambda: f"""
 **Environment**
 
 You are controlling a single blue square (the *agent*) on a {grid_size}×{grid_size} grid.
@@ -197,10 +354,12 @@ All coordinates are zero-indexed:
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
+* obstacle cells  … {obs_coords or "none"}
+{PROMPT_BREAK}""")
+    return prefix + f"""
 Current state  
 * agent position … **(row {agent_pos[0]}, col {agent_pos[1]})**  
 * goal   position … **(row {goal_pos[0]}, col {goal_pos[1]})**  
-* obstacle cells  … {obs_coords or "none"}
 
 **Memory (last 5 moves)**  
 {history_lines}
@@ -232,9 +391,9 @@ Now choose the best move.
 
 def build_prompt_first_agent_obs(agent1_pos, agent2_pos, goal1_pos, valid_actions, grid_size, obstacles):
     action_list = ', '.join([f"**{a}**" for a in valid_actions])
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
-    return f"""
+    prefix = _scenario_prefix("build_prompt_first_agent_obs", grid_size, obs_coords, lambda: f"""
 You are Agent 1 (the **black square**) in an {grid_size}x{grid_size} grid world.
 
 Grid orientation:
@@ -254,26 +413,28 @@ Coordinates are zero-indexed:
 - (0, 0) = bottom-left
 - ({grid_size - 1}, {grid_size - 1}) = top-right
 
+- Obstacles are at: {obs_coords}
+
+Your task:
+Move one step toward your goal while avoiding obstacles and other agents.
+{PROMPT_BREAK}""")
+    return prefix + f"""
 State:
 - You are at **(row {agent1_pos[0]}, column {agent1_pos[1]})**
 - Agent 2 is at **(row {agent2_pos[0]}, column {agent2_pos[1]})**
 - Your goal is at **(row {goal1_pos[0]}, column {goal1_pos[1]})**
-- Obstacles are at: {obs_coords}
 
 Valid directions for you:
 {action_list}
 
-Your task:
-Move one step toward your goal while avoiding obstacles and other agents.
-
 Respond with **one word only**: {', '.join([f'**{a}**' for a in valid_actions])}
 """
 
 def build_prompt_second_agent_obs(agent1_pos, agent2_pos, goal2_pos, valid_actions, grid_size, obstacles):
     action_list = ', '.join([f"**{a}**" for a in valid_actions])
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
-    return f"""
+    prefix = _scenario_prefix("build_prompt_second_agent_obs", grid_size, obs_coords, lambda: f"""
 You are Agent 2 (the **gray square**) in an {grid_size}x{grid_size} grid world.
 
 Grid orientation:
@@ -293,25 +454,27 @@ Coordinates are zero-indexed:
 - (0, 0) = bottom-left
 - ({grid_size - 1}, {grid_size - 1}) = top-right
 
+- Obstacles are at: {obs_coords}
+
+Your task:
+Move one step toward your goal while avoiding obstacles and other agents.
+{PROMPT_BREAK}""")
+    return prefix + f"""
 State:
 - You are at **(row {agent2_pos[0]}, column {agent2_pos[1]})**
 - Agent 1 is at **(row {agent1_pos[0]}, column {agent1_pos[1]})**
 - Your goal is at **(row {goal2_pos[0]}, column {goal2_pos[1]})**
-- Obstacles are at: {obs_coords}
 
 Valid directions for you:
 {action_list}
 
-Your task:
-Move one step toward your goal while avoiding obstacles and other agents.
-
 Respond with **one word only**: {', '.join([f'**{a}**' for a in valid_actions])}
 """
 
 def build_yesno_prompt_single_obs(agent_pos, goal_pos, grid_size, obstacles, direction):
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_single_obs", grid_size, obs_coords, lambda: f"""
 You are looking at a {grid_size}x{grid_size} grid world with colored borders to indicate direction:
 
 - Green top border → **up**
@@ -328,10 +491,12 @@ Coordinates are zero-indexed:
 - (0, 0) is the bottom-left
 - ({grid_size - 1}, {grid_size - 1}) is the top-right
 
+- Obstacles: {obs_coords}
+{PROMPT_BREAK}""")
+    return prefix + f"""
 Current state:
 - Agent position: **(row {agent_pos[0]}, column {agent_pos[1]})**
 - Goal position: **(row {goal_pos[0]}, column {goal_pos[1]})**
-- Obstacles: {obs_coords}
 
 Action under consideration:
 - Should the agent move **{direction}**?
@@ -349,36 +514,15 @@ def build_yesno_prompt_single_obs_v2(
     visits   # dict {(r, c): count}
 ):
     # Format obstacle list
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Format memory (up to 5 recent moves)
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_single_obs_v2", grid_size, obs_coords, lambda: f"""
 **Environment**
 
 You are controlling a blue square (the agent labeled **A1**) on a {grid_size}×{grid_size} grid.  
@@ -401,23 +545,8 @@ In the image:
 - Your agent is labeled A1
 - The goal is labeled G1
 
-**Current state**  
-* Agent position … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Goal position  … **(row {goal_pos[0]}, col {goal_pos[1]})**  
 * Obstacles      … {obs_coords or "none"}
 
-**Memory (last 5 moves)**  
-{history_lines}
-
-**Move Analysis (cell visit frequency)**  
-{move_analysis}
-
----
-
-### Question
-
-Should the agent move **{direction}**?
-
 ---
 
 ### Instructions (read carefully before responding)
@@ -433,6 +562,23 @@ Should the agent move **{direction}**?
 This indicates that the agent **cannot pass diagonally** between those cells.
 
 You must treat this diagonal as a wall — only cardinal (up/down/left/right) movements are allowed, and diagonal movement is not possible under any condition.
+{PROMPT_BREAK}""")
+    return prefix + f"""
+**Current state**  
+* Agent position … **(row {agent_pos[0]}, col {agent_pos[1]})**  
+* Goal position  … **(row {goal_pos[0]}, col {goal_pos[1]})**  
+
+**Memory (last 5 moves)**  
+{history_lines}
+
+**Move Analysis (cell visit frequency)**  
+{move_analysis}
+
+---
+
+### Question
+
+Should the agent move **{direction}**?
 
 Now respond: YES or NO
 """
@@ -449,52 +595,20 @@ def build_yesno_prompt_multiagent(
     visits    # dict {(r, c): count}
 ):
     # Format obstacle coordinates
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Format memory
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
     # Format other agents and their positions
-    if other_agents:
-        other_agent_lines = "\n".join(
-            [f"  • Agent A{aid} is at (row {pos[0]}, col {pos[1]})" for aid, pos in other_agents]
-        )
-    else:
-        other_agent_lines = "  • (no other agents present)"
+    other_agent_lines = _other_agent_lines(other_agents, "  • Agent A{0} is at (row {1}, col {2})")
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_multiagent", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent **A{agent_id}** (a blue square labeled **A{agent_id}**) on a {grid_size}×{grid_size} grid.  
-Your goal is a red square labeled **G{agent_id}**.  
-Black squares are obstacles that **cannot be entered**.  
-Other agents may be present — they are shown as blue squares with labels (A2, A3, etc.).  
-Their goals are also marked with red squares labeled accordingly (G2, G3, ...).
-
 Four colored borders define direction:
 * green (top) → **up**
 * gray (bottom) → **down**
@@ -505,6 +619,16 @@ All coordinates are zero-indexed:
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
+* Obstacles             … {obs_coords or "none"}  
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent **A{agent_id}** (a blue square labeled **A{agent_id}**) on a {grid_size}×{grid_size} grid.  
+Your goal is a red square labeled **G{agent_id}**.  
+Black squares are obstacles that **cannot be entered**.  
+Other agents may be present — they are shown as blue squares with labels (A2, A3, etc.).  
+Their goals are also marked with red squares labeled accordingly (G2, G3, ...).
+
 In the image:
 - Each cell is labeled with its row and column index
 - Obstacles are black squares labeled **O**
@@ -516,7 +640,6 @@ In the image:
 **Current state**  
 * Your position         … **(row {agent_pos[0]}, col {agent_pos[1]})**  
 * Your goal             … **(row {goal_pos[0]}, col {goal_pos[1]})**  
-* Obstacles             … {obs_coords or "none"}  
 * Other agents          …  
 {other_agent_lines}
 
@@ -558,36 +681,32 @@ def build_yesno_code_prompt_single(
     visits   # dict {(r, c): count}
 ):
     # Format obstacle code lines
-    obstacle_lines = "\n".join([f"obstacles.add(({r}, {c}))" for r, c in sorted(obstacles)])
+    obstacle_lines = _obstacle_coords(obstacles, "obstacles.add(({0}, {1}))", "\n")
 
     # Format memory (up to 5 recent moves)
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_code_prompt_single", None, None, lambda: f"""
+### Instructions (read carefully before responding)
+
+1. **Legal actions** - consider if this direction avoids obstacles and is allowed from the current position.
+2. **Goal-seeking** - prioritize moving toward the red goal.
+3. **Avoid repetition** - if the same move has been repeated without progress, say NO unless it clearly helps.
+4. **Trap avoidance** - avoid directions that lead to dead ends or repeated loops.
+5. **Output format** - respond with exactly one word: YES or NO. Uppercase, no punctuation, no extra text, not bolded.
+   *Do not include any other explanation, characters, or formatting.*
+
+**Important:** If two black obstacle squares touch at the corners (diagonally), a thick black line will connect them.
+This indicates that the agent **cannot pass diagonally** between those cells.
+
+You must treat this diagonal as a wall — only cardinal (up/down/left/right) movements are allowed, and diagonal movement is not possible under any condition.
+
+---
+{PROMPT_BREAK}""")
+    return prefix + f"""
 **Environment**
 
 Below is a Python-style setup of the GridWorld environment.  
@@ -623,22 +742,6 @@ The grid is 0-indexed. (0, 0) is bottom-left. ({grid_size - 1}, {grid_size - 1})
 
 Should the agent move **{direction}**?
 
----
-
-### Instructions (read carefully before responding)
-
-1. **Legal actions** - consider if this direction avoids obstacles and is allowed from the current position.
-2. **Goal-seeking** - prioritize moving toward the red goal.
-3. **Avoid repetition** - if the same move has been repeated without progress, say NO unless it clearly helps.
-4. **Trap avoidance** - avoid directions that lead to dead ends or repeated loops.
-5. **Output format** - respond with exactly one word: YES or NO. Uppercase, no punctuation, no extra text, not bolded.
-   *Do not include any other explanation, characters, or formatting.*
-
-**Important:** If two black obstacle squares touch at the corners (diagonally), a thick black line will connect them.
-This indicates that the agent **cannot pass diagonally** between those cells.
-
-You must treat this diagonal as a wall — only cardinal (up/down/left/right) movements are allowed, and diagonal movement is not possible under any condition.
-
 Now respond: YES or NO
 """
 
@@ -654,47 +757,19 @@ def build_yesno_prompt_unassigned_goals(
     visits    # dict {(r, c): count}
 ):
     # Format obstacle coordinates
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Format memory
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
     # Format other agents
-    if other_agents:
-        other_agent_lines = "\n".join(
-            [f"  • Agent {aid} is at (row {pos[0]}, col {pos[1]})" for aid, pos in other_agents]
-        )
-    else:
-        other_agent_lines = "  • (no other agents present)"
+    other_agent_lines = _other_agent_lines(other_agents)
 
     # Format goals (unassigned)
-    goal_lines = "\n".join(
-        [f"  • Goal {chr(65+i)} is at (row {pos[0]}, col {pos[1]})" for i, pos in enumerate(goal_positions) if pos is not None]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
     # Dynamically list only the existing goal labels in the environment description
     existing_goal_labels = [chr(65+i) for i, pos in enumerate(goal_positions) if pos is not None]
@@ -703,14 +778,9 @@ def build_yesno_prompt_unassigned_goals(
     else:
         goal_label_str = "(none)"
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_unassigned_goals", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (a blue square labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
-Black squares are obstacles that **cannot be entered**.  
-Other agents may be present — they are also shown as blue squares with numeric labels (1, 2, 3, ...).
-
 Four colored borders define direction:
 * green (top) → **up**
 * gray (bottom) → **down**
@@ -721,6 +791,27 @@ All coordinates are zero-indexed:
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
+* Obstacles            … {obs_coords or "none"}  
+
+---
+
+### Instructions (read carefully before responding)
+
+1. **Legal actions** - do not walk into obstacles or off the grid.
+2. **Goal coverage** - each goal must be reached by one agent, but **goals are unassigned**.
+3. **Coordination assumption** - you cannot communicate with other agents. Avoid chasing the same goal as others if better options exist.
+4. **Global objective** - minimize the **total number of steps** for all agents to reach all goals.
+5. **Don't be greedy** - choosing the nearest goal isn't always optimal for the team.
+6. **Output format** - respond with exactly one word: YES or NO. All caps. No punctuation or extra explanation.
+7. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (a blue square labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
+Black squares are obstacles that **cannot be entered**.  
+Other agents may be present — they are also shown as blue squares with numeric labels (1, 2, 3, ...).
+
 In the image:
 - Obstacles are black squares labeled **O**
 - Goals are red squares labeled {goal_label_str}
@@ -729,7 +820,6 @@ In the image:
 
 **Current state**  
 * Your position        … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Obstacles            … {obs_coords or "none"}  
 * Other agents         …  
 {other_agent_lines}
 * Goal locations       …  
@@ -747,18 +837,6 @@ In the image:
 
 Should Agent {agent_id} move **{direction}**?
 
----
-
-### Instructions (read carefully before responding)
-
-1. **Legal actions** - do not walk into obstacles or off the grid.
-2. **Goal coverage** - each goal must be reached by one agent, but **goals are unassigned**.
-3. **Coordination assumption** - you cannot communicate with other agents. Avoid chasing the same goal as others if better options exist.
-4. **Global objective** - minimize the **total number of steps** for all agents to reach all goals.
-5. **Don't be greedy** - choosing the nearest goal isn't always optimal for the team.
-6. **Output format** - respond with exactly one word: YES or NO. All caps. No punctuation or extra explanation.
-7. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
-
 Now respond: YES or NO
 """
 
@@ -775,42 +853,16 @@ def build_yesno_prompt_unassigned_com(
     agent_targets  # list of target goal labels (e.g., ["A", "B", None])
 ):
     # Format obstacle coordinates
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Format memory
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
     # Format other agents
-    if other_agents:
-        other_agent_lines = "\n".join(
-            [f"  • Agent {aid} is at (row {pos[0]}, col {pos[1]})" for aid, pos in other_agents]
-        )
-    else:
-        other_agent_lines = "  • (no other agents present)"
+    other_agent_lines = _other_agent_lines(other_agents)
 
     # Format declared targets
     declared_target_lines = []
@@ -825,9 +877,7 @@ def build_yesno_prompt_unassigned_com(
         declared_targets_block = "  • (no goal commitments from other agents)"
 
     # Format goals (unassigned)
-    goal_lines = "\n".join(
-        [f"  • Goal {chr(65+i)} is at (row {pos[0]}, col {pos[1]})" for i, pos in enumerate(goal_positions) if pos is not None]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
     # Dynamically list only the existing goal labels in the environment description
     existing_goal_labels = [chr(65+i) for i, pos in enumerate(goal_positions) if pos is not None]
@@ -836,14 +886,9 @@ def build_yesno_prompt_unassigned_com(
     else:
         goal_label_str = "(none)"
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_unassigned_com", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (a blue square labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
-Black squares are obstacles that **cannot be entered**.  
-Other agents may be present — they are also shown as blue squares with numeric labels (1, 2, 3, ...).
-
 Four colored borders define direction:
 * green (top) → **up**
 * gray (bottom) → **down**
@@ -854,6 +899,29 @@ All coordinates are zero-indexed:
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
+* Obstacles            … {obs_coords or "none"}  
+
+---
+
+### Instructions (read carefully before responding)
+
+1. **Legal actions** - do not walk into obstacles or off the grid.
+2. **Goal coverage** - each goal must be reached by one agent, but **goals are unassigned**.
+3. **Coordination assumption** - you cannot communicate with other agents. Avoid chasing the same goal as others if better options exist.
+4. **Global objective** - minimize the **total number of steps** for all agents to reach all goals.
+5. **Don't be greedy** - choosing the nearest goal isn't always optimal for the team.
+6. **Output format** - respond with exactly one word: YES or NO. All caps. No punctuation or extra explanation.
+7. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
+8. **Coordination via targets** - You are aware of other agents' chosen goals. If your selected target goal conflicts with theirs, consider whether **you** should change. Do not change without a reason — prefer to stay on your current goal unless a conflict clearly requires resolution.
+9. **Explanation** - Give a brief 1-2 sentence explanation of your reasoning for the move and goal choice in the explanation field.
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (a blue square labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
+Black squares are obstacles that **cannot be entered**.  
+Other agents may be present — they are also shown as blue squares with numeric labels (1, 2, 3, ...).
+
 In the image:
 - Obstacles are black squares labeled **O**
 - Goals are red squares labeled {goal_label_str}
@@ -862,7 +930,6 @@ In the image:
 
 **Current state**  
 * Your position        … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Obstacles            … {obs_coords or "none"}  
 * Other agents         …  
 {other_agent_lines}
 * Declared targets     …  
@@ -875,7 +942,6 @@ In the image:
 
 **Move Analysis (cell visit frequency)**  
 {move_analysis}
-
 ---
 
 ### Question
@@ -883,20 +949,6 @@ In the image:
 Should Agent {agent_id} move **{direction}**?
 What goal should Agent {agent_id} pursue?
 
----
-
-### Instructions (read carefully before responding)
-
-1. **Legal actions** - do not walk into obstacles or off the grid.
-2. **Goal coverage** - each goal must be reached by one agent, but **goals are unassigned**.
-3. **Coordination assumption** - you cannot communicate with other agents. Avoid chasing the same goal as others if better options exist.
-4. **Global objective** - minimize the **total number of steps** for all agents to reach all goals.
-5. **Don't be greedy** - choosing the nearest goal isn't always optimal for the team.
-6. **Output format** - respond with exactly one word: YES or NO. All caps. No punctuation or extra explanation.
-7. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
-8. **Coordination via targets** - You are aware of other agents' chosen goals. If your selected target goal conflicts with theirs, consider whether **you** should change. Do not change without a reason — prefer to stay on your current goal unless a conflict clearly requires resolution.
-9. **Explanation** - Give a brief 1-2 sentence explanation of your reasoning for the move and goal choice in the explanation field.
-
 Now respond: YES or NO
 """
 
@@ -913,42 +965,16 @@ def build_yesno_prompt_unassigned_com_unstructured(
     agent_targets  # list of target goal labels (e.g., ["A", "B", None])
 ):
     # Format obstacle coordinates
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Format memory
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
     # Format other agents
-    if other_agents:
-        other_agent_lines = "\n".join(
-            [f"  • Agent {aid} is at (row {pos[0]}, col {pos[1]})" for aid, pos in other_agents]
-        )
-    else:
-        other_agent_lines = "  • (no other agents present)"
+    other_agent_lines = _other_agent_lines(other_agents)
 
     # Format declared targets
     declared_target_lines = []
@@ -963,9 +989,7 @@ def build_yesno_prompt_unassigned_com_unstructured(
         declared_targets_block = "  • (no goal commitments from other agents)"
 
     # Format goals (unassigned)
-    goal_lines = "\n".join(
-        [f"  • Goal {chr(65+i)} is at (row {pos[0]}, col {pos[1]})" for i, pos in enumerate(goal_positions) if pos is not None]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
     # Dynamically list only the existing goal labels in the environment description
     existing_goal_labels = [chr(65+i) for i, pos in enumerate(goal_positions) if pos is not None]
@@ -974,14 +998,9 @@ def build_yesno_prompt_unassigned_com_unstructured(
     else:
         goal_label_str = "(none)"
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_unassigned_com_unstructured", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (a blue square labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
-Black squares are obstacles that **cannot be entered**.  
-Other agents may be present — they are also shown as blue squares with numeric labels (1, 2, 3, ...).
-
 Four colored borders define direction:
 * green (top) → **up**
 * gray (bottom) → **down**
@@ -992,6 +1011,37 @@ All coordinates are zero-indexed:
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
+* Obstacles            … {obs_coords or "none"}  
+
+---
+
+### Instructions (read carefully before responding)
+
+1. **Legal actions** - do not walk into obstacles or off the grid.
+2. **Goal coverage** - each goal must be reached by one agent, but **goals are unassigned**.
+3. **Coordination assumption** - you cannot communicate with other agents. Avoid chasing the same goal as others if better options exist.
+4. **Global objective** - minimize the **total number of steps** for all agents to reach all goals.
+5. **Don't be greedy** - choosing the nearest goal isn't always optimal for the team.
+6. **Output format** - respond with exactly one word: YES or NO. All caps. No punctuation or extra explanation.
+7. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
+8. **Coordination via targets** - You are aware of other agents' chosen goals. If your selected target goal conflicts with theirs, consider whether **you** should change. Do not change without a reason — prefer to stay on your current goal unless a conflict clearly requires resolution.
+9. **Explanation** - Give a brief 1-2 sentence explanation of your reasoning for the move and goal choice in the explanation field.
+10. **Response structure** - Provide your answer in a JSON format with keys "move", "target", and "explanation". However, do not include the json wrapper with the triple quotes in your response, just the JSON object itself in plain text format. DO NOT WRITE THE TRIPLE QUOTES JSON.
+
+Respond in the JSON format:
+{{
+  "move": "YES or NO in CAPS",
+  "target": "(goal letter, e.g. A, B, ... in CAPS)",
+  "explanation": "(brief justification for your choice, 1-2 sentences)"
+}}
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (a blue square labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
+Black squares are obstacles that **cannot be entered**.  
+Other agents may be present — they are also shown as blue squares with numeric labels (1, 2, 3, ...).
+
 In the image:
 - Obstacles are black squares labeled **O**
 - Goals are red squares labeled {goal_label_str}
@@ -1000,7 +1050,6 @@ In the image:
 
 **Current state**  
 * Your position        … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Obstacles            … {obs_coords or "none"}  
 * Other agents         …  
 {other_agent_lines}
 * Declared targets     …  
@@ -1021,27 +1070,6 @@ In the image:
 Should Agent {agent_id} move **{direction}**?
 What goal should Agent {agent_id} pursue?
 
----
-
-### Instructions (read carefully before responding)
-
-1. **Legal actions** - do not walk into obstacles or off the grid.
-2. **Goal coverage** - each goal must be reached by one agent, but **goals are unassigned**.
-3. **Coordination assumption** - you cannot communicate with other agents. Avoid chasing the same goal as others if better options exist.
-4. **Global objective** - minimize the **total number of steps** for all agents to reach all goals.
-5. **Don't be greedy** - choosing the nearest goal isn't always optimal for the team.
-6. **Output format** - respond with exactly one word: YES or NO. All caps. No punctuation or extra explanation.
-7. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
-8. **Coordination via targets** - You are aware of other agents' chosen goals. If your selected target goal conflicts with theirs, consider whether **you** should change. Do not change without a reason — prefer to stay on your current goal unless a conflict clearly requires resolution.
-9. **Explanation** - Give a brief 1-2 sentence explanation of your reasoning for the move and goal choice in the explanation field.
-10. **Response structure** - Provide your answer in a JSON format with keys "move", "target", and "explanation". However, do not include the json wrapper with the triple quotes in your response, just the JSON object itself in plain text format. DO NOT WRITE THE TRIPLE QUOTES JSON.
-
-Respond in the JSON format:
-{{
-  "move": "YES or NO in CAPS",
-  "target": "(goal letter, e.g. A, B, ... in CAPS)",
-  "explanation": "(brief justification for your choice, 1-2 sentences)"
-}}
 """
 
 def build_yesno_prompt_unstruc_v2(
@@ -1058,42 +1086,16 @@ def build_yesno_prompt_unstruc_v2(
     env  # full GridWorld environment instance (required for pathfinding)
 ):
     # Format obstacle coordinates
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Format memory
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → got to (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_GOT_TO)
 
     # Format move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
     # Format other agents
-    if other_agents:
-        other_agent_lines = "\n".join(
-            [f"  • Agent {aid} is at (row {pos[0]}, col {pos[1]})" for aid, pos in other_agents]
-        )
-    else:
-        other_agent_lines = "  • (no other agents present)"
+    other_agent_lines = _other_agent_lines(other_agents)
 
     # Format declared targets
     declared_target_lines = []
@@ -1108,9 +1110,7 @@ def build_yesno_prompt_unstruc_v2(
         declared_targets_block = "  • (no goal commitments from other agents)"
 
     # Format goals (unassigned)
-    goal_lines = "\n".join(
-        [f"  • Goal {chr(65+i)} is at (row {pos[0]}, col {pos[1]})" for i, pos in enumerate(goal_positions) if pos is not None]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
     # Dynamically list only the existing goal labels in the environment description
     existing_goal_labels = [chr(65+i) for i, pos in enumerate(goal_positions) if pos is not None]
@@ -1120,15 +1120,9 @@ def build_yesno_prompt_unstruc_v2(
         goal_label_str = "(none)"
 
     # Calculate projected cell number if the agent moves in the proposed direction
-    move_offsets = {
-        'up': (1, 0),
-        'down': (-1, 0),
-        'left': (0, -1),
-        'right': (0, 1)
-    }
-    if direction in move_offsets:
+    if direction in MOVE_OFFSETS:
         r, c = agent_pos
-        dr, dc = move_offsets[direction]
+        dr, dc = MOVE_OFFSETS[direction]
         target_pos = (r + dr, c + dc)
         if 0 <= target_pos[0] < grid_size and 0 <= target_pos[1] < grid_size:
             target_cell_id = target_pos[0] * grid_size + target_pos[1]
@@ -1138,16 +1132,9 @@ def build_yesno_prompt_unstruc_v2(
     else:
         move_label_line = ""
 
-    return f"""
+    prefix = _scenario_prefix("build_yesno_prompt_unstruc_v2", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (a blue **circle** labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
-Black squares are obstacles that **cannot be entered**.  
-Other agents may be present — they are also shown as blue circles with numeric labels (1, 2, 3, ...).  
-All empty cells are labeled with a gray number in the background to assist reasoning.  
-Cell labels increase from the **bottom-left**, moving **left to right**, then **up row by row**.
-
 Four colored borders define direction:
 * green (top) → **up**
 * gray (bottom) → **down**
@@ -1158,12 +1145,6 @@ All coordinates are zero-indexed:
 - (0, 0) is the bottom-left corner
 - ({grid_size - 1}, {grid_size - 1}) is the top-right corner
 
-In the image:
-- Obstacles are black squares labeled **O**
-- Goals are red squares labeled {goal_label_str}
-- You are labeled **{agent_id}**
-- Other agents are labeled numerically
-
 A simulation step means that every agent takes one move at the same time. The simulation ends when all agents have reached a goal. Your job is to minimize the total number of simulation steps — the number of moves until the last agent finishes.
 Your goal is to minimize the total number of simulation steps required for all agents to reach the goals.
 
@@ -1195,29 +1176,7 @@ A simulation step means that all agents move once at the same time. The simulati
 
 Your reasoning and goal selection should be based on this principle.
 
-**Current state**  
-* Your position        … **(row {agent_pos[0]}, col {agent_pos[1]})**  
 * Obstacles            … {obs_coords or "none"}  
-* Other agents         …  
-{other_agent_lines}
-* Declared targets     …  
-{declared_targets_block}
-* Goal locations       …  
-{goal_lines}
-
-**Memory (last 5 moves)**  
-{history_lines}
-
-**Move Analysis (cell visit frequency)**  
-{move_analysis}
-
----
-
-### Question
-
-Should Agent {agent_id} move **{direction}**?  
-{move_label_line}  
-What goal should Agent {agent_id} pursue?
 
 ---
 
@@ -1257,6 +1216,45 @@ Respond in the JSON format:
   "target": "(goal letter, e.g. A, B, ... in CAPS)",
   "explanation": "(brief justification for your choice, 1-2 sentences)"
 }}
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (a blue **circle** labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+There are several red squares labeled {goal_label_str}. These are **unassigned goals** — you may approach any of them.  
+Black squares are obstacles that **cannot be entered**.  
+Other agents may be present — they are also shown as blue circles with numeric labels (1, 2, 3, ...).  
+All empty cells are labeled with a gray number in the background to assist reasoning.  
+Cell labels increase from the **bottom-left**, moving **left to right**, then **up row by row**.
+
+In the image:
+- Obstacles are black squares labeled **O**
+- Goals are red squares labeled {goal_label_str}
+- You are labeled **{agent_id}**
+- Other agents are labeled numerically
+
+**Current state**  
+* Your position        … **(row {agent_pos[0]}, col {agent_pos[1]})**  
+* Other agents         …  
+{other_agent_lines}
+* Declared targets     …  
+{declared_targets_block}
+* Goal locations       …  
+{goal_lines}
+
+**Memory (last 5 moves)**  
+{history_lines}
+
+**Move Analysis (cell visit frequency)**  
+{move_analysis}
+
+---
+
+### Question
+
+Should Agent {agent_id} move **{direction}**?  
+{move_label_line}  
+What goal should Agent {agent_id} pursue?
+
 """
 
 def build_target_selection_prompt(
@@ -1272,40 +1270,15 @@ def build_target_selection_prompt(
     target_memory,
     distances
 ):
-    obs_coords = ', '.join(f"({r}, {c})" for r, c in sorted(obstacles))
+    obs_coords = _obstacle_coords(obstacles)
 
-    if memory:
-        history_lines = "\n".join(
-            f"  • {i+1}. You moved from (row {r0}, col {c0}) **{d}** → (row {r1}, col {c1})"
-            for i, (r0, c0, d, r1, c1) in enumerate(memory[:5])
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_YOU)
 
-    goal_lines = "\n".join(
-        f"  • Goal {chr(65+i)} is at (row {r}, col {c})"
-        for i, pos in enumerate(goal_positions)
-        if pos is not None
-        for r, c in [pos]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
-    other_agent_lines = (
-        "\n".join(
-            f"  • Agent {aid} is at (row {p[0]}, col {p[1]})"
-            for aid, p in other_agents
-        )
-        if other_agents
-        else "  • (no other agents present)"
-    )
+    other_agent_lines = _other_agent_lines(other_agents)
 
-    distance_table_lines = []
-    for aid, dist_list in distances.items():
-        row = f"  • Agent {aid}: " + ", ".join(
-            f"{chr(65 + i)} = {d if d != float('inf') else '∞'}"
-            for i, d in enumerate(dist_list)
-        )
-        distance_table_lines.append(row)
-    distance_block = "\n".join(distance_table_lines)
+    distance_block = _distance_table(distances)
 
     declared_target_lines = [
         f"  • Agent {aid} → Goal {tgt}"
@@ -1326,11 +1299,9 @@ def build_target_selection_prompt(
     else:
         past_targets_lines = "  • (no prior target selections)"
 
-    return f"""
+    prefix = _scenario_prefix("build_target_selection_prompt", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (blue circle **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-Choose **one** goal to pursue (red squares A, B, C…).  
 Obstacles: black squares. Empty cells: gray numbers (left→right, bottom→top).
 
 **Simulation mechanics**
@@ -1460,9 +1431,15 @@ Switching: You → Goal A (6 steps) & Agent 3 stays on C → longest path = 6 <
 
 ---
 
+* Obstacles … {obs_coords or "none"}  
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (blue circle **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+Choose **one** goal to pursue (red squares A, B, C…).  
+
 **Current state**  
 * Your position … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Obstacles … {obs_coords or "none"}  
 * Other agents …  
 {other_agent_lines}
 * Declared targets …  
@@ -1509,46 +1486,19 @@ def build_direction_selection_prompt(
     visits,
     agent_targets  # list of goal letters for all agents
 ):
-    obs_coords = ', '.join([f"({r}, {c})" for r, c in sorted(obstacles)])
+    obs_coords = _obstacle_coords(obstacles)
 
     # Move history
-    if memory:
-        history_lines = "\n".join(
-            [f"  • {i+1}. you moved from (row {r0}, col {c0}) **{dir_}** → (row {r1}, col {c1})"
-             for i, (r0, c0, dir_, r1, c1) in enumerate(memory[:5])]
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_ARROW)
 
     # Move analysis
-    move_analysis_lines = []
-    for d in ['up', 'down', 'left', 'right']:
-        r, c = agent_pos
-        if d == "up":
-            target = (r + 1, c)
-        elif d == "down":
-            target = (r - 1, c)
-        elif d == "left":
-            target = (r, c - 1)
-        elif d == "right":
-            target = (r, c + 1)
-        else:
-            continue
-        count = visits.get(target, 0)
-        move_analysis_lines.append(f"  • {d:5} → (row {target[0]}, col {target[1]}) — visited {count} time(s)")
-    move_analysis = "\n".join(move_analysis_lines)
+    move_analysis = _move_analysis(agent_pos, visits)
 
     # Calculate projected (row, col) of the proposed move
-    move_offsets = {
-        'up': (1, 0),
-        'down': (-1, 0),
-        'left': (0, -1),
-        'right': (0, 1)
-    }
     move_label_line = ""
-    if direction in move_offsets:
+    if direction in MOVE_OFFSETS:
         r, c = agent_pos
-        dr, dc = move_offsets[direction]
+        dr, dc = MOVE_OFFSETS[direction]
         target_pos = (r + dr, c + dc)
         if 0 <= target_pos[0] < grid_size and 0 <= target_pos[1] < grid_size:
             move_label_line = f"If you move **{direction}**, you will arrive at cell **(row {target_pos[0]}, col {target_pos[1]})**."
@@ -1579,29 +1529,51 @@ def build_direction_selection_prompt(
             declared_targets_block.append(f"  • Agent {aid} → Goal {tgt}")
     declared_block = "\n".join(declared_targets_block) if declared_targets_block else "  • (no goal commitments from other agents)"
 
-    return f"""
+    prefix = _scenario_prefix("build_direction_selection_prompt", grid_size, obs_coords, lambda: f"""
 **Environment**
 
+All empty cells are labeled with gray numbers in format (row,col) to assist reasoning.
+Bottom-left is (0,0), top-right is ({grid_size-1},{grid_size-1}).
+
+* Obstacles            … {obs_coords or "none"}  
+
+* Goal assignments … Each goal must be reached by exactly one agent. Avoid stepping into another agent’s goal.
+
+---
+
+### Instructions
+
+1. Only respond YES if the move brings you closer to your own goal.
+2. DO NOT enter a goal cell that is assigned to another agent, even if it's closer.
+3. If another agent is nearby or heading to the same area, consider avoiding a collision.
+4. Use your declared goal to reason about where to go — you are committed to it unless a new plan is made.
+5. Do not block others if there’s a better route for the team.
+6. Do not go away from your goal unless it’s necessary to avoid a collision or obstacle.
+
+Respond in the JSON format:
+```json
+{{
+  "move": "YES or NO in CAPS",
+  "explanation": "(brief justification for your choice, 1-2 sentences)"
+}}
+```
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
 You are Agent {agent_id} (a blue circle labeled **{agent_id}**) on a {grid_size}×{grid_size} grid.  
 Your current declared target is Goal {declared_goal}.  
 Your job now is to decide whether you should move **{direction}** to approach it.  
 
 Other agents are also choosing their moves. Coordination is important — do not walk into obstacles or other agents.  
 
-All empty cells are labeled with gray numbers in format (row,col) to assist reasoning.
-Bottom-left is (0,0), top-right is ({grid_size-1},{grid_size-1}).
-
 **Current state**  
 * Your position        … **(row {agent_pos[0]}, col {agent_pos[1]})**  
 * {goal_line}  
-* Obstacles            … {obs_coords or "none"}  
 * Other agents         …  
 {chr(10).join([f"  • Agent {aid} is at (row {r}, col {c})" for aid, (r, c) in other_agents]) or "  • (none)"}  
 * Declared targets     …  
 {declared_block}
 
-* Goal assignments … Each goal must be reached by exactly one agent. Avoid stepping into another agent’s goal.
-
 **Memory (last 5 moves)**  
 {history_lines}
 
@@ -1614,25 +1586,62 @@ Bottom-left is (0,0), top-right is ({grid_size-1},{grid_size-1}).
 
 Should Agent {agent_id} move **{direction}**?  
 {move_label_line}
+"""
+
+def yesno_context(prompt):
+    """
+    (context, subject) of a yes/no direction prompt: everything before its "### Question", minus its
+    YES/NO instructions, and who the question is about (e.g. "Agent 2"). Raises ValueError when the
+    prompt lacks the layout the yes/no builders share, so a reworded builder fails here instead of
+    producing a wrong multi-choice prompt.
+    """
+    context, marker, question = prompt.partition("### Question")
+    subject = re.match(r"\s*Should (.+?) move \*\*", question)
+    if not marker or "### Question" in question or subject is None:
+        raise ValueError("Not a yes/no direction prompt: expected one '### Question' followed by 'Should ... move **<direction>**'")
+    head, instructions, rest = context.partition("### Instructions")
+    if instructions:
+        if PROMPT_BREAK not in rest or "### Instructions" in rest:
+            raise ValueError("The instructions before the question of a yes/no prompt must end at PROMPT_BREAK")
+        context = head + rest[rest.index(PROMPT_BREAK):]
+    return context, subject.group(1)
+
+def build_direction_choice_prompt(build_yesno_prompt, valid_actions, agent_pos, **kwargs):
+    """
+    Multi-choice form of a yes/no direction prompt: the same situation, but one question listing every
+    valid direction and a one-word answer, so the first-token logprobs rank all directions in one request.
+
+    Args:
+        build_yesno_prompt: one of the yes/no builders above (called with direction=...)
+        valid_actions: directions to choose from
+        agent_pos: agent's (row, col)
+        **kwargs: remaining arguments of build_yesno_prompt, except direction and agent_pos
+    """
+    choices = ", ".join(valid_actions[:-1]) + f" or {valid_actions[-1]}" if len(valid_actions) > 1 else valid_actions[0]
+    context, subject = yesno_context(build_yesno_prompt(agent_pos=agent_pos, direction=choices, **kwargs))
+
+    option_lines = "\n".join(
+        [f"  • {d:5} → (row {agent_pos[0] + MOVE_OFFSETS[d][0]}, col {agent_pos[1] + MOVE_OFFSETS[d][1]})"
+         for d in valid_actions]
+    )
+
+    return f"""{context}### Question
+
+Which direction should {subject} move next? Valid directions from the current position:
+{option_lines}
 
 ---
 
-### Instructions
+### Instructions (read carefully before responding)
 
-1. Only respond YES if the move brings you closer to your own goal.
-2. DO NOT enter a goal cell that is assigned to another agent, even if it's closer.
-3. If another agent is nearby or heading to the same area, consider avoiding a collision.
-4. Use your declared goal to reason about where to go — you are committed to it unless a new plan is made.
-5. Do not block others if there’s a better route for the team.
-6. Do not go away from your goal unless it’s necessary to avoid a collision or obstacle.
+1. **Legal actions** - choose only from the valid directions listed above.
+2. **Goal-seeking** - prefer the move that shortens the obstacle-free path to the goal you are heading for.
+3. **Avoid repetition** - do not repeat moves that made no progress; avoid dead ends and loops.
+4. **Coordination** - avoid cells occupied by other agents and goals that other agents are heading for.
+5. **Diagonal wall rule** - if two obstacles touch at corners, a thick black diagonal means you cannot pass through that diagonal.
+6. **Output format** - respond with exactly one word: {choices}. Lowercase, no punctuation, no extra text, not bolded.
 
-Respond in the JSON format:
-```json
-{{
-  "move": "YES or NO in CAPS",
-  "explanation": "(brief justification for your choice, 1-2 sentences)"
-}}
-```
+Now respond with one word: {choices}
 """
 
 def build_target_ranking_prompt(
@@ -1648,40 +1657,15 @@ def build_target_ranking_prompt(
     target_memory,
     distances
 ):
-    obs_coords = ', '.join(f"({r}, {c})" for r, c in sorted(obstacles))
+    obs_coords = _obstacle_coords(obstacles)
 
-    if memory:
-        history_lines = "\n".join(
-            f"  • {i+1}. You moved from (row {r0}, col {c0}) **{d}** → (row {r1}, col {c1})"
-            for i, (r0, c0, d, r1, c1) in enumerate(memory[:5])
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_YOU)
 
-    goal_lines = "\n".join(
-        f"  • Goal {chr(65+i)} is at (row {r}, col {c})"
-        for i, pos in enumerate(goal_positions)
-        if pos is not None
-        for r, c in [pos]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
-    other_agent_lines = (
-        "\n".join(
-            f"  • Agent {aid} is at (row {p[0]}, col {p[1]})"
-            for aid, p in other_agents
-        )
-        if other_agents
-        else "  • (no other agents present)"
-    )
+    other_agent_lines = _other_agent_lines(other_agents)
 
-    distance_table_lines = []
-    for aid, dist_list in distances.items():
-        row = f"  • Agent {aid}: " + ", ".join(
-            f"{chr(65 + i)} = {d if d != float('inf') else '∞'}"
-            for i, d in enumerate(dist_list)
-        )
-        distance_table_lines.append(row)
-    distance_block = "\n".join(distance_table_lines)
+    distance_block = _distance_table(distances)
 
     declared_target_lines = [
         f"  • Agent {aid} → Goal {tgt}"
@@ -1702,11 +1686,9 @@ def build_target_ranking_prompt(
     else:
         past_targets_lines = "  • (no prior target selections)"
 
-    return f"""
+    prefix = _scenario_prefix("build_target_ranking_prompt", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (blue circle **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-Choose **one** goal to pursue (red squares A, B, C…).  
 Obstacles: black squares. Empty cells: gray numbers (left→right, bottom→top).
 
 **Simulation mechanics**
@@ -1845,9 +1827,15 @@ For every assignment, check if swapping your choice with another agent's leads t
 Rank goals for yourself in order of which assignment leads to the lowest maximum team finish time, not by your own shortest path.
 ---
 
+* Obstacles … {obs_coords or "none"}  
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (blue circle **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+Choose **one** goal to pursue (red squares A, B, C…).  
+
 **Current state**  
 * Your position … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Obstacles … {obs_coords or "none"}  
 * Other agents …  
 {other_agent_lines}
 * Declared targets …  
@@ -1946,11 +1934,9 @@ def build_negotiation_prompt(
             f"It is now your turn to respond. You may accept, counter, or reject."
         )
 
-    prompt = f"""
+    prefix = _scenario_prefix("build_negotiation_prompt", None, None, lambda: f"""
 **🧠 Negotiation Mode: Conflict Resolution between LLM Agents**
 
-You are Agent {self_id} (🔵 blue circle with number {self_id}) on a shared grid environment.  
-You are negotiating with Agent {opponent_id} to resolve a **goal conflict**.  
 Each agent must end up with exactly one unique goal (A, B, C, …). No two agents can pursue the same goal.
 
 Your objective is to **minimize the number of timesteps until all agents reach their goals**.  
@@ -1958,6 +1944,11 @@ This cost is defined as the **maximum number of steps** any agent must take to r
 
 ---
 
+{PROMPT_BREAK}""")
+    prompt = prefix + f"""
+You are Agent {self_id} (🔵 blue circle with number {self_id}) on a shared grid environment.  
+You are negotiating with Agent {opponent_id} to resolve a **goal conflict**.  
+
 **🎯 Goals Under Negotiation**
 
 {formatted_goal_locations}
@@ -2059,31 +2050,13 @@ def build_target_ranking_prompt_no_distances(
     target_memory,
     distances
 ):
-    obs_coords = ', '.join(f"({r}, {c})" for r, c in sorted(obstacles))
+    obs_coords = _obstacle_coords(obstacles)
 
-    if memory:
-        history_lines = "\n".join(
-            f"  • {i+1}. You moved from (row {r0}, col {c0}) **{d}** → (row {r1}, col {c1})"
-            for i, (r0, c0, d, r1, c1) in enumerate(memory[:5])
-        )
-    else:
-        history_lines = "  • (no prior moves — this is the first step)"
+    history_lines = _history_lines(memory, HISTORY_YOU)
 
-    goal_lines = "\n".join(
-        f"  • Goal {chr(65+i)} is at (row {r}, col {c})"
-        for i, pos in enumerate(goal_positions)
-        if pos is not None
-        for r, c in [pos]
-    )
+    goal_lines = _goal_lines(goal_positions)
 
-    other_agent_lines = (
-        "\n".join(
-            f"  • Agent {aid} is at (row {p[0]}, col {p[1]})"
-            for aid, p in other_agents
-        )
-        if other_agents
-        else "  • (no other agents present)"
-    )
+    other_agent_lines = _other_agent_lines(other_agents)
 
     declared_target_lines = [
         f"  • Agent {aid} → Goal {tgt}"
@@ -2104,11 +2077,9 @@ def build_target_ranking_prompt_no_distances(
     else:
         past_targets_lines = "  • (no prior target selections)"
 
-    return f"""
+    prefix = _scenario_prefix("build_target_ranking_prompt_no_distances", grid_size, obs_coords, lambda: f"""
 **Environment**
 
-You are Agent {agent_id} (blue circle **{agent_id}**) on a {grid_size}×{grid_size} grid.  
-Choose **one** goal to pursue (red squares A, B, C…).  
 Obstacles: black squares. Empty cells: gray numbers (left→right, bottom→top).
 
 **Simulation mechanics**
@@ -2247,9 +2218,15 @@ For every assignment, check if swapping your choice with another agent's leads t
 Rank goals for yourself in order of which assignment leads to the lowest maximum team finish time, not by your own shortest path.
 ---
 
+* Obstacles … {obs_coords or "none"}  
+
+{PROMPT_BREAK}""")
+    return prefix + f"""
+You are Agent {agent_id} (blue circle **{agent_id}**) on a {grid_size}×{grid_size} grid.  
+Choose **one** goal to pursue (red squares A, B, C…).  
+
 **Current state**  
 * Your position … **(row {agent_pos[0]}, col {agent_pos[1]})**  
-* Obstacles … {obs_coords or "none"}  
 * Other agents …  
 {other_agent_lines}
 * Declared targets …  
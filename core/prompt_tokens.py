@@ -0,0 +1,170 @@
+import json
+import os
+import re
+import threading
+from core.ratelimit import IMAGE_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # counts fall back to the ~4 characters per token estimate
+    tiktoken = None
+
+# Encoding of the gpt-4o / gpt-4.1 family
+TIKTOKEN_ENCODING = "o200k_base"
+
+# A section starts at a markdown heading ("### Question"), a line that is bold only ("**Current state**")
+# or a labelled field ("* Obstacles … ..."); the text before the first one is the "preamble"
+_HEADING = re.compile(r"^(?:#{1,4}\s+(?P<h>.+?)|\*\*(?P<b>[^*].{0,60}?)\*\*:?|\*\s+(?P<f>[A-Z][\w /'-]*?)\s*….*)\s*$")
+_LABEL_CHARS = re.compile(r"[^\w /'-]+")
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None and tiktoken is not None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    _encoder = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+                except Exception:  # encoding files not cached and no network
+                    _encoder = False
+    return _encoder or None
+
+def token_counter_name():
+    return f"tiktoken {TIKTOKEN_ENCODING}" if _get_encoder() else "estimated at 4 characters per token"
+
+def count_tokens(text):
+    """Tokens in `text` with tiktoken when installed, else the len // 4 estimate core.ratelimit also uses."""
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(text) // 4
+
+def prompt_text(params):
+    """Concatenated text parts of a request payload (chat messages or responses-API input)."""
+    parts = []
+
+    def walk(value):
+        if isinstance(value, str):
+            if not value.startswith("data:image"):
+                parts.append(value)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if key in ("text", "content") or isinstance(item, (list, dict)):
+                    walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    walk(params.get("messages", params.get("input")))
+    return "\n".join(parts)
+
+def _has_image(value):
+    if isinstance(value, str):
+        return value.startswith("data:image")
+    if isinstance(value, dict):
+        return any(_has_image(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_has_image(item) for item in value)
+    return False
+
+def prompt_sections(prompt):
+    """
+    Split a prompt into (section name, text) at its headings, e.g. ("Obstacles", "* Obstacles … (1, 2)")
+    or ("Agent-to-Goal Distances in steps", "**Agent-to-Goal Distances (in steps)**\\n  • Agent 1: ...").
+    """
+    sections = []
+    name, lines = "preamble", []
+    for line in prompt.split("\n"):
+        match = _HEADING.match(line.strip())
+        if match:
+            if any(l.strip() for l in lines):
+                sections.append((name, "\n".join(lines)))
+            label = match.group("h") or match.group("b") or match.group("f")
+            name, lines = " ".join(_LABEL_CHARS.sub("", label).split()) or label.strip(), []
+        lines.append(line)
+    if any(l.strip() for l in lines):
+        sections.append((name, "\n".join(lines)))
+    return sections
+
+class PromptTokens:
+    """
+    Thread-safe per-section token totals of the prompts sent through core.request (cache hits and
+    offline backends included, since the prompt is what is measured), optionally logging one JSON line
+    per request with its section counts.
+
+    Args:
+        log_path: JSONL file to append {"endpoint", "model", "tokens", "sections"} per request; None to skip
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.tokens = 0
+            self.sections = {}
+
+    def record(self, endpoint, params, image_bytes=None):
+        """Count the sections of one request; an attached image counts as one "image" section of IMAGE_TOKENS."""
+        counts = {}
+        for name, text in prompt_sections(prompt_text(params)):
+            counts[name] = counts.get(name, 0) + count_tokens(text)
+        if image_bytes or _has_image(params.get("messages", params.get("input"))):
+            counts["image"] = IMAGE_TOKENS
+        total = sum(counts.values())
+        with self._lock:
+            self.requests += 1
+            self.tokens += total
+            for name, count in counts.items():
+                self.sections[name] = self.sections.get(name, 0) + count
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps({"endpoint": endpoint, "model": params.get("model"), "tokens": total, "sections": counts}) + "\n")
+        return counts
+
+    def merge(self, other):
+        """Add the totals of another PromptTokens or of an as_dict() result (e.g. from a worker process)."""
+        values = other if isinstance(other, dict) else other.as_dict()
+        with self._lock:
+            self.requests += values.get("requests", 0)
+            self.tokens += values.get("tokens", 0)
+            for name, count in values.get("sections", {}).items():
+                self.sections[name] = self.sections.get(name, 0) + count
+
+    def as_dict(self):
+        with self._lock:
+            return {"requests": self.requests, "tokens": self.tokens, "sections": dict(self.sections)}
+
+    def summary(self, top=8):
+        """Report lines: mean prompt size and the `top` largest sections by share; None when nothing was sent."""
+        if not self.requests:
+            return None
+        lines = [f"Prompt tokens: {self.tokens / self.requests:.0f} per request over {self.requests} requests ({token_counter_name()})"]
+        for name, count in sorted(self.sections.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {name}: {count / self.requests:.0f} per request ({100 * count / self.tokens:.1f}%)")
+        return "\n".join(lines)
+
+class NullPromptTokens(PromptTokens):
+    """Recorder used while prompt token counting is off: record() does nothing, so summary() is None."""
+
+    def record(self, endpoint, params, image_bytes=None):
+        return {}
+
+# Counting tokenizes every section of every prompt, so it is off unless a report or log was asked for
+# (the eval CLIs' --prompt-tokens / --prompt-token-log, or PROMPT_TOKENS=1 in the environment)
+_prompt_tokens = PromptTokens() if os.environ.get("PROMPT_TOKENS") == "1" else NullPromptTokens()
+
+def set_prompt_tokens(enabled, log_path=None):
+    """Turn prompt token counting on (a fresh PromptTokens, logging to `log_path` if given) or off."""
+    global _prompt_tokens
+    _prompt_tokens = PromptTokens(log_path) if enabled or log_path else NullPromptTokens()
+    return _prompt_tokens
+
+def get_prompt_tokens():
+    """Process-wide PromptTokens that every request in core.request records into (a no-op one while counting is off)."""
+    return _prompt_tokens
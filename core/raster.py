@@ -0,0 +1,338 @@
+import base64
+import io
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from matplotlib import font_manager
+from core.environment import GridWorld
+
+# Direct-to-pixel versions of the core.plot figures. Same layout and colours (row 0 at the bottom,
+# coloured borders, black obstacles, red goals, blue agents, diagonal blockers), drawn with NumPy
+# array operations instead of a matplotlib figure.
+
+TARGET_PX = 480         # approximate output width/height, close to the matplotlib figures
+BORDER_PX = 11          # visible half of the 16pt border lines
+GRID_LINE_PX = 1
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRAY = (128, 128, 128)
+AGENT_COLOR = (0, 102, 255)
+GOAL_COLOR = (255, 0, 0)
+BORDER_COLORS = {
+    "right": (0, 0, 255),
+    "left": (255, 255, 0),
+    "top": (0, 128, 0),
+    "bottom": (255, 165, 0),
+}
+
+@lru_cache(maxsize=None)
+def _font_path(bold):
+    # matplotlib ships DejaVu Sans, the font its figures use, so no system font is needed
+    properties = font_manager.FontProperties(family="DejaVu Sans", weight="bold" if bold else "normal")
+    return font_manager.findfont(properties)
+
+class GlyphAtlas:
+    """
+    Pre-rasterized glyphs for one font size. Each character is drawn once into an alpha mask;
+    labels are assembled by pasting masks side by side and cached, so per-frame text costs a dict lookup.
+    """
+
+    def __init__(self, px, bold=True):
+        self.font = ImageFont.truetype(_font_path(bold), px)
+        ascent, descent = self.font.getmetrics()
+        self.height = ascent + descent
+        self._glyphs = {}
+        self._labels = {}
+
+    def glyph(self, char):
+        mask = self._glyphs.get(char)
+        if mask is None:
+            width = max(1, int(np.ceil(self.font.getlength(char))))
+            image = Image.new("L", (width, self.height), 0)
+            ImageDraw.Draw(image).text((0, 0), char, font=self.font, fill=255)
+            mask = np.asarray(image, dtype=np.float32) / 255.0
+            self._glyphs[char] = mask
+        return mask
+
+    def label(self, text):
+        """Alpha mask of `text`, cropped to its inked area so it can be centred on a cell."""
+        mask = self._labels.get(text)
+        if mask is None:
+            mask = np.concatenate([self.glyph(ch) for ch in text], axis=1)
+            rows = np.flatnonzero(mask.max(axis=1) > 0)
+            cols = np.flatnonzero(mask.max(axis=0) > 0)
+            if rows.size:
+                mask = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+            self._labels[text] = mask
+        return mask
+
+@lru_cache(maxsize=None)
+def get_atlas(px, bold=True):
+    return GlyphAtlas(px, bold)
+
+class RasterLayout:
+    """Pixel geometry for a grid of `size` cells: half a cell of margin on each side, row 0 at the bottom."""
+
+    def __init__(self, size, cell_px=None):
+        self.size = size
+        self.cell = cell_px or max(8, TARGET_PX // (size + 1))
+        self.margin = self.cell // 2
+        self.width = size * self.cell + 2 * self.margin
+        self.label_px = max(6, min(17, int(self.cell * 0.33)))
+        self.small_px = max(5, min(8, int(self.cell * 0.16)))
+
+    def cell_box(self, r, c):
+        """(y0, y1, x0, x1) pixel bounds of cell (r, c)."""
+        y0 = self.margin + (self.size - 1 - r) * self.cell
+        x0 = self.margin + c * self.cell
+        return y0, y0 + self.cell, x0, x0 + self.cell
+
+    def cell_center(self, r, c):
+        """(y, x) pixel centre of cell (r, c), as floats."""
+        return (
+            self.margin + (self.size - 1 - r + 0.5) * self.cell,
+            self.margin + (c + 0.5) * self.cell,
+        )
+
+def _fill_cells(canvas, layout, cells, color):
+    for r, c in cells:
+        if 0 <= r < layout.size and 0 <= c < layout.size:
+            y0, y1, x0, x1 = layout.cell_box(r, c)
+            canvas[y0:y1, x0:x1] = color
+
+def _clip(mask, y0, x0, shape):
+    """Clip a mask placed at (y0, x0) to an image of `shape`. Returns (mask, image slices) or None."""
+    height, width = mask.shape
+    cy0, cx0 = max(y0, 0), max(x0, 0)
+    cy1, cx1 = min(y0 + height, shape[0]), min(x0 + width, shape[1])
+    if cy0 >= cy1 or cx0 >= cx1:
+        return None
+    return mask[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0, None], (slice(cy0, cy1), slice(cx0, cx1))
+
+def _blend_mask(canvas, mask, y0, x0, color, alpha=1.0):
+    """Alpha-blend `color` into `canvas` through `mask`, with its top-left corner at (y0, x0)."""
+    clipped = _clip(mask, y0, x0, canvas.shape)
+    if clipped is None:
+        return
+    weights, region = clipped[0] * alpha, clipped[1]
+    pixels = canvas[region].astype(np.float32)
+    canvas[region] = (pixels * (1.0 - weights) + np.asarray(color, dtype=np.float32) * weights).astype(np.uint8)
+
+def _draw_text(canvas, layout, r, c, text, atlas, color, alpha=1.0):
+    mask = atlas.label(text)
+    cy, cx = layout.cell_center(r, c)
+    _blend_mask(canvas, mask, int(round(cy - mask.shape[0] / 2)), int(round(cx - mask.shape[1] / 2)), color, alpha)
+
+def _disk_mask(cy, cx, radius):
+    y0, x0 = int(cy - radius) - 1, int(cx - radius) - 1
+    span = int(2 * radius) + 3
+    ys = np.arange(y0, y0 + span)[:, None] + 0.5
+    xs = np.arange(x0, x0 + span)[None, :] + 0.5
+    # One pixel of linear falloff at the edge for an anti-aliased rim
+    mask = np.clip(radius - np.sqrt((ys - cy) ** 2 + (xs - cx) ** 2) + 0.5, 0.0, 1.0).astype(np.float32)
+    return mask, y0, x0
+
+def _segment_mask(start, end, width):
+    """Thick line with round caps between two (y, x) pixel points."""
+    (ya, xa), (yb, xb) = start, end
+    half = width / 2
+    y0, x0 = int(min(ya, yb) - half) - 1, int(min(xa, xb) - half) - 1
+    y1, x1 = int(max(ya, yb) + half) + 2, int(max(xa, xb) + half) + 2
+    ys = np.arange(y0, y1)[:, None] + 0.5
+    xs = np.arange(x0, x1)[None, :] + 0.5
+    dy, dx = yb - ya, xb - xa
+    t = np.clip(((ys - ya) * dy + (xs - xa) * dx) / (dy * dy + dx * dx), 0.0, 1.0)
+    dist = np.sqrt((ys - ya - t * dy) ** 2 + (xs - xa - t * dx) ** 2)
+    mask = np.clip(half - dist + 0.5, 0.0, 1.0).astype(np.float32)
+    return mask, y0, x0
+
+def diagonal_blockers(obstacles, size):
+    """
+    Pairs of diagonally adjacent obstacles whose 2x2 square is otherwise open, as
+    ((r1, c1), (r2, c2)) cell pairs. Checks only the neighbours of each obstacle instead of every square.
+    """
+    pairs = []
+    for r, c in obstacles:
+        for dc in (-1, 1):
+            other = (r + 1, c + dc)
+            if other in obstacles and (r + 1, c) not in obstacles and (r, c + dc) not in obstacles:
+                if 0 <= r and r + 1 < size and 0 <= min(c, c + dc) and max(c, c + dc) < size:
+                    pairs.append(((r, c), other))
+    return sorted(pairs)
+
+class StaticLayer:
+    """
+    The part of a frame that is fixed for a scenario: obstacles and their labels, grid lines,
+    coloured borders, diagonal blockers and (for the labeled style) the empty-cell numbers.
+
+    Lines, borders and diagonals sit above the cell colours, so they are kept as a separate overlay
+    (premultiplied colour `paint` plus the fraction `keep` of the cell colour that shows through).
+    Repainting a cell for an agent or goal composites the overlay back on top, which gives the same
+    pixels as drawing the whole frame from scratch.
+    """
+
+    def __init__(self, size, obstacles, numbered=False, cell_px=None):
+        self.layout = layout = RasterLayout(size, cell_px)
+        width = layout.width
+        self.paint = np.zeros((width, width, 3), dtype=np.float32)
+        self.keep = np.ones((width, width, 1), dtype=np.float32)
+
+        # Grid lines span the whole width like axhline / axvline, margin included
+        offsets = np.clip(layout.margin + np.arange(size + 1) * layout.cell, 0, width - GRID_LINE_PX)
+        for offset in offsets:
+            self._overlay_rect(slice(offset, offset + GRID_LINE_PX), slice(None), GRAY)
+            self._overlay_rect(slice(None), slice(offset, offset + GRID_LINE_PX), GRAY)
+
+        # Same drawing order as core.plot: the horizontal bands end up on top at the corners
+        band = min(BORDER_PX, layout.margin) or 1
+        self._overlay_rect(slice(None), slice(width - band, None), BORDER_COLORS["right"])
+        self._overlay_rect(slice(None), slice(None, band), BORDER_COLORS["left"])
+        self._overlay_rect(slice(None, band), slice(None), BORDER_COLORS["top"])
+        self._overlay_rect(slice(width - band, None), slice(None), BORDER_COLORS["bottom"])
+
+        diagonal_width = max(2, int(layout.cell * 0.27))
+        for a, b in diagonal_blockers(obstacles, size):
+            self._overlay_mask(*_segment_mask(layout.cell_center(*a), layout.cell_center(*b), diagonal_width), BLACK)
+
+        cells = np.full((width, width, 3), 255, dtype=np.uint8)
+        _fill_cells(cells, layout, obstacles, BLACK)
+        self.base = self._composite(cells)
+
+        atlas = get_atlas(layout.label_px, bold=True)
+        for r, c in obstacles:
+            if 0 <= r < size and 0 <= c < size:
+                _draw_text(self.base, layout, r, c, "O", atlas, WHITE)
+
+        if numbered:
+            small = get_atlas(layout.small_px, bold=False)
+            num_digits = len(str(size * size))
+            for r in range(size):
+                for c in range(size):
+                    if (r, c) not in obstacles:
+                        _draw_text(self.base, layout, r, c, str(r * size + c + 1).zfill(num_digits), small, GRAY, alpha=0.6)
+
+    def _overlay_rect(self, rows, cols, color):
+        self.paint[rows, cols] = color
+        self.keep[rows, cols] = 0.0
+
+    def _overlay_mask(self, mask, y0, x0, color):
+        clipped = _clip(mask, y0, x0, self.paint.shape)
+        if clipped is None:
+            return
+        alpha, region = clipped
+        self.paint[region] = self.paint[region] * (1.0 - alpha) + np.asarray(color, dtype=np.float32) * alpha
+        self.keep[region] *= 1.0 - alpha
+
+    def _composite(self, cells, region=(slice(None), slice(None))):
+        return (cells * self.keep[region] + self.paint[region]).astype(np.uint8)
+
+    def paint_cell(self, canvas, r, c, color):
+        """Fill cell (r, c) of `canvas` with `color`, under the static lines and blockers."""
+        y0, y1, x0, x1 = self.layout.cell_box(r, c)
+        region = (slice(y0, y1), slice(x0, x1))
+        canvas[region] = self._composite(np.asarray(color, dtype=np.float32), region)
+
+_static_layers = OrderedDict()
+MAX_STATIC_LAYERS = 64
+
+def static_layer(size, obstacles, numbered=False, cell_px=None):
+    """StaticLayer for a scenario, built once per (size, obstacle set) and kept in a small LRU."""
+    key = (size, frozenset(obstacles), numbered, cell_px)
+    layer = _static_layers.get(key)
+    if layer is None:
+        layer = StaticLayer(size, key[1], numbered, cell_px)
+        _static_layers[key] = layer
+        if len(_static_layers) > MAX_STATIC_LAYERS:
+            _static_layers.popitem(last=False)
+    else:
+        _static_layers.move_to_end(key)
+    return layer
+
+def clear_static_layers():
+    _static_layers.clear()
+
+def occupant_labels(env: GridWorld, agent_label, goal_label):
+    """Cell -> label for agents and goals, with the same precedence as core.plot (obstacles are static)."""
+    labels = {}
+    for j, pos in enumerate(env.goals):
+        if pos is not None and pos not in labels:
+            labels[pos] = goal_label(j)
+    for i in reversed(range(len(env.agents))):
+        if env.agents[i] is not None:
+            labels[env.agents[i]] = agent_label(i)
+    for pos in env.obstacles:
+        labels.pop(pos, None)
+    return labels
+
+def render_grid(env: GridWorld, style="labeled", cell_px=None):
+    """
+    Rasterize the grid into an (H, W, 3) uint8 array.
+
+    Only agents and goals are drawn per call; the rest comes from the cached StaticLayer.
+
+    Args:
+        env: GridWorld to draw
+        style: "plain" (plot_grid: A1 / G1 labels), "unassigned" (1 / A labels) or
+            "labeled" (plot_grid_unassigned_labeled: agents as circles, numbered empty cells)
+        cell_px: pixels per cell, default fits the image to about TARGET_PX
+
+    Returns:
+        np.ndarray: RGB image
+    """
+    numbered = style == "labeled"
+    layer = static_layer(env.size, env.obstacle_key, numbered, cell_px)
+    layout = layer.layout
+    canvas = layer.base.copy()
+    in_grid = lambda pos: pos is not None and pos not in env.obstacles and 0 <= pos[0] < env.size and 0 <= pos[1] < env.size
+    agents = [a for a in env.agents if in_grid(a)]
+    goals = [g for g in env.goals if in_grid(g)]
+
+    if not numbered:
+        for r, c in agents:
+            layer.paint_cell(canvas, r, c, AGENT_COLOR)
+    for r, c in goals:
+        layer.paint_cell(canvas, r, c, GOAL_COLOR)
+
+    if style == "plain":
+        labels = occupant_labels(env, lambda i: f"A{i + 1}", lambda j: f"G{j + 1}")
+    else:
+        labels = occupant_labels(env, lambda i: f"{i + 1}", lambda j: chr(65 + j))
+
+    if numbered:
+        goal_cells = set(goals)
+        for r, c in agents:
+            if (r, c) not in goal_cells:
+                layer.paint_cell(canvas, r, c, WHITE)  # clears the cell number
+        for r, c in agents:
+            _blend_mask(canvas, *_disk_mask(*layout.cell_center(r, c), 0.45 * layout.cell), AGENT_COLOR)
+
+    atlas = get_atlas(layout.label_px, bold=True)
+    for (r, c), label in labels.items():
+        if 0 <= r < env.size and 0 <= c < env.size:
+            _draw_text(canvas, layout, r, c, label, atlas, WHITE)
+    return canvas
+
+def encode_png(array):
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+def _output_array(array, image_path, as_base64=False):
+    """Same contract as core.plot._output_figure: write and return the path, or return PNG bytes / base64."""
+    png = encode_png(array)
+    if image_path is not None:
+        with open(image_path, "wb") as f:
+            f.write(png)
+        return image_path
+    return base64.b64encode(png).decode("utf-8") if as_base64 else png
+
+def raster_grid(env: GridWorld, image_path="data/grid.png", as_base64=False):
+    return _output_array(render_grid(env, style="plain"), image_path, as_base64)
+
+def raster_grid_unassigned(env: GridWorld, image_path="data/grid.png", as_base64=False):
+    return _output_array(render_grid(env, style="unassigned"), image_path, as_base64)
+
+def raster_grid_unassigned_labeled(env: GridWorld, image_path="data/grid_labeled.png", as_base64=False):
+    return _output_array(render_grid(env, style="labeled"), image_path, as_base64)
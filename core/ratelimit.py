@@ -0,0 +1,275 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import threading
+import time
+import httpx
+import ollama
+import openai
+from core.telemetry import get_telemetry
+
+# Rough cost of one grid image in the prompt (OpenAI bills a ~600 px PNG as 4 tiles + base)
+IMAGE_TOKENS = 765
+# Completion tokens reserved for requests that do not set max_tokens / max_output_tokens
+DEFAULT_COMPLETION_TOKENS = 300
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`, holding at most `capacity`.
+
+    reserve() takes the tokens right away (the level may go negative) and returns how long the caller
+    has to wait before using them, so callers never hold the lock while sleeping and sync and async
+    callers can share one bucket.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount=1.0):
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single request larger than the bucket would otherwise never fit
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose level lives in shared memory, so every process it is handed to when it starts
+    (e.g. through a process pool initializer) draws from the same budget.
+
+    Args:
+        context: multiprocessing context of the processes that will share the bucket
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, context=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        # [level, updated]; time.monotonic() is a system-wide clock, so timestamps compare across processes
+        self.state = (context or multiprocessing).Array("d", [self.capacity, time.monotonic()])
+
+    def reserve(self, amount=1.0):
+        with self.state.get_lock():
+            now = time.monotonic()
+            level = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+            level -= min(amount, self.capacity)
+            self.state[0], self.state[1] = level, now
+            return 0.0 if level >= 0 else -level / self.rate
+
+def estimate_tokens(params):
+    """Rough prompt + completion token count of a request payload: text at ~4 characters per token, images at IMAGE_TOKENS."""
+    total = 0
+
+    def walk(value):
+        nonlocal total
+        if isinstance(value, str):
+            total += IMAGE_TOKENS if value.startswith("data:image") else len(value) // 4
+        elif isinstance(value, (bytes, bytearray)):
+            total += IMAGE_TOKENS
+        elif isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                walk(item)
+
+    walk(params.get("messages", params.get("input")))
+    return total + (params.get("max_tokens") or params.get("max_output_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+def is_retryable(error):
+    """Rate limits, timeouts, dropped connections and 5xx responses are worth retrying; other errors are not."""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+def _retry_after(error):
+    """Server-suggested delay in seconds from a Retry-After / retry-after-ms header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+class RateLimiter:
+    """
+    Client-side limit on requests/min and tokens/min, with exponential backoff and full jitter on
+    rate-limit and transient errors. One limiter is shared by all threads and event loops of a
+    process (see get_rate_limiter), so concurrent agents draw from the same quota; worker processes
+    share the buckets of their parent through shared_rate_limits / install_rate_limits.
+
+    `agent_buckets` maps an agent name to its own (requests bucket, tokens bucket); requests sent while
+    that agent is selected with set_rate_agent also have to fit its budget.
+
+    Args:
+        requests_per_minute: request budget; None for no limit
+        tokens_per_minute: token budget (estimate_tokens per request); None for no limit
+        max_retries: retries after the first attempt before the error is raised
+        base_delay: first backoff in seconds, doubled on every retry
+        max_delay: upper bound for a single backoff
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.agent_buckets = {}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._jitter = random.Random()  # separate from the global RNG that seeded agent runs rely on
+
+    def delay(self, tokens=0):
+        """Reserve one request and `tokens` tokens; returns the seconds to wait before sending."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        agent_requests, agent_tokens = self.agent_buckets.get(_rate_agent, (None, None))
+        if agent_requests is not None:
+            wait = max(wait, agent_requests.reserve(1))
+        if agent_tokens is not None and tokens:
+            wait = max(wait, agent_tokens.reserve(tokens))
+        with self._lock:
+            return max(wait, self._paused_until - time.monotonic())
+
+    def backoff(self, attempt, error):
+        """Delay before retry number `attempt` (0-based); a 429 also pauses every other caller for as long."""
+        with self._lock:
+            delay = self._jitter.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        suggested = _retry_after(error)
+        if suggested is not None:
+            delay = max(delay, min(suggested, self.max_delay))
+        if isinstance(error, openai.RateLimitError) or getattr(error, "status_code", None) == 429:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def call(self, send, tokens=0):
+        """Run `send()` within the limits, retrying transient failures."""
+        telemetry = get_telemetry()
+        for attempt in range(self.max_retries + 1):
+            wait = self.delay(tokens)
+            if wait > 0:
+                telemetry.add_time("llm_queue", wait)
+                time.sleep(wait)
+            try:
+                return send()
+            except Exception as error:
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                delay = self.backoff(attempt, error)
+                print(f"Request failed ({type(error).__name__}), retrying in {delay:.1f}s")
+                telemetry.count("llm_retries")
+                telemetry.add_time("llm_queue", delay)
+                time.sleep(delay)
+
+    async def call_async(self, send, tokens=0):
+        """Async version of call(); `send` returns a coroutine."""
+        telemetry = get_telemetry()
+        for attempt in range(self.max_retries + 1):
+            wait = self.delay(tokens)
+            if wait > 0:
+                telemetry.add_time("llm_queue", wait)
+                await asyncio.sleep(wait)
+            try:
+                return await send()
+            except Exception as error:
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                delay = self.backoff(attempt, error)
+                print(f"Request failed ({type(error).__name__}), retrying in {delay:.1f}s")
+                telemetry.count("llm_retries")
+                telemetry.add_time("llm_queue", delay)
+                await asyncio.sleep(delay)
+
+def _env_number(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_rate_agent = None
+
+PROVIDERS = ("openai", "ollama")
+
+def shared_rate_limits(context=None, agent_limits=None):
+    """
+    Create, in the parent process, shared-memory buckets for the OPENAI_RPM / OPENAI_TPM and
+    OLLAMA_RPM / OLLAMA_TPM caps and for per-agent budgets. Hand the result to every worker (e.g. in
+    the pool initializer arguments) and call install_rate_limits there, so all workers together stay
+    within the caps instead of each enforcing them on its own.
+
+    Args:
+        agent_limits: dict agent name -> (requests per minute, tokens per minute), None for no cap;
+            an agent's budget covers its requests to every provider
+
+    Returns:
+        dict with "providers": provider -> (requests bucket, tokens bucket) and "agents": agent name
+        -> (requests bucket, tokens bucket), None for unset caps.
+    """
+    def bucket(rate):
+        return SharedTokenBucket(rate, context=context) if rate else None
+
+    return {
+        "providers": {
+            provider: (bucket(_env_number(f"{provider.upper()}_RPM")), bucket(_env_number(f"{provider.upper()}_TPM")))
+            for provider in PROVIDERS
+        },
+        "agents": {
+            agent: (bucket(requests_per_minute), bucket(tokens_per_minute))
+            for agent, (requests_per_minute, tokens_per_minute) in (agent_limits or {}).items()
+        },
+    }
+
+def install_rate_limits(limits):
+    """In a worker process: use the shared buckets from shared_rate_limits() for every provider."""
+    for provider, (requests, tokens) in limits["providers"].items():
+        limiter = RateLimiter()
+        limiter.requests, limiter.tokens = requests, tokens
+        limiter.agent_buckets = limits["agents"]
+        set_rate_limiter(provider, limiter)
+
+def set_rate_agent(agent):
+    """Charge the requests this process sends from now on also to `agent`'s budget (None: no agent budget)."""
+    global _rate_agent
+    _rate_agent = agent
+
+def get_rate_limiter(provider):
+    """
+    Return the process-wide limiter for "openai" or "ollama", created on first use from
+    OPENAI_RPM / OPENAI_TPM and OLLAMA_RPM / OLLAMA_TPM (unset means no client-side cap; errors are
+    still retried with backoff).
+    """
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                prefix = provider.upper()
+                limiter = RateLimiter(_env_number(f"{prefix}_RPM"), _env_number(f"{prefix}_TPM"))
+                _limiters[provider] = limiter
+    return limiter
+
+def set_rate_limiter(provider, limiter):
+    """Install `limiter` for `provider`; None resets it to the environment defaults."""
+    with _limiters_lock:
+        if limiter is None:
+            _limiters.pop(provider, None)
+        else:
+            _limiters[provider] = limiter
@@ -1,99 +1,341 @@
 import ollama
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+import asyncio
 import base64
 import os
+import threading
+import time
+import weakref
 from dotenv import load_dotenv
 from core.schema import OpenAIResponse
-
+from core.response_cache import ResponseCache, ReplayMiss
+from core.ratelimit import get_rate_limiter, estimate_tokens, IMAGE_TOKENS
+from core.prompt import PROMPT_BREAK
+from core.prompt_tokens import get_prompt_tokens
+from core.telemetry import get_telemetry, timed
+from core.usage import get_token_usage, record_openai_usage, record_token_counts
+
+# Upper bound on in-flight requests when agents issue independent calls together (see gather_requests)
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Connection pool shared by every request in the process; idle connections are kept warm between
+# agent steps so consecutive calls skip the TCP/TLS handshake
+POOL_LIMITS = httpx.Limits(
+    max_connections=2 * DEFAULT_MAX_CONCURRENCY,
+    max_keepalive_connections=DEFAULT_MAX_CONCURRENCY,
+    keepalive_expiry=120.0,
+)
+
+# The RateLimiter is the only retry loop: SDK retries would multiply with it and skip the token buckets
+SDK_MAX_RETRIES = 0
+
+_client_lock = threading.Lock()
+_openai_client = None
+_async_openai_clients = weakref.WeakKeyDictionary()  # one AsyncOpenAI per event loop
+_background_loop = None
+_response_cache = None
+_response_cache_configured = False
+_backend = None
+
+
+def _api_key():
+    # Only read when a client is created, i.e. once per process rather than once per request
+    load_dotenv(override=True)
+    return os.getenv("OPENAI_API_KEY")
+
+
+def get_openai_client():
+    """Return the process-wide OpenAI client, creating it (and its connection pool) on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _client_lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(
+                    api_key=_api_key(),
+                    http_client=DefaultHttpxClient(limits=POOL_LIMITS),
+                    max_retries=SDK_MAX_RETRIES,
+                )
+    return _openai_client
+
+
+def get_async_openai_client():
+    """
+    Return the AsyncOpenAI client for the running event loop. httpx async pools are bound to the
+    loop that created them, so there is one client per loop (gather_requests always uses the same one).
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_openai_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=_api_key(),
+            http_client=DefaultAsyncHttpxClient(limits=POOL_LIMITS),
+            max_retries=SDK_MAX_RETRIES,
+        )
+        _async_openai_clients[loop] = client
+    return client
+
+
+def set_openai_client(client=None, async_client=None):
+    """
+    Inject clients, e.g. fakes in tests. `client` replaces the shared sync client and `async_client`
+    is used on the request event loop; passing None for both resets to lazily created defaults.
+    """
+    global _openai_client
+    with _client_lock:
+        _openai_client = client
+    _async_openai_clients.clear()
+    if async_client is not None:
+        _async_openai_clients[_request_loop()] = async_client
+
+
+def _request_loop():
+    """Long-lived event loop on a daemon thread that runs gather_requests batches."""
+    global _background_loop
+    with _client_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="llm-requests", daemon=True).start()
+    return _background_loop
+
+
+@timed("encode")
+def read_image(image):
+    """`image` is a file path or PNG bytes already rendered in memory (see core.plot with image_path=None)."""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, "rb") as image_file:
+        return image_file.read()
+
+
+@timed("encode")
 def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+    return base64.b64encode(read_image(image_path)).decode("utf-8")
+
+
+def get_response_cache():
+    """
+    Return the active response cache, or None when caching is off. Unless set_response_cache() was
+    called, it is opened on first use from LLM_CACHE_PATH, with LLM_CACHE_MODE=replay for read-only replay.
+    """
+    global _response_cache, _response_cache_configured
+    if not _response_cache_configured:
+        with _client_lock:
+            if not _response_cache_configured:
+                path = os.getenv("LLM_CACHE_PATH")
+                if path:
+                    _response_cache = ResponseCache(path, read_only=os.getenv("LLM_CACHE_MODE") == "replay")
+                _response_cache_configured = True
+    return _response_cache
+
+
+def set_response_cache(cache):
+    """Install a ResponseCache for all request functions; None turns caching off."""
+    global _response_cache, _response_cache_configured
+    with _client_lock:
+        _response_cache = cache
+        _response_cache_configured = True
+
+
+def set_backend(backend):
+    """
+    Answer every request with `backend` (core.llm_backend: SyntheticBackend, TraceBackend) instead of
+    the model APIs; None restores real requests. Backend responses skip the cache and rate limiter.
+    """
+    global _backend
+    _backend = backend
+
+
+def get_backend():
+    return _backend
+
+
+def _cache_lookup(endpoint, params, image_bytes=None):
+    """Return (cache, key, hit) for a request; hit is (text, logprobs) or None."""
+    cache = get_response_cache()
+    if cache is None:
+        return None, None, None
+    key = cache.make_key(endpoint, params, image_bytes)
+    hit = cache.get(key)
+    if hit is None and cache.read_only:
+        raise ReplayMiss(f"No recorded response for {endpoint} request to {params.get('model')} (key {key[:12]})")
+    return cache, key, hit
+
+
+def _rate_limit(endpoint, params, image_bytes=None):
+    """(limiter, estimated tokens) for a request; only requests that miss the cache go through the limiter."""
+    provider = "ollama" if endpoint.startswith("ollama") else "openai"
+    tokens = estimate_tokens(params) + (IMAGE_TOKENS if image_bytes else 0)
+    return get_rate_limiter(provider), tokens
+
+
+def _cached_request(endpoint, params, send, image_bytes=None):
+    """Serve `send()` -> (text, logprobs) from the response cache when possible, storing fresh results."""
+    get_prompt_tokens().record(endpoint, params, image_bytes)
+    telemetry = get_telemetry()
+    if _backend is not None:
+        telemetry.count("llm_requests")
+        with telemetry.time("llm_network"):
+            return _backend.complete(endpoint, params, image_bytes)
+    cache, key, hit = _cache_lookup(endpoint, params, image_bytes)
+    if hit is not None:
+        telemetry.count("llm_cache_hits")
+        return hit
+    telemetry.count("llm_requests")
+    limiter, tokens = _rate_limit(endpoint, params, image_bytes)
+    text, logprobs = limiter.call(send, tokens)
+    if cache is not None:
+        cache.put(key, endpoint, params.get("model"), text, logprobs)
+    return text, logprobs
+
+
+async def _cached_request_async(endpoint, params, send, image_bytes=None):
+    get_prompt_tokens().record(endpoint, params, image_bytes)
+    telemetry = get_telemetry()
+    if _backend is not None:
+        telemetry.count("llm_requests")
+        with telemetry.time("llm_network"):
+            return await _backend.complete_async(endpoint, params, image_bytes)
+    cache, key, hit = _cache_lookup(endpoint, params, image_bytes)
+    if hit is not None:
+        telemetry.count("llm_cache_hits")
+        return hit
+    telemetry.count("llm_requests")
+    limiter, tokens = _rate_limit(endpoint, params, image_bytes)
+    text, logprobs = await limiter.call_async(send, tokens)
+    if cache is not None:
+        cache.put(key, endpoint, params.get("model"), text, logprobs)
+    return text, logprobs
+
+
+def _text_only(prompt):
+    """Prompt for requests without an inline image slot (text-only, ollama): the break becomes a newline."""
+    return prompt.replace(PROMPT_BREAK, "\n")
+
+
+def _image_content(prompt, image_part, text_type):
+    """
+    Message content with the image at the prompt's PROMPT_BREAK: [static text, image, per-call text],
+    so the static prefix and the image are cacheable across calls. Prompts without a break keep the
+    image after the text.
+    """
+    prefix, found, suffix = prompt.partition(PROMPT_BREAK)
+    if not found:
+        return [{"type": text_type, "text": prompt}, image_part]
+    return [{"type": text_type, "text": prefix}, image_part, {"type": text_type, "text": suffix}]
+
+
+def _image_message(prompt, base64_image):
+    image_part = {
+        "type": "image_url",
+        "image_url": {"url": f"data:image/png;base64,{base64_image}"},
+    }
+    return {
+        "role": "user",
+        "content": _image_content(prompt, image_part, "text")
+    }
 
-def send_image_to_model_ollama(image_path, prompt, model='llava'):
-    response = ollama.chat(
-        model=model,
-        messages=[
-            {
-                'role': 'user',
-                'content': prompt,
-                'images': [image_path]
-            }
-        ]
-    )
-    return prompt, response['message']['content'].strip()
 
-def send_image_to_model_openai_responses_api(image_path, prompt, temperature=None):
-    load_dotenv(override=True)
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-    
-    # Read and encode the image as base64
-    base64_image = encode_image(image_path)
+def _chat_completion(params):
+    print('Sending request to OpenAI API')
+    start = time.perf_counter()
+    response = get_openai_client().chat.completions.create(**params)
+    record_openai_usage(response.usage, time.perf_counter() - start)
+    print('Received response')
+    choice = response.choices[0]
+    logprobs = choice.logprobs.content if choice.logprobs is not None else None
+    return choice.message.content, logprobs
+
 
+async def _chat_completion_async(params):
     print('Sending request to OpenAI API')
-    if temperature:
-        response = client.responses.create(
-            model="gpt-4o",
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        { "type": "input_text", "text": prompt },
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/png;base64,{base64_image}",
-                        },
-                    ]
-                }
-            ],
-            temperature=temperature,
-            top_p=0.0000001,
-            max_output_tokens=100
-        )
-    else:
-        response = client.responses.create(
-            model="gpt-4o",
-            input=[
+    start = time.perf_counter()
+    response = await get_async_openai_client().chat.completions.create(**params)
+    record_openai_usage(response.usage, time.perf_counter() - start)
+    print('Received response')
+    choice = response.choices[0]
+    logprobs = choice.logprobs.content if choice.logprobs is not None else None
+    return choice.message.content, logprobs
+
+
+def _record_ollama_usage(response, seconds):
+    # Ollama reports token counts but no prompt-cache breakdown
+    get_token_usage().record(response.get('prompt_eval_count', 0), 0, response.get('eval_count', 0), seconds)
+    get_telemetry().add_time("llm_network", seconds)
+    record_token_counts(response.get('prompt_eval_count', 0), 0, response.get('eval_count', 0))
+
+
+def send_image_to_model_ollama(image_path, prompt, model='llava'):
+    prompt = _text_only(prompt)
+    params = {
+        "model": model,
+        "messages": [{'role': 'user', 'content': prompt}]
+    }
+
+    def send():
+        start = time.perf_counter()
+        response = ollama.chat(
+            model=model,
+            messages=[
                 {
-                    "role": "user",
-                    "content": [
-                        { "type": "input_text", "text": prompt },
-                        {
-                            "type": "input_image",
-                            "image_url": f"data:image/png;base64,{base64_image}",
-                        },
-                    ]
+                    'role': 'user',
+                    'content': prompt,
+                    'images': [image_bytes]
                 }
-            ],
-            max_output_tokens=100
+            ]
         )
-    print('Received response')
-    return response.output_text.strip().lower()
+        _record_ollama_usage(response, time.perf_counter() - start)
+        return response['message']['content'], None
 
-def send_image_to_model_openai(image_path, prompt, temperature=None):
-    load_dotenv(override=True)
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-    
+    image_bytes = read_image(image_path)
+    text, _ = _cached_request("ollama.chat", params, send, image_bytes=image_bytes)
+    return prompt, text.strip()
+
+
+def send_image_to_model_openai_responses_api(image_path, prompt, temperature=None):
     # Read and encode the image as base64
     base64_image = encode_image(image_path)
 
-    print('Sending request to OpenAI API')
-    
     params = {
         "model": "gpt-4o",
-        "messages": [
+        "input": [
             {
                 "role": "user",
-                "content": [
-                    { "type": "text", "text": prompt },
+                "content": _image_content(
+                    prompt,
                     {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"},
+                        "type": "input_image",
+                        "image_url": f"data:image/png;base64,{base64_image}",
                     },
-                ]
+                    "input_text"
+                )
             }
         ],
+        "max_output_tokens": 100
+    }
+    if temperature:
+        params["temperature"] = temperature
+        params["top_p"] = 0.0000001
+
+    def send():
+        print('Sending request to OpenAI API')
+        start = time.perf_counter()
+        response = get_openai_client().responses.create(**params)
+        record_openai_usage(response.usage, time.perf_counter() - start)
+        print('Received response')
+        return response.output_text, None
+
+    text, _ = _cached_request("responses", params, send)
+    return text.strip().lower()
+
+
+def send_image_to_model_openai(image_path, prompt, temperature=None):
+    # Read and encode the image as base64
+    base64_image = encode_image(image_path)
+
+    params = {
+        "model": "gpt-4o",
+        "messages": [_image_message(prompt, base64_image)],
         "max_tokens": 100
     }
     
@@ -101,34 +343,17 @@ def send_image_to_model_openai(image_path, prompt, temperature=None):
         params["temperature"] = temperature
         params["top_p"] = 0.0000001
 
-    response = client.chat.completions.create(**params)
-    print('Received response')
-    return response.choices[0].message.content.strip().lower()
+    text, _ = _cached_request("chat.completions", params, lambda: _chat_completion(params))
+    return text.strip().lower()
+
 
 def send_image_to_model_openai_logprobs(image_path, prompt, model="gpt-4o", temperature=None):
-    load_dotenv(override=True)
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-    
     # Read and encode the image as base64
     base64_image = encode_image(image_path)
 
-    print('Sending request to OpenAI API')
-
     params = {
         "model": model,
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    { "type": "text", "text": prompt },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"},
-                    },
-                ]
-            }
-        ],
+        "messages": [_image_message(prompt, base64_image)],
         "logprobs": True,
         "top_logprobs": 10,
         # "max_tokens": 300
@@ -137,37 +362,16 @@ def send_image_to_model_openai_logprobs(image_path, prompt, model="gpt-4o", temp
         params["temperature"] = temperature
         # params["top_p"] = 0.0000001
 
-    response = client.chat.completions.create(**params)
-    print('Received response')
-
-    choices = response.choices
-    logprobs = choices[0].logprobs.content
-    sentence = choices[0].message.content
-    
+    sentence, logprobs = _cached_request("chat.completions", params, lambda: _chat_completion(params))
     return sentence, logprobs
 
-def send_image_to_model_openai_logprobs_formatted(image_path, prompt, temperature=None):
-    load_dotenv(override=True)
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
 
+def send_image_to_model_openai_logprobs_formatted(image_path, prompt, temperature=None):
     # Read and encode the image as base64
     base64_image = encode_image(image_path)
-    print('Sending request to OpenAI API')
     params = {
         "model": "gpt-4o",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    { "type": "text", "text": prompt },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"},
-                    },
-                ]
-            }
-        ],
+        "messages": [_image_message(prompt, base64_image)],
         "logprobs": True,
         "top_logprobs": 3,
         "max_tokens": 100,
@@ -178,26 +382,26 @@ def send_image_to_model_openai_logprobs_formatted(image_path, prompt, temperatur
         params["temperature"] = temperature
         params["top_p"] = 0.0000001
 
-    response = client.beta.chat.completions.parse(**params)
-    print('Received response')
-    choices = response.choices
-    logprobs = choices[0].logprobs.content
-    sentence = choices[0].message.content
-    
+    def send():
+        print('Sending request to OpenAI API')
+        start = time.perf_counter()
+        response = get_openai_client().beta.chat.completions.parse(**params)
+        record_openai_usage(response.usage, time.perf_counter() - start)
+        print('Received response')
+        choices = response.choices
+        return choices[0].message.content, choices[0].logprobs.content
+
+    sentence, logprobs = _cached_request("beta.chat.completions.parse", params, send)
     return sentence, logprobs
 
-def send_text_to_model_openai(prompt, model="gpt-4o", temperature=None):
-    load_dotenv(override=True)
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
 
-    print('Sending request to OpenAI API')
+def send_text_to_model_openai(prompt, model="gpt-4o", temperature=None):
     params = {
         "model": model,
         "messages": [
             {
                 "role": "user",
-                "content": prompt
+                "content": _text_only(prompt)
             }
         ],
         "max_tokens": 400
@@ -207,9 +411,100 @@ def send_text_to_model_openai(prompt, model="gpt-4o", temperature=None):
         params["temperature"] = temperature
         # params["top_p"] = 0.0000001
 
-    response = client.chat.completions.create(**params)
-    print('Received response')
-    return response.choices[0].message.content
+    text, _ = _cached_request("chat.completions", params, lambda: _chat_completion(params))
+    return text
+
+
+async def send_image_to_model_ollama_async(image_path, prompt, model='llava'):
+    prompt = _text_only(prompt)
+    params = {
+        "model": model,
+        "messages": [{'role': 'user', 'content': prompt}]
+    }
+
+    async def send():
+        start = time.perf_counter()
+        response = await ollama.AsyncClient().chat(
+            model=model,
+            messages=[
+                {
+                    'role': 'user',
+                    'content': prompt,
+                    'images': [image_bytes]
+                }
+            ]
+        )
+        _record_ollama_usage(response, time.perf_counter() - start)
+        return response['message']['content'], None
+
+    image_bytes = read_image(image_path)
+    text, _ = await _cached_request_async("ollama.chat", params, send, image_bytes=image_bytes)
+    return prompt, text.strip()
+
+
+async def send_image_to_model_openai_logprobs_async(image_path, prompt, model="gpt-4o", temperature=None):
+    # Read and encode the image as base64
+    base64_image = encode_image(image_path)
+
+    # Same payload as send_image_to_model_openai_logprobs, so both share cache entries
+    params = {
+        "model": model,
+        "messages": [_image_message(prompt, base64_image)],
+        "logprobs": True,
+        "top_logprobs": 10,
+    }
+    if temperature is not None:
+        params["temperature"] = temperature
+
+    return await _cached_request_async("chat.completions", params, lambda: _chat_completion_async(params))
+
+
+async def send_text_to_model_openai_async(prompt, model="gpt-4o", temperature=None):
+    params = {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": _text_only(prompt)
+            }
+        ],
+        "max_tokens": 400
+    }
+    if temperature is not None:
+        params["temperature"] = temperature
+
+    text, _ = await _cached_request_async("chat.completions", params, lambda: _chat_completion_async(params))
+    return text
+
+
+def gather_requests(request_fns, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Run independent async requests concurrently, at most `max_concurrency` in flight at a time.
+
+    Args:
+        request_fns: zero-argument callables returning coroutines, e.g.
+            functools.partial(send_image_to_model_openai_logprobs_async, image_path, prompt)
+        max_concurrency: semaphore size; 1 issues the requests one after another
+
+    Returns:
+        list: results in the same order as `request_fns`.
+    """
+    async def run_all():
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def run_one(request_fn):
+            queued = time.perf_counter()
+            async with semaphore:
+                get_telemetry().add_time("llm_queue", time.perf_counter() - queued)
+                return await request_fn()
+
+        return await asyncio.gather(*(run_one(fn) for fn in request_fns))
+
+    if not request_fns:
+        return []
+    # Batches share one persistent loop, so the async client's connection pool survives between steps
+    return asyncio.run_coroutine_threadsafe(run_all(), _request_loop()).result()
+
 
 def build_test_prompt():
     # Example values for testing
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from openai.types.chat import ChatCompletionTokenLogprob
+
+class ReplayMiss(KeyError):
+    """Raised in replay (read-only) mode when a request has no recorded response."""
+
+def _json_default(value):
+    # Structured-output schemas (pydantic classes) are keyed by their JSON schema
+    if hasattr(value, "model_json_schema"):
+        return {"schema": value.model_json_schema()}
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    raise TypeError(f"Cannot hash request parameter of type {type(value).__name__}")
+
+def _logprob_to_dict(item):
+    if hasattr(item, "model_dump"):
+        return item.model_dump()
+    return {
+        "token": item.token,
+        "logprob": item.logprob,
+        "bytes": getattr(item, "bytes", None),
+        "top_logprobs": [
+            {"token": t.token, "logprob": t.logprob, "bytes": getattr(t, "bytes", None)}
+            for t in (getattr(item, "top_logprobs", None) or [])
+        ],
+    }
+
+def serialize_logprobs(logprobs):
+    if logprobs is None:
+        return None
+    return json.dumps([_logprob_to_dict(item) for item in logprobs])
+
+def deserialize_logprobs(data):
+    """Rebuild the same objects the OpenAI client returns, so agents can read .token / .logprob / .top_logprobs."""
+    if data is None:
+        return None
+    return [ChatCompletionTokenLogprob.model_validate(item) for item in json.loads(data)]
+
+class ResponseCache:
+    """
+    Content-addressed store of LLM responses in a single SQLite file.
+
+    Keys are SHA-256 hashes of the endpoint plus the full request payload (model, prompt, base64
+    image, temperature, top_logprobs, ...), so any change to what would be sent is a different entry.
+    Values are the response text and the token logprobs.
+
+    Args:
+        path: SQLite file, created if missing
+        read_only: replay mode; lookups only, and request functions raise ReplayMiss on a miss
+        max_bytes: evict least recently used entries beyond this total payload size
+        max_age: evict entries created more than this many seconds ago
+    """
+
+    def __init__(self, path, read_only=False, max_bytes=None, max_age=None):
+        self.path = path
+        self.read_only = read_only
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    model TEXT,
+                    text TEXT,
+                    logprobs TEXT,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            self.evict()
+
+    @staticmethod
+    def make_key(endpoint, params, image_bytes=None):
+        payload = json.dumps(
+            {"endpoint": endpoint, "params": params, "image": image_bytes},
+            sort_keys=True,
+            default=_json_default,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (text, logprobs) for `key`, or None if it is not cached."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, logprobs FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        return row[0], deserialize_logprobs(row[1])
+
+    def put(self, key, endpoint, model, text, logprobs=None):
+        if self.read_only:
+            raise PermissionError("Response cache is open in replay (read-only) mode.")
+        logprobs_json = serialize_logprobs(logprobs)
+        size = len(text or "") + len(logprobs_json or "")
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, model, text, logprobs_json, size, now, now),
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            due = self._puts_since_evict >= 100
+        if due:
+            self.evict()
+
+    def evict(self, max_bytes=None, max_age=None):
+        """
+        Drop entries older than `max_age` seconds, then least recently used ones until the stored
+        payload fits in `max_bytes`. Defaults to the limits given at construction. Returns the number removed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age = self.max_age if max_age is None else max_age
+        if self.read_only or (max_bytes is None and max_age is None):
+            return 0
+
+        removed = 0
+        with self._lock:
+            self._puts_since_evict = 0
+            if max_age is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - max_age,)
+                ).rowcount
+            if max_bytes is not None:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > max_bytes:
+                    rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+                    stale = []
+                    for key, size in rows:
+                        if total <= max_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                    removed += len(stale)
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,165 @@
+import heapq
+import os
+import numpy as np
+from core.telemetry import timed
+
+# How single start/goal path lengths are computed:
+#   "field"          BFS distance field of the goal, cached by GridWorld and shared by every query
+#                    towards that goal (the default; plain BFS for envs without distance fields)
+#   "bfs"            plain BFS from the start, stopping at the goal
+#   "astar"          A* with the Manhattan distance as heuristic, for one-off queries on large grids
+#   "bidirectional"  BFS from both ends, expanding the smaller frontier one layer at a time
+# All of them return the same lengths as a 4-connected BFS around obstacles.
+SEARCH_METHODS = ("field", "bfs", "astar", "bidirectional")
+_search_method = os.environ.get("GRID_SEARCH", "field")
+
+NEIGHBOR_OFFSETS = ((1, 0), (-1, 0), (0, -1), (0, 1))
+
+def set_search_method(method):
+    """Select the default method of shortest_path_length and GridWorld.distance, one of SEARCH_METHODS."""
+    global _search_method
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown search method '{method}', expected one of {SEARCH_METHODS}")
+    _search_method = method
+
+def get_search_method():
+    return _search_method
+
+def resolve_search_method(method=None):
+    """`method`, or the selected default when it is None."""
+    method = method or _search_method
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown search method '{method}', expected one of {SEARCH_METHODS}")
+    return method
+
+def free_grid(size, obstacles):
+    """(size, size) bool array, True where there is no obstacle (as GridWorld.free_cells())."""
+    free = np.ones((size, size), dtype=bool)
+    for r, c in obstacles:
+        if 0 <= r < size and 0 <= c < size:
+            free[r, c] = False
+    return free
+
+def _prepare(start, goal, free):
+    """
+    Flat view of `free` plus the search seeds: the start itself when it is a free cell, otherwise
+    (like a BFS that begins on an obstacle or outside the grid) its free neighbours at distance 1.
+
+    Returns:
+        tuple: (cells, rows, cols, seeds, goal_index); goal_index is None when the goal is not a free cell.
+    """
+    rows, cols = free.shape
+    cells = np.ascontiguousarray(free, dtype=bool).tobytes()
+    gr, gc = goal
+    goal_index = gr * cols + gc if 0 <= gr < rows and 0 <= gc < cols and cells[gr * cols + gc] else None
+    sr, sc = start
+    if 0 <= sr < rows and 0 <= sc < cols and cells[sr * cols + sc]:
+        return cells, rows, cols, {sr * cols + sc: 0}, goal_index
+    seeds = {}
+    for dr, dc in NEIGHBOR_OFFSETS:
+        nr, nc = sr + dr, sc + dc
+        if 0 <= nr < rows and 0 <= nc < cols and cells[nr * cols + nc]:
+            seeds[nr * cols + nc] = 1
+    return cells, rows, cols, seeds, goal_index
+
+def _neighbors(index, cells, rows, cols):
+    r, c = divmod(index, cols)
+    for dr, dc in NEIGHBOR_OFFSETS:
+        nr, nc = r + dr, c + dc
+        if 0 <= nr < rows and 0 <= nc < cols:
+            neighbor = nr * cols + nc
+            if cells[neighbor]:
+                yield neighbor
+
+@timed("bfs")
+def astar_path_length(start, goal, free):
+    """
+    A* from `start` to `goal` over the free cells with the (consistent) Manhattan heuristic; ties on
+    f = g + h are broken towards the goal, so on open grids only about the cells of one path are expanded.
+
+    Args:
+        free: (rows, cols) bool array of obstacle-free cells (GridWorld.free_cells())
+
+    Returns:
+        int: number of steps, float('inf') if there is no path.
+    """
+    start, goal = tuple(start), tuple(goal)
+    if start == goal:
+        return 0
+    cells, rows, cols, seeds, goal_index = _prepare(start, goal, free)
+    if goal_index is None:
+        return float('inf')
+    gr, gc = goal
+
+    def heuristic(index):
+        r, c = divmod(index, cols)
+        return abs(r - gr) + abs(c - gc)
+
+    best = dict(seeds)
+    heap = [(g + heuristic(index), heuristic(index), index) for index, g in seeds.items()]
+    heapq.heapify(heap)
+    while heap:
+        f, h, index = heapq.heappop(heap)
+        g = f - h
+        if g > best[index]:
+            continue  # stale entry
+        if index == goal_index:
+            return g
+        for neighbor in _neighbors(index, cells, rows, cols):
+            if g + 1 < best.get(neighbor, float('inf')):
+                best[neighbor] = g + 1
+                h = heuristic(neighbor)
+                heapq.heappush(heap, (g + 1 + h, h, neighbor))
+    return float('inf')
+
+@timed("bfs")
+def bidirectional_path_length(start, goal, free):
+    """
+    Breadth-first search from `start` and from `goal` at once, always expanding the smaller of the
+    two frontiers by one full layer, until they meet.
+
+    Args:
+        free: (rows, cols) bool array of obstacle-free cells (GridWorld.free_cells())
+
+    Returns:
+        int: number of steps, float('inf') if there is no path.
+    """
+    start, goal = tuple(start), tuple(goal)
+    if start == goal:
+        return 0
+    cells, rows, cols, seeds, goal_index = _prepare(start, goal, free)
+    if goal_index is None or not seeds:
+        return float('inf')
+    if goal_index in seeds:
+        return seeds[goal_index]
+
+    forward, backward = dict(seeds), {goal_index: 0}
+    forward_layer, backward_layer = list(forward), [goal_index]
+    while forward_layer and backward_layer:
+        if len(forward_layer) <= len(backward_layer):
+            layer, seen, other = forward_layer, forward, backward
+        else:
+            layer, seen, other = backward_layer, backward, forward
+        best = float('inf')
+        next_layer = []
+        for index in layer:
+            dist = seen[index] + 1
+            for neighbor in _neighbors(index, cells, rows, cols):
+                if neighbor in seen:
+                    continue
+                seen[neighbor] = dist
+                next_layer.append(neighbor)
+                if neighbor in other:
+                    best = min(best, dist + other[neighbor])
+        if best != float('inf'):
+            return best
+        if layer is forward_layer:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+    return float('inf')
+
+SEARCHES = {
+    "astar": astar_path_length,
+    "bidirectional": bidirectional_path_length,
+}
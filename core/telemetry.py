@@ -0,0 +1,72 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Where an episode's time goes. Phases of the agent loops (rank, assign, directions, resolve, log)
+# contain the lower-level timers (render, encode, bfs, checkpoint, llm_queue, llm_network), so the
+# columns overlap rather than add up to the episode time.
+TIMERS = (
+    "render", "encode", "rank", "assign", "directions", "resolve", "bfs", "log", "checkpoint",
+    "llm_queue", "llm_network",
+)
+COUNTERS = ("llm_requests", "llm_cache_hits", "llm_retries", "tokens_in", "tokens_out", "tokens_cached")
+# Columns of a per-episode summary row (see Telemetry.row)
+FIELDS = ("episode_s", *(f"{name}_s" for name in TIMERS), "bfs_n", "render_n", *COUNTERS)
+
+class Telemetry:
+    """
+    Thread-safe timers (total seconds and number of calls per name) and counters. Requests sent
+    from the background event loop of core.request record into the same instance as the agent loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds = {}
+            self.calls = {}
+            self.counters = {}
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def row(self, episode_seconds=None):
+        """Summary row with one value per FIELDS column (seconds rounded to 0.1 ms)."""
+        with self._lock:
+            row = {"episode_s": round(episode_seconds, 4) if episode_seconds is not None else ""}
+            row.update({f"{name}_s": round(self.seconds.get(name, 0.0), 4) for name in TIMERS})
+            row["bfs_n"] = self.calls.get("bfs", 0)
+            row["render_n"] = self.calls.get("render", 0)
+            row.update({name: self.counters.get(name, 0) for name in COUNTERS})
+        return row
+
+_telemetry = Telemetry()
+
+def get_telemetry():
+    """Process-wide Telemetry; the evaluation scripts reset it before every episode."""
+    return _telemetry
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block (or decorated function) to timer `name` of the process-wide Telemetry."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _telemetry.add_time(name, time.perf_counter() - start)
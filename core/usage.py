@@ -0,0 +1,96 @@
+import threading
+from core.telemetry import get_telemetry
+
+class TokenUsage:
+    """
+    Thread-safe running totals of the token usage reported by the model APIs: prompt tokens, the part
+    of them served from the provider's prompt cache, completion tokens, and request latency split by
+    whether the request hit the prompt cache (any cached tokens) or not.
+    """
+
+    FIELDS = ("requests", "prompt_tokens", "cached_tokens", "completion_tokens",
+              "hit_requests", "hit_seconds", "miss_requests", "miss_seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            for field in self.FIELDS:
+                setattr(self, field, 0)
+
+    def record(self, prompt_tokens, cached_tokens, completion_tokens, seconds):
+        """Add one API response (token counts from its usage block, `seconds` from send to response)."""
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.cached_tokens += cached_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            if cached_tokens:
+                self.hit_requests += 1
+                self.hit_seconds += seconds
+            else:
+                self.miss_requests += 1
+                self.miss_seconds += seconds
+
+    def merge(self, other):
+        """Add the totals of another TokenUsage or of an as_dict() result (e.g. from a worker process)."""
+        values = other if isinstance(other, dict) else other.as_dict()
+        with self._lock:
+            for field in self.FIELDS:
+                setattr(self, field, getattr(self, field) + values.get(field, 0))
+
+    def as_dict(self):
+        with self._lock:
+            return {field: getattr(self, field) for field in self.FIELDS}
+
+    @property
+    def cached_fraction(self):
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else None
+
+    def summary(self):
+        """One-line report; None when no API response was recorded (cache hits and offline backends report nothing)."""
+        if not self.requests:
+            return None
+        line = (f"API usage: {self.requests} requests, {self.prompt_tokens} prompt tokens "
+                f"({100 * self.cached_fraction:.1f}% cached), {self.completion_tokens} completion tokens")
+        if self.hit_requests:
+            line += f"; mean latency {self.hit_seconds / self.hit_requests:.2f}s with cached prefix"
+        if self.miss_requests:
+            line += f", {self.miss_seconds / self.miss_requests:.2f}s without"
+        return line
+
+_usage = TokenUsage()
+
+def get_token_usage():
+    """Process-wide TokenUsage that every request in core.request records into."""
+    return _usage
+
+def record_openai_usage(usage, seconds):
+    """
+    Record an OpenAI usage block: chat completions report prompt_tokens / prompt_tokens_details, the
+    responses API input_tokens / input_tokens_details. Missing blocks are ignored. The response time
+    and token counts also go to the episode telemetry.
+    """
+    get_telemetry().add_time("llm_network", seconds)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if prompt_tokens is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        completion_tokens = getattr(usage, "completion_tokens", 0)
+    else:
+        prompt_tokens = getattr(usage, "input_tokens", 0)
+        details = getattr(usage, "input_tokens_details", None)
+        completion_tokens = getattr(usage, "output_tokens", 0)
+    cached_tokens = getattr(details, "cached_tokens", 0) if details is not None else 0
+    _usage.record(prompt_tokens, cached_tokens, completion_tokens, seconds)
+    record_token_counts(prompt_tokens, cached_tokens, completion_tokens)
+
+def record_token_counts(prompt_tokens, cached_tokens, completion_tokens):
+    """Add one response's token counts to the episode telemetry."""
+    telemetry = get_telemetry()
+    telemetry.count("tokens_in", prompt_tokens or 0)
+    telemetry.count("tokens_cached", cached_tokens or 0)
+    telemetry.count("tokens_out", completion_tokens or 0)
@@ -1,6 +1,39 @@
+import numpy as np
 from collections import deque
+from core.search import SEARCHES, free_grid, resolve_search_method
+from core.telemetry import timed
 
-def shortest_path_length(start, goal, env):
+UNREACHABLE = -1
+NO_PARENT = -1
+OFF_GRID_PARENT = -2  # bfs_parents: reached in one step from a start outside the grid
+NO_COMPONENT = -1
+# Move order of select_direction_opt; shortest_path breaks ties the same way
+DIRECTION_OFFSETS = {
+    "up": (1, 0),
+    "down": (-1, 0),
+    "left": (0, -1),
+    "right": (0, 1)
+}
+
+def shortest_path_length(start, goal, env, method=None):
+    """
+    Shortest 4-connected path length from `start` to `goal` around obstacles, float('inf') if there
+    is no path.
+
+    Args:
+        method: one of core.search.SEARCH_METHODS, default the one selected with set_search_method
+    """
+    method = resolve_search_method(method)
+    # GridWorld keeps cached per-goal distance fields; fall back to a plain search otherwise
+    distance = getattr(env, "distance", None)
+    if distance is not None:
+        return distance(start, goal, method)
+    if method in SEARCHES:
+        return SEARCHES[method](start, goal, free_grid(env.size, env.obstacles))
+    return bfs_path_length(start, goal, env)
+
+@timed("bfs")
+def bfs_path_length(start, goal, env):
     if start == goal:
         return 0
     visited = set()
@@ -21,6 +54,85 @@ def shortest_path_length(start, goal, env):
                 queue.append((next_pos, dist + 1))
     return float('inf')  # No path found
 
+@timed("bfs")
+def compute_distance_field(goal, size, obstacles):
+    """
+    Run a single BFS outward from `goal` over the free cells of the grid.
+
+    Returns:
+        np.ndarray: (size, size) int32 array where field[r, c] is the number of steps
+        from (r, c) to `goal`, or UNREACHABLE (-1) if there is no path.
+    """
+    field = np.full((size, size), UNREACHABLE, dtype=np.int32)
+    gr, gc = goal
+    if not (0 <= gr < size and 0 <= gc < size) or goal in obstacles:
+        return field
+
+    field[gr, gc] = 0
+    queue = deque([goal])
+    while queue:
+        r, c = queue.popleft()
+        dist = field[r, c] + 1
+        for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            nr, nc = r + dr, c + dc
+            if (
+                0 <= nr < size and 0 <= nc < size and
+                field[nr, nc] == UNREACHABLE and
+                (nr, nc) not in obstacles
+            ):
+                field[nr, nc] = dist
+                queue.append((nr, nc))
+    return field
+
+@timed("bfs")
+def compute_distance_fields(goals, size, obstacles, free=None):
+    """
+    Batched version of compute_distance_field: expands the BFS frontiers of all `goals` together,
+    one layer per iteration, over flat (goal, cell) indices so each cell is touched once per goal.
+
+    Args:
+        free: optional (size, size) bool array of obstacle-free cells (GridWorld.free_cells()),
+            used instead of building one from `obstacles`
+
+    Returns:
+        np.ndarray: (len(goals), size, size) int32 array, UNREACHABLE (-1) where there is no path.
+    """
+    cells = size * size
+    fields = np.full(len(goals) * cells, UNREACHABLE, dtype=np.int32)
+    if free is None:
+        free = np.ones((size, size), dtype=bool)
+        for r, c in obstacles:
+            if 0 <= r < size and 0 <= c < size:
+                free[r, c] = False
+    free = free.ravel()
+
+    frontier = np.array([
+        i * cells + gr * size + gc
+        for i, (gr, gc) in enumerate(goals)
+        if 0 <= gr < size and 0 <= gc < size and free[gr * size + gc]
+    ], dtype=np.int64)
+    fields[frontier] = 0
+
+    dist = 0
+    while frontier.size:
+        dist += 1
+        cell = frontier % cells
+        row, col = cell // size, cell % size
+        candidates = np.concatenate([
+            frontier[row < size - 1] + size,
+            frontier[row > 0] - size,
+            frontier[col < size - 1] + 1,
+            frontier[col > 0] - 1,
+        ])
+        candidates = candidates[free[candidates % cells]]
+        candidates = np.sort(candidates[fields[candidates] == UNREACHABLE])
+        if candidates.size:
+            candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+        fields[candidates] = dist
+        frontier = candidates
+    return fields.reshape(len(goals), size, size)
+
+@timed("bfs")
 def is_reachable(grid_size, start, goal, obstacles):
     if start == goal:
         return True
@@ -41,6 +153,171 @@ def is_reachable(grid_size, start, goal, obstacles):
                     queue.append(neighbor)
     return False
 
+@timed("bfs")
+def label_components(free):
+    """
+    Label the 4-connected components of the free cells, one flood fill per component.
+
+    Args:
+        free: (size, size) bool array of obstacle-free cells (GridWorld.free_cells())
+
+    Returns:
+        tuple: (labels, sizes) where labels is a (size, size) int32 array of component ids
+        (0, 1, ... in row-major order of their first cell, NO_COMPONENT (-1) on obstacles) and
+        sizes[i] is the number of cells of component i.
+    """
+    rows, size = free.shape
+    open_cells = free.ravel().tolist()
+    labels = [NO_COMPONENT] * (rows * size)
+    sizes = []
+    offsets = tuple(DIRECTION_OFFSETS.values())
+    for seed in np.flatnonzero(open_cells).tolist():
+        if labels[seed] != NO_COMPONENT:
+            continue
+        label = len(sizes)
+        labels[seed] = label
+        stack = [seed]
+        count = 0
+        while stack:
+            index = stack.pop()
+            count += 1
+            r, c = divmod(index, size)
+            for dr, dc in offsets:
+                nr, nc = r + dr, c + dc
+                if 0 <= nr < rows and 0 <= nc < size:
+                    neighbor = nr * size + nc
+                    if open_cells[neighbor] and labels[neighbor] == NO_COMPONENT:
+                        labels[neighbor] = label
+                        stack.append(neighbor)
+        sizes.append(count)
+    return np.array(labels, dtype=np.int32).reshape(rows, size), sizes
+
+@timed("bfs")
+def bfs_parents(start, size, obstacles, goal=None):
+    """
+    BFS outward from `start` over the free cells, recording the cell each one was reached from.
+
+    Args:
+        goal: optional cell to stop at once it is reached
+
+    Returns:
+        list: parents[r * size + c] is the flat index (row * size + col) of the predecessor of
+        (r, c) on a shortest path from `start`, NO_PARENT for `start` and for unreached cells.
+        A start outside the grid steps into its free neighbours first (as bfs_path_length and
+        GridWorld.distance do), which get OFF_GRID_PARENT.
+    """
+    cells = size * size
+    parents = [NO_PARENT] * cells
+    seen = bytearray(cells)
+    for r, c in obstacles:
+        if 0 <= r < size and 0 <= c < size:
+            seen[r * size + c] = 1
+    goal_index = goal[0] * size + goal[1] if goal is not None else None
+    offsets = tuple(DIRECTION_OFFSETS.values())
+    sr, sc = start
+    if 0 <= sr < size and 0 <= sc < size:
+        start_index = sr * size + sc
+        seen[start_index] = 1
+        queue = deque([start_index])
+    else:
+        queue = deque()
+        for dr, dc in offsets:
+            nr, nc = sr + dr, sc + dc
+            if 0 <= nr < size and 0 <= nc < size and not seen[nr * size + nc]:
+                seen[nr * size + nc] = 1
+                parents[nr * size + nc] = OFF_GRID_PARENT
+                queue.append(nr * size + nc)
+    while queue:
+        index = queue.popleft()
+        if index == goal_index:
+            break
+        r, c = divmod(index, size)
+        for dr, dc in offsets:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < size and 0 <= nc < size:
+                neighbor = nr * size + nc
+                if not seen[neighbor]:
+                    seen[neighbor] = 1
+                    parents[neighbor] = index
+                    queue.append(neighbor)
+    return parents
+
+def path_from_parents(parents, start, goal, size):
+    """
+    Walk the predecessor links of bfs_parents(start, ...) back from `goal`.
+
+    Returns:
+        list of (row, col) from `start` to `goal` (both included), or None if `goal` was not reached.
+    """
+    start, goal = tuple(start), tuple(goal)
+    if start == goal:
+        return [start]
+    gr, gc = goal
+    if not (0 <= gr < size and 0 <= gc < size):
+        return None
+    index = gr * size + gc
+    if parents[index] == NO_PARENT:
+        return None
+    sr, sc = start
+    start_index = sr * size + sc if 0 <= sr < size and 0 <= sc < size else OFF_GRID_PARENT
+    path = []
+    while index != start_index:
+        path.append(divmod(index, size))
+        index = parents[index]
+    path.append(start)
+    path.reverse()
+    return path
+
+def shortest_path(start, goal, env):
+    """
+    A shortest 4-connected path from `start` to `goal` around obstacles (other agents are ignored).
+
+    With a GridWorld the path descends the cached distance field of `goal`, taking at every cell the
+    first of up / down / left / right that gets one step closer, which is the move select_direction_opt
+    makes when no agent is in the way; other envs (and starts off the free cells) use bfs_parents.
+
+    Returns:
+        list of (row, col) from `start` to `goal` (both included), or None if there is no path.
+    """
+    start, goal = tuple(start), tuple(goal)
+    if start == goal:
+        return [start]
+    size = env.size
+    sr, sc = start
+    distance_field = getattr(env, "distance_field", None)
+    if distance_field is None or not (0 <= sr < size and 0 <= sc < size) or start in env.obstacles:
+        return path_from_parents(bfs_parents(start, size, env.obstacles, goal), start, goal, size)
+
+    field = distance_field(goal)
+    dist = int(field[sr, sc])
+    if dist == UNREACHABLE:
+        return None
+    offsets = tuple(DIRECTION_OFFSETS.values())
+    path = [start]
+    r, c = start
+    while dist:
+        dist -= 1
+        for dr, dc in offsets:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < size and 0 <= nc < size and field[nr, nc] == dist:
+                break
+        r, c = nr, nc
+        path.append((r, c))
+    return path
+
+def shortest_paths(start, goals, env):
+    """
+    Shortest paths from `start` to each of `goals` out of a single BFS (see shortest_path).
+
+    Returns:
+        list: one path (list of (row, col)) or None per goal, None also for goals that are None.
+    """
+    parents = bfs_parents(start, env.size, env.obstacles)
+    return [
+        path_from_parents(parents, start, goal, env.size) if goal is not None else None
+        for goal in goals
+    ]
+
 def select_direction_opt(agent_pos, declared_goal, goal_positions, env):
     """
     Select the direction that reduces the distance to the target goal the fastest.
@@ -56,14 +333,7 @@ def select_direction_opt(agent_pos, declared_goal, goal_positions, env):
     best_dir = None
     best_dist = float('inf')
 
-    directions = {
-        "up": (1, 0),
-        "down": (-1, 0),
-        "left": (0, -1),
-        "right": (0, 1)
-    }
-
-    for dir_str, (dr, dc) in directions.items():
+    for dir_str, (dr, dc) in DIRECTION_OFFSETS.items():
         new_pos = (agent_pos[0] + dr, agent_pos[1] + dc)
         if env.is_valid(new_pos):
             dist = shortest_path_length(new_pos, target_goal, env)
@@ -0,0 +1,247 @@
+import numpy as np
+from core.environment import GridWorld
+from core.utils import UNREACHABLE
+from core.lockstep import DIRECTION_DELTAS, NO_GOAL, FAR
+
+def batched_distance_fields(free, goals, goal_valid):
+    """
+    BFS distance fields for every goal of every scenario in one frontier expansion.
+
+    Args:
+        free: (B, S, S) bool, True for enterable cells (padding is False)
+        goals: (B, G, 2) int goal positions
+        goal_valid: (B, G) bool, False for padding / absent goals
+
+    Returns:
+        np.ndarray: (B, S * S, G) int32 cell-major table, UNREACHABLE (-1) where there is no path.
+    """
+    batch, size = free.shape[0], free.shape[1]
+    num_goals = goals.shape[1]
+    cells = size * size
+    free_flat = free.reshape(batch, cells)
+
+    # Flat index over (scenario, goal, cell)
+    fields = np.full(batch * num_goals * cells, UNREACHABLE, dtype=np.int32)
+    b_idx, g_idx = np.nonzero(goal_valid)
+    goal_cells = goals[b_idx, g_idx, 0] * size + goals[b_idx, g_idx, 1]
+    keep = free_flat[b_idx, goal_cells]
+    frontier = ((b_idx * num_goals + g_idx) * cells + goal_cells)[keep]
+    fields[frontier] = 0
+
+    dist = 0
+    while frontier.size:
+        dist += 1
+        cell = frontier % cells
+        row, col = cell // size, cell % size
+        candidates = np.concatenate([
+            frontier[row < size - 1] + size,
+            frontier[row > 0] - size,
+            frontier[col < size - 1] + 1,
+            frontier[col > 0] - 1,
+        ])
+        scenario = candidates // (num_goals * cells)
+        candidates = candidates[free_flat[scenario, candidates % cells]]
+        candidates = np.sort(candidates[fields[candidates] == UNREACHABLE])
+        if candidates.size:
+            candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+        fields[candidates] = dist
+        frontier = candidates
+
+    return fields.reshape(batch, num_goals, cells).transpose(0, 2, 1).copy()
+
+class VecGridWorld:
+    """
+    N GridWorld scenarios stacked into padded arrays and advanced in lockstep.
+
+    Grids are padded to the largest size (padding cells are blocked) and agent / goal lists to the
+    largest team, so one set of array operations moves every agent of every scenario. Step rules are
+    those of core.lockstep.LockstepEngine, applied per scenario: a scenario stops advancing once all
+    its agents have claimed goals or it reaches max_steps.
+    """
+
+    def __init__(self, envs):
+        envs = list(envs)
+        self.num_envs = len(envs)
+        self.sizes = np.array([env.size for env in envs], dtype=np.int64)
+        self.size = int(self.sizes.max()) if envs else 0
+        self.max_agents = max((len(env.agents) for env in envs), default=0)
+        self.max_goals = max((len(env.goals) for env in envs), default=0)
+
+        B, S, A, G = self.num_envs, self.size, self.max_agents, self.max_goals
+        self.free = np.zeros((B, S, S), dtype=bool)
+        self.positions = np.zeros((B, A, 2), dtype=np.int64)
+        self.active = np.zeros((B, A), dtype=bool)
+        self.goals = np.zeros((B, G, 2), dtype=np.int64)
+        self.goal_open = np.zeros((B, G), dtype=bool)
+
+        for b, env in enumerate(envs):
+            self.free[b, :env.size, :env.size] = env.free_cells()
+            for i, pos in enumerate(env.agents):
+                if pos is not None:
+                    self.positions[b, i] = pos
+                    self.active[b, i] = True
+            for j, pos in enumerate(env.goals):
+                if pos is not None:
+                    self.goals[b, j] = pos
+                    self.goal_open[b, j] = True
+
+        self.reset()
+
+    @classmethod
+    def from_configs(cls, config_paths):
+        return cls(GridWorld(path) for path in config_paths)
+
+    def reset(self):
+        """Rebuild the derived arrays (occupancy, cell -> goal index, distance tables, counters)."""
+        B, S = self.num_envs, self.size
+        b_agents, a_idx = np.nonzero(self.active)
+        self.occupied = np.zeros((B, S, S), dtype=bool)
+        self.occupied[b_agents, self.positions[b_agents, a_idx, 0], self.positions[b_agents, a_idx, 1]] = True
+
+        b_goals, g_idx = np.nonzero(self.goal_open)
+        self.goal_at = np.full((B, S, S), NO_GOAL, dtype=np.int64)
+        self.goal_at[b_goals, self.goals[b_goals, g_idx, 0], self.goals[b_goals, g_idx, 1]] = g_idx
+
+        fields = batched_distance_fields(self.free, self.goals, self.goal_open)
+        fields[fields < 0] = FAR
+        self.fields = fields
+
+        self.steps = np.zeros(B, dtype=np.int64)
+        self.collisions = np.zeros(B, dtype=np.int64)
+        self.running = self.active.any(axis=1)
+
+    def _cells(self, positions):
+        return positions[..., 0] * self.size + positions[..., 1]
+
+    def agent_goal_distances(self):
+        """(B, A, G) BFS distances from each agent's current cell, FAR where unreachable."""
+        cells = self._cells(self.positions)
+        return np.take_along_axis(self.fields, cells[:, :, None], axis=1)
+
+    def total_opt(self):
+        """Per-scenario sum of each agent's distance to its nearest goal (the agents' `total_opt`)."""
+        dists = np.where(self.goal_open[:, None, :], self.agent_goal_distances(), FAR + 1)
+        if self.max_goals == 0:
+            return np.zeros(self.num_envs)
+        closest = dists.min(axis=2)
+        has_goal = self.goal_open.any(axis=1)
+        unreachable = ((closest >= FAR) & self.active & has_goal[:, None]).any(axis=1)
+        totals = np.where(self.active & has_goal[:, None], closest, 0).sum(axis=1).astype(float)
+        totals[unreachable] = float('inf')
+        return totals
+
+    def greedy_targets(self):
+        """
+        Closest-goal assignment with conflicts resolved by agent index, for all scenarios at once.
+        Loops over agent slots (team size), vectorized across scenarios.
+        """
+        B, A = self.num_envs, self.max_agents
+        targets = np.full((B, A), NO_GOAL, dtype=np.int64)
+        if self.max_goals == 0:
+            return targets
+        dists = self.agent_goal_distances()
+        available = self.goal_open.copy()
+        rows = np.arange(B)
+        for a in range(A):
+            row = np.where(available, dists[:, a, :], FAR + 1)
+            goal = np.argmin(row, axis=1)
+            assign = self.active[:, a] & available.any(axis=1)
+            targets[assign, a] = goal[assign]
+            available[rows[assign], goal[assign]] = False
+        return targets
+
+    def step(self, targets):
+        """
+        Advance every running scenario by one step towards `targets` ((B, A) goal indices).
+
+        Returns:
+            (B,) int array of collisions that occurred in this step.
+        """
+        B, S, A = self.num_envs, self.size, self.max_agents
+        moving = self.active & self.running[:, None] & (targets != NO_GOAL)
+        safe_targets = np.where(targets != NO_GOAL, targets, 0)
+        if self.max_goals:
+            moving &= np.take_along_axis(self.goal_open, safe_targets, axis=1)
+
+        # Proposals: first direction (up, down, left, right) strictly minimising distance
+        neighbours = self.positions[:, :, None, :] + DIRECTION_DELTAS[None, None, :, :]
+        rows, cols = neighbours[..., 0], neighbours[..., 1]
+        in_bounds = (rows >= 0) & (rows < S) & (cols >= 0) & (cols < S)
+        rows_c = np.clip(rows, 0, S - 1)
+        cols_c = np.clip(cols, 0, S - 1)
+        b_grid = np.arange(B)[:, None, None]
+        valid = in_bounds & self.free[b_grid, rows_c, cols_c] & ~self.occupied[b_grid, rows_c, cols_c]
+
+        proposals = self.positions.copy()
+        if self.max_goals:
+            dist = self.fields[b_grid, rows_c * S + cols_c, safe_targets[:, :, None]]
+            dist = np.where(valid & moving[:, :, None], dist, FAR)
+            best = np.argmin(dist, axis=2)
+            can_move = np.take_along_axis(dist, best[:, :, None], axis=2)[..., 0] < FAR
+            chosen = np.take_along_axis(neighbours, best[:, :, None, None], axis=2)[:, :, 0, :]
+            proposals[can_move] = chosen[can_move]
+        else:
+            can_move = np.zeros((B, A), dtype=bool)
+
+        # Vertex collisions: hash (scenario, cell); lowest agent index per cell keeps its move
+        new_positions = proposals.copy()
+        b_mov, a_mov = np.nonzero(can_move)
+        step_collisions = np.zeros(B, dtype=np.int64)
+        if b_mov.size:
+            keys = b_mov * S * S + self._cells(proposals[b_mov, a_mov])
+            _, first = np.unique(keys, return_index=True)
+            losers = np.ones(b_mov.size, dtype=bool)
+            losers[first] = False
+            new_positions[b_mov[losers], a_mov[losers]] = self.positions[b_mov[losers], a_mov[losers]]
+            step_collisions = np.bincount(b_mov[losers], minlength=B)
+
+        b_act, a_act = np.nonzero(self.active & self.running[:, None])
+        self.occupied[b_act, self.positions[b_act, a_act, 0], self.positions[b_act, a_act, 1]] = False
+        self.occupied[b_act, new_positions[b_act, a_act, 0], new_positions[b_act, a_act, 1]] = True
+        self.positions = new_positions
+
+        # Goal claiming through the cell -> goal index
+        claimed = self.goal_at[b_act, new_positions[b_act, a_act, 0], new_positions[b_act, a_act, 1]]
+        hit = claimed != NO_GOAL
+        b_hit, a_hit, g_hit = b_act[hit], a_act[hit], claimed[hit]
+        self.active[b_hit, a_hit] = False
+        self.goal_open[b_hit, g_hit] = False
+        self.goal_at[b_hit, self.goals[b_hit, g_hit, 0], self.goals[b_hit, g_hit, 1]] = NO_GOAL
+        self.occupied[b_hit, new_positions[b_hit, a_hit, 0], new_positions[b_hit, a_hit, 1]] = False
+
+        self.collisions += step_collisions
+        self.steps += self.running
+        return step_collisions
+
+    def run_greedy(self, max_steps=100, rank_once=False):
+        """
+        Run the greedy baseline on every scenario.
+
+        Returns:
+            list of (steps, total_opt, failed, collisions) tuples, one per scenario, matching
+            agents/agent_greedy.run (or agent_greedy_rank_once.run with rank_once=True).
+        """
+        total_opt = self.total_opt()
+        targets = self.greedy_targets() if rank_once else None
+        self.running = self.active.any(axis=1) & (self.steps < max_steps)
+        while self.running.any():
+            self.step(self.greedy_targets() if targets is None else targets)
+            self.running = self.active.any(axis=1) & (self.steps < max_steps)
+
+        return [
+            (
+                int(self.steps[b]),
+                int(total_opt[b]) if np.isfinite(total_opt[b]) else float('inf'),
+                bool(self.steps[b] >= max_steps),
+                int(self.collisions[b]),
+            )
+            for b in range(self.num_envs)
+        ]
+
+def run_greedy_batch(config_paths, max_steps=100, rank_once=False, batch_size=4096):
+    """Evaluate the greedy baseline over many YAML configs, `batch_size` scenarios per VecGridWorld."""
+    results = []
+    for start in range(0, len(config_paths), batch_size):
+        vec_env = VecGridWorld.from_configs(config_paths[start:start + batch_size])
+        results.extend(vec_env.run_greedy(max_steps=max_steps, rank_once=rank_once))
+    return results
@@ -3,26 +3,13 @@ import matplotlib.pyplot as plt
 import numpy as np
 from core.environment import GridWorld
 from core.find_optim_sol import compute_distance_matrix, find_best_assignment
+from core.utils import shortest_path
 
 AGENT_COLORS = ['#007bff', '#44af69', '#f5cb5c', '#9966cc', '#b83b5e', '#2f4858']
 
 def find_path_bfs(start, goal, env):
-    from collections import deque
-    visited = set()
-    queue = deque([(start, [start])])
-    while queue:
-        pos, path = queue.popleft()
-        if pos == goal:
-            return path
-        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nr, nc = pos[0] + dr, pos[1] + dc
-            next_pos = (nr, nc)
-            if (0 <= nr < env.size and 0 <= nc < env.size and
-                next_pos not in visited and
-                next_pos not in env.obstacles):
-                visited.add(next_pos)
-                queue.append((next_pos, path + [next_pos]))
-    return [start]  # fallback
+    """Shortest path from `start` to `goal` (core.utils.shortest_path), just [start] if there is none."""
+    return shortest_path(start, goal, env) or [start]
 
 def plot_grid_with_assignment(env, assignment, output_path):
     grid = np.ones((env.size, env.size, 3))
@@ -68,19 +55,17 @@ def plot_grid_with_assignment(env, assignment, output_path):
                         color='black', linewidth=10, solid_capstyle='round')
 
     # Obstacles annotation
-    for r in range(env.size):
-        for c in range(env.size):
-            label = ""
-            if (r, c) in env.obstacles:
-                label = "O"
-            elif any((r, c) == pos for pos in env.goals if pos is not None):
-                idx = next(i for i, pos in enumerate(env.goals) if pos == (r, c))
-                label = chr(65 + idx)
-            if label:
-                ax.text(
-                    c + 0.5, r + 0.5, label,
-                    color="white", fontsize=14, ha='center', va='center', weight='bold', zorder=4
-                )
+    labels = {}
+    for idx, pos in enumerate(env.goals):
+        if pos is not None:
+            labels.setdefault(pos, chr(65 + idx))
+    labels.update({pos: "O" for pos in env.obstacles})
+    for (r, c), label in labels.items():
+        if 0 <= r < env.size and 0 <= c < env.size:
+            ax.text(
+                c + 0.5, r + 0.5, label,
+                color="white", fontsize=14, ha='center', va='center', weight='bold', zorder=4
+            )
 
     # Draw agents as circles
     for idx, agent in enumerate(env.agents):
@@ -93,7 +78,8 @@ def plot_grid_with_assignment(env, assignment, output_path):
                 color="white", fontsize=14, ha='center', va='center', weight='bold', zorder=6
             )
 
-    # Draw arrows for the optimal assignment
+    # Draw arrows for the optimal assignment (one batched BFS for all the assigned goals' fields)
+    env.distance_fields([env.goals[goal_idx] for goal_idx in assignment])
     for agent_idx, goal_idx in enumerate(assignment):
         start = env.agents[agent_idx]
         goal = env.goals[goal_idx]
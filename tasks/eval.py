@@ -3,13 +3,13 @@ import os
 import argparse
 import importlib
 import random
-from core.utils import is_reachable
+from core.environment import GridWorld
 
 MAX_STEPS = 30
 GRID_SIZE = 6
 TRIALS_PER_CONFIG = 2
 RANDOM_SEED = 42
-IMAGE_PATH = "data/grid.png"
+IMAGE_PATH = None  # render in memory; set a path to also write the grid PNG
 NUM_OBSTACLE_WORLDS = 5
 AGENT_GOAL_PAIRS_PER_WORLD = 2
 NUM_OBSTACLES = 3
@@ -37,14 +37,6 @@ def generate_random_obstacles(grid_size, num_obstacles=NUM_OBSTACLES, avoid=set(
             obstacles.add(cell)
     return obstacles
 
-def generate_random_positions(grid_size, count, avoid=set()):
-    positions = set()
-    while len(positions) < count:
-        pos = (random.randint(0, grid_size - 1), random.randint(0, grid_size - 1))
-        if pos not in avoid:
-            positions.add(pos)
-    return list(positions)
-
 def evaluate_random(task_key, run_fn):
     print(f"\n=== Evaluating Random Worlds: {task_key} ===")
     os.makedirs("results", exist_ok=True)
@@ -89,13 +81,14 @@ def evaluate_random(task_key, run_fn):
                         total_cases += 1
             else:
                 # Single-agent evaluation
+                # Sample each agent with a goal in its connected component instead of rejecting unreachable pairs
+                world = GridWorld(GRID_SIZE, obstacles)
                 pairs = []
-                attempts = 0
-                while len(pairs) < AGENT_GOAL_PAIRS_PER_WORLD and attempts < 100:
-                    agent_pos, goal_pos = generate_random_positions(GRID_SIZE, 2, avoid=obstacles)
-                    if agent_pos != goal_pos and is_reachable(GRID_SIZE, agent_pos, goal_pos, obstacles):
-                        pairs.append((agent_pos, goal_pos))
-                    attempts += 1
+                while len(pairs) < AGENT_GOAL_PAIRS_PER_WORLD:
+                    pair = world.sample_pair()
+                    if pair is None:
+                        break
+                    pairs.append(pair)
 
                 for p, (agent_pos, goal_pos) in enumerate(pairs):
                     for t in range(TRIALS_PER_CONFIG):
@@ -145,7 +138,7 @@ if __name__ == "__main__":
         default=[t[0] for t in TASKS],
         help="Which agents to evaluate (e.g. --agents agent1 agent1_yesno)"
     )
-    parser.add_argument("--image-path", type=str, default=IMAGE_PATH, help="Path to grid image file")
+    parser.add_argument("--image-path", type=str, default=IMAGE_PATH, help="Also write the grid image to this file (default: keep it in memory)")
     parser.add_argument("--max-steps", type=int, default=MAX_STEPS, help="Maximum steps per trial")
     parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="Grid size (NxN)")
     parser.add_argument("--trials", type=int, default=TRIALS_PER_CONFIG, help="Trials per agent-goal pair")
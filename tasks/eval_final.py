@@ -2,11 +2,22 @@ import csv
 import os
 import argparse
 import importlib
+import inspect
+import time
+from core.checkpoint import CheckpointStore
+from core.direction_scoring import SCORING_MODES
 from core.environment import GridWorld
-from core.plot import plot_grid_unassigned_labeled
+from core.plot import plot_grid_unassigned_labeled, set_renderer, RENDERERS
+from core.prompt import PROMPT_ENCODINGS, set_prompt_encoding
+from core.prompt_tokens import get_prompt_tokens, set_prompt_tokens
+from core.llm_backend import TRACE_FALLBACKS, make_backend, trace_miss_summary
+from core.request import set_response_cache, set_backend, get_backend
+from core.response_cache import ResponseCache
+from core.telemetry import FIELDS as TELEMETRY_FIELDS, get_telemetry
+from core.usage import get_token_usage
 
 # Constants
-IMAGE_PATH = "data/grid.png"
+IMAGE_PATH = None  # render in memory; set a path to also write the grid PNG
 OUTPUT_DIR = "results_team"
 VISUALIZE = False  # set to True if you want to save visuals
 TRIALS_PER_CASE = 2
@@ -26,23 +37,80 @@ TASKS = [
     ("agent_final_no_distances", "agents.agent_final_no_distances")
 ]
 
-def evaluate_team(task_key, run_fn, cases):
+RESULT_HEADER = ["Case", "Trial", "Steps", "Optimal", "Failed", "Collisions"]
+# Per-episode phase timings and LLM counters (core.telemetry), one row per result row
+TELEMETRY_HEADER = RESULT_HEADER + list(TELEMETRY_FIELDS)
+
+def open_results(log_path, header=RESULT_HEADER):
+    """
+    Open a results CSV for appending. A trailing partial row left by a crash is cut off first, and
+    the header is written if the file is new. Returns (file, csv.writer).
+    """
+    if os.path.exists(log_path):
+        with open(log_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+    write_header = not os.path.exists(log_path) or os.path.getsize(log_path) == 0
+    f = open(log_path, mode='a', newline='')
+    writer = csv.writer(f)
+    if write_header:
+        writer.writerow(header)
+    return f, writer
+
+def append_result(f, writer, row):
+    """Write one row and force it to disk before the trial counts as done."""
+    writer.writerow(row)
+    f.flush()
+    os.fsync(f.fileno())
+
+def telemetry_row(result_row, telemetry):
+    """Result row followed by the telemetry columns of a core.telemetry.Telemetry.row() dict."""
+    return result_row + [telemetry[field] for field in TELEMETRY_FIELDS]
+
+def checkpoint_kwargs(run_fn, store, key):
+    """{'checkpoint': ...} for agents whose run() supports mid-episode checkpoints, else {}."""
+    if store is None or "checkpoint" not in inspect.signature(run_fn).parameters:
+        return {}
+    return {"checkpoint": store.episode(key)}
+
+def scoring_kwargs(run_fn, mode):
+    """{'scoring': mode} for yes/no agents whose run() can switch direction scoring, else {}."""
+    if mode is None or "scoring" not in inspect.signature(run_fn).parameters:
+        return {}
+    return {"scoring": mode}
+
+def parse_scoring(items):
+    """['agent_rank_top2=multichoice', ...] -> {'agent_rank_top2': 'multichoice'}"""
+    modes = {}
+    for item in items or []:
+        key, _, mode = item.partition("=")
+        if mode not in SCORING_MODES:
+            raise ValueError(f"Expected AGENT=MODE with MODE in {SCORING_MODES}, got '{item}'")
+        modes[key] = mode
+    return modes
+
+def evaluate_team(task_key, run_fn, cases, checkpoints=None, scoring=None):
     print(f"\n=== Evaluating Structured Cases: {task_key} ===")
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     log_path = os.path.join(OUTPUT_DIR, f"{task_key}_team_results.csv")
-    summary_path = os.path.join(OUTPUT_DIR, f"{task_key}_team_summary.txt")
-
-    write_header = not os.path.exists(log_path)
-    total_steps = total_opt = fails = total_collisions = 0
-    total_trials = 0
+    telemetry_path = os.path.join(OUTPUT_DIR, f"{task_key}_team_telemetry.csv")
+    completed = load_completed([task_key])[task_key]
+    results = []
+    usage = get_token_usage()
+    usage.reset()
+    prompt_tokens = get_prompt_tokens()
+    prompt_tokens.reset()
 
-    with open(log_path, mode='a', newline='') as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(["Case", "Trial", "Steps", "Optimal", "Failed", "Collisions"])
+    telemetry = get_telemetry()
 
+    f, writer = open_results(log_path)
+    tf, telemetry_writer = open_results(telemetry_path, TELEMETRY_HEADER)
+    with f, tf:
         for case_name, cfg in cases.items():
             for trial in range(TRIALS_PER_CASE):
+                if (case_name, trial + 1) in completed:
+                    continue
                 print(f"\n--- {case_name}, Trial {trial+1} ---")
                 case_config_path = cfg  # it's already a path string to YAML
 
@@ -52,19 +120,49 @@ def evaluate_team(task_key, run_fn, cases):
 
                 case_log_path = os.path.join(OUTPUT_DIR, f"{task_key}_{case_name}_trial{trial+1}_log.csv")
 
+                checkpoint_key = f"{task_key}/{case_name}/t{trial+1}"
+                telemetry.reset()
+                start = time.perf_counter()
                 steps, optimal, failed, collisions = run_fn(
                     config_path=case_config_path,
                     log_path=case_log_path,
                     image_path=IMAGE_PATH,
-                    max_steps=100
+                    max_steps=100,
+                    **checkpoint_kwargs(run_fn, checkpoints, checkpoint_key),
+                    **scoring_kwargs(run_fn, scoring)
                 )
 
-                writer.writerow([case_name, trial+1, steps, optimal, int(failed), collisions])
-                total_steps += steps
-                total_opt += optimal
-                fails += int(failed)
-                total_collisions += collisions
-                total_trials += 1
+                episode_seconds = time.perf_counter() - start
+
+                row = [case_name, trial+1, steps, optimal, int(failed), collisions]
+                append_result(tf, telemetry_writer, telemetry_row(row, telemetry.row(episode_seconds)))
+                append_result(f, writer, row)
+                if checkpoints is not None:
+                    checkpoints.clear(checkpoint_key)
+                results.append((steps, optimal, failed, collisions))
+
+    write_summary(task_key, results, len(cases), usage=usage, prompt_tokens=prompt_tokens)
+
+def write_summary(task_key, results, num_cases, output_dir=None, usage=None, prompt_tokens=None):
+    """
+    Print and save the summary for one agent.
+
+    Args:
+        task_key: agent name, used for the summary file name
+        results: list of (steps, optimal, failed, collisions) per trial
+        num_cases: number of scenarios the trials cover
+        output_dir: defaults to OUTPUT_DIR
+        usage: core.usage.TokenUsage of the agent's API requests, reported when any were made
+        prompt_tokens: core.prompt_tokens.PromptTokens of the agent's prompts (per-section sizes)
+    """
+    summary_path = os.path.join(output_dir or OUTPUT_DIR, f"{task_key}_team_summary.txt")
+    total_trials = len(results)
+    if not total_trials:
+        return
+    total_steps = sum(r[0] for r in results)
+    total_opt = sum(r[1] for r in results)
+    fails = sum(int(r[2]) for r in results)
+    total_collisions = sum(r[3] for r in results)
 
     avg_steps = total_steps / total_trials
     avg_opt = total_opt / total_trials
@@ -72,37 +170,120 @@ def evaluate_team(task_key, run_fn, cases):
     percent = (diff / avg_opt) * 100 if avg_opt else 0
 
     summary_lines = [
-        f"Evaluated {total_trials} trials across {len(cases)} scenarios",
+        f"Evaluated {total_trials} trials across {num_cases} scenarios",
         f"Average optimal path: {avg_opt:.2f}",
         f"Average steps taken: {avg_steps:.2f}",
         f"Difference: {diff:.2f} ({percent:.2f}%)",
         f"Failures (max steps): {fails}/{total_trials}",
         f"Total collisions: {total_collisions}",
     ]
+    if usage is not None and usage.summary():
+        summary_lines.append(usage.summary())
+    if prompt_tokens is not None and prompt_tokens.summary():
+        summary_lines.append(prompt_tokens.summary())
 
     print("\n".join(summary_lines))
     with open(summary_path, "w") as f:
         f.writelines(line + "\n" for line in summary_lines)
 
+def load_cases(config_dir):
+    """Case name -> YAML path for every config in `config_dir`."""
+    cases = {
+        os.path.splitext(f)[0]: os.path.join(config_dir, f)
+        for f in os.listdir(config_dir)
+        if f.endswith(".yaml")
+    }
+    if not cases:
+        raise ValueError(f"No YAML files found in directory: {config_dir}")
+    return cases
+
+def load_completed(task_keys, output_dir=None):
+    """Agent -> set of (case, trial) already recorded in its *_team_results.csv."""
+    completed = {key: set() for key in task_keys}
+    for key in task_keys:
+        log_path = os.path.join(output_dir or OUTPUT_DIR, f"{key}_team_results.csv")
+        if os.path.exists(log_path):
+            with open(log_path, newline="") as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    try:
+                        completed[key].add((row["Case"], int(row["Trial"])))
+                    except (TypeError, ValueError):
+                        continue  # partial row from an interrupted write
+    return completed
+
+def add_llm_cache_args(parser):
+    parser.add_argument("--llm-cache", type=str, default=None, help="SQLite file for caching LLM responses (e.g. data/llm_cache.sqlite)")
+    parser.add_argument("--llm-cache-mode", type=str, choices=["readwrite", "replay"], default="readwrite", help="replay = serve only recorded responses, never call the API")
+    parser.add_argument("--llm-cache-max-mb", type=float, default=None, help="Evict least recently used cache entries beyond this size")
+
+def add_llm_backend_args(parser):
+    parser.add_argument("--llm-backend", type=str, choices=["api", "synthetic", "trace"], default="api", help="synthetic / trace = offline responses, no network (core/llm_backend.py)")
+    parser.add_argument("--llm-trace", type=str, default=None, help="JSONL trace for --llm-backend trace (python -m core.llm_backend CACHE TRACE)")
+    parser.add_argument("--llm-trace-fallback", type=str, choices=TRACE_FALLBACKS, default="none",
+                        help="synthetic = answer requests missing from the trace synthetically instead of failing the trial")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per request for offline backends")
+
+def add_scoring_args(parser):
+    parser.add_argument("--direction-scoring", type=str, nargs="+", default=None, metavar="AGENT=MODE",
+                        help=f"Direction scoring of yes/no agents, MODE in {'/'.join(SCORING_MODES)} (e.g. agent_rank_top2=multichoice)")
+
+def add_prompt_args(parser):
+    parser.add_argument("--prompt-encoding", type=str, choices=PROMPT_ENCODINGS, default="verbose",
+                        help="compact = run-length obstacles, matrix distance table and (r,c) coordinates in the prompts")
+    parser.add_argument("--prompt-tokens", action="store_true", default=os.environ.get("PROMPT_TOKENS") == "1",
+                        help="Report per-section prompt token counts in the summaries (tokenizes every prompt)")
+    parser.add_argument("--prompt-token-log", type=str, default=None, help="Append per-section token counts of every prompt to this JSONL file")
+
+def setup_prompts(encoding="verbose", token_log=None, token_counts=False):
+    set_prompt_encoding(encoding)
+    set_prompt_tokens(token_counts, token_log)
+
+def setup_llm_backend(kind, trace_path=None, latency=0.0, trace_fallback="none"):
+    set_backend(make_backend(kind, trace_path, latency, trace_fallback))
+
+def trace_misses():
+    """Requests the current trace backend did not find so far (0 for other backends)."""
+    return getattr(get_backend(), "misses", 0)
+
+def setup_llm_cache(path, mode="readwrite", max_mb=None):
+    if not path:
+        return
+    max_bytes = int(max_mb * 1024 * 1024) if max_mb else None
+    set_response_cache(ResponseCache(path, read_only=mode == "replay", max_bytes=max_bytes))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate multi-agent systems on coordination scenarios.")
     parser.add_argument("--agents", type=str, choices=[t[0] for t in TASKS], nargs="+", default=[t[0] for t in TASKS])
     parser.add_argument("--config-dir", type=str, default="configs/difficult", help="Directory containing configuration YAML files")
     parser.add_argument("--visualize", action="store_true", help="Save visualizations for each scenario")
+    parser.add_argument("--renderer", type=str, choices=RENDERERS, default="matplotlib", help="Grid image backend (raster = fast NumPy/PIL drawing)")
     parser.add_argument("--trials", type=int, default=TRIALS_PER_CASE, help="Number of trials per case")
+    add_llm_cache_args(parser)
+    add_llm_backend_args(parser)
+    add_scoring_args(parser)
+    add_prompt_args(parser)
+    parser.add_argument("--checkpoint-dir", type=str, default=None, help="Save per-step episode state here so interrupted episodes resume mid-run")
     args = parser.parse_args()
 
     VISUALIZE = args.visualize
     TRIALS_PER_CASE = args.trials
+    set_renderer(args.renderer)
+    setup_prompts(args.prompt_encoding, args.prompt_token_log, args.prompt_tokens)
+
+    if args.llm_backend != "api":
+        setup_llm_backend(args.llm_backend, args.llm_trace, args.llm_latency, args.llm_trace_fallback)
+        print(f"LLM backend: {args.llm_backend} (offline, {args.llm_latency}s per request)")
+
+    if args.llm_cache:
+        setup_llm_cache(args.llm_cache, args.llm_cache_mode, args.llm_cache_max_mb)
+        print(f"LLM response cache: {args.llm_cache} ({args.llm_cache_mode})")
+
+    checkpoints = CheckpointStore(args.checkpoint_dir) if args.checkpoint_dir else None
+    scoring = parse_scoring(args.direction_scoring)
 
     # Load all YAML cases
-    cases = {
-        os.path.splitext(f)[0]: os.path.join(args.config_dir, f)
-        for f in os.listdir(args.config_dir)
-        if f.endswith(".yaml")
-    }
-    if not cases:
-        raise ValueError(f"No YAML files found in directory: {args.config_dir}")
+    cases = load_cases(args.config_dir)
 
     print(f"Found {len(cases)} cases in {args.config_dir}")
     print("Cases:", list(cases.keys())[:10])
@@ -111,14 +292,7 @@ if __name__ == "__main__":
     selected_agents = {key: mod for (key, mod) in TASKS if key in args.agents}
 
     # Load completed trials for each agent
-    completed = {key: set() for key in selected_agents}
-    for key in selected_agents:
-        log_path = os.path.join(OUTPUT_DIR, f"{key}_team_results.csv")
-        if os.path.exists(log_path):
-            with open(log_path, newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    completed[key].add((row["Case"], int(row["Trial"])))
+    completed = load_completed(selected_agents)
 
     print("Completed trials for agents:")
     for key, trials in completed.items():
@@ -142,5 +316,8 @@ if __name__ == "__main__":
 
         module = importlib.import_module(module_path)
         run_fn = module.run
-        evaluate_team(key, run_fn, cases=agent_cases)
+        evaluate_team(key, run_fn, cases=agent_cases, checkpoints=checkpoints, scoring=scoring.get(key))
 
+    miss_summary = trace_miss_summary(trace_misses(), args.llm_trace_fallback)
+    if miss_summary:
+        print(miss_summary)
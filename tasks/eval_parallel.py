@@ -0,0 +1,298 @@
+import argparse
+import contextlib
+import importlib
+import multiprocessing as mp
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from core.checkpoint import CheckpointStore
+from core.environment import GridWorld
+from core.llm_backend import trace_miss_summary
+from core.plot import plot_grid_unassigned_labeled, set_renderer, RENDERERS
+from core.prompt_tokens import PromptTokens, get_prompt_tokens
+from core.ratelimit import shared_rate_limits, install_rate_limits, set_rate_agent
+from core.telemetry import get_telemetry
+from core.usage import TokenUsage, get_token_usage
+from tasks.eval_final import (
+    TASKS, OUTPUT_DIR, TRIALS_PER_CASE,
+    load_cases, load_completed, write_summary, add_llm_cache_args, setup_llm_cache,
+    add_llm_backend_args, setup_llm_backend, trace_misses, add_scoring_args, parse_scoring, scoring_kwargs,
+    add_prompt_args, setup_prompts,
+    open_results, append_result, checkpoint_kwargs, telemetry_row, TELEMETRY_HEADER,
+)
+
+# Non-interactive version of tasks/eval_final.py: every (agent, case, trial) is an independent job
+# run in a worker process. Results go through one writer process, so each *_team_results.csv is
+# appended to by a single owner and rows are never interleaved. The OPENAI_RPM / OPENAI_TPM (and
+# OLLAMA_*) caps are shared by all workers: the parent creates the token buckets in shared memory and
+# every worker draws from them, so the pool as a whole stays within the configured limits. Per-agent
+# budgets (--agent-rpm / --agent-tpm) are shared buckets too, charged for the requests of that agent's trials.
+
+MAX_STEPS = 100
+_worker_options = {}
+_checkpoints = None
+
+def _init_worker(options):
+    global _checkpoints
+    _worker_options.update(options)
+    if options["checkpoint_dir"]:
+        _checkpoints = CheckpointStore(options["checkpoint_dir"])
+    install_rate_limits(options["rate_limits"])
+    set_renderer(options["renderer"])
+    setup_prompts(options["prompt_encoding"], options["prompt_token_log"], options["prompt_tokens"])
+    setup_llm_cache(options["llm_cache"], options["llm_cache_mode"], options["llm_cache_max_mb"])
+    setup_llm_backend(options["llm_backend"], options["llm_trace"], options["llm_latency"], options["llm_trace_fallback"])
+
+def run_job(job):
+    """
+    Run one trial in a worker process.
+
+    Args:
+        job: (task_key, module_path, case_name, config_path, trial)
+
+    Returns:
+        dict with the job fields plus `result` ((steps, optimal, failed, collisions), None on error),
+        `error` (traceback text or None), `seconds`, `usage` (TokenUsage.as_dict() of the trial),
+        `prompt_tokens` (PromptTokens.as_dict() of the trial), `telemetry` (Telemetry.row() of the episode)
+        and `trace_misses` (requests of the trial missing from the --llm-trace replay).
+    """
+    task_key, module_path, case_name, config_path, trial = job
+    output_dir = _worker_options["output_dir"]
+    start = time.perf_counter()
+    result, error = None, None
+    get_token_usage().reset()
+    get_prompt_tokens().reset()
+    get_telemetry().reset()
+    set_rate_agent(task_key)
+    misses = trace_misses()
+    episode_seconds = None
+    try:
+        run_fn = importlib.import_module(module_path).run
+        if _worker_options["visualize"]:
+            env = GridWorld(config_path)
+            plot_grid_unassigned_labeled(env, image_path=f"data/{task_key}_{case_name}_t{trial}.png")
+        case_log_path = os.path.join(output_dir, f"{task_key}_{case_name}_trial{trial}_log.csv")
+        with contextlib.ExitStack() as stack:
+            if _worker_options["quiet"]:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            episode_start = time.perf_counter()
+            steps, optimal, failed, collisions = run_fn(
+                config_path=config_path,
+                log_path=case_log_path,
+                image_path=None,
+                max_steps=_worker_options["max_steps"],
+                **checkpoint_kwargs(run_fn, _checkpoints, checkpoint_key(task_key, case_name, trial)),
+                **scoring_kwargs(run_fn, _worker_options["direction_scoring"].get(task_key))
+            )
+        episode_seconds = time.perf_counter() - episode_start
+        result = (steps, optimal, failed, collisions)
+    except Exception:
+        error = traceback.format_exc()
+    return {
+        "task_key": task_key,
+        "case": case_name,
+        "trial": trial,
+        "result": result,
+        "error": error,
+        "seconds": time.perf_counter() - start,
+        "usage": get_token_usage().as_dict(),
+        "prompt_tokens": get_prompt_tokens().as_dict(),
+        "telemetry": get_telemetry().row(episode_seconds),
+        "trace_misses": trace_misses() - misses,
+    }
+
+def checkpoint_key(task_key, case_name, trial):
+    return f"{task_key}/{case_name}/t{trial}"
+
+def result_writer(queue, output_dir, checkpoint_dir=None):
+    """
+    Writer process: append each (task_key, row, telemetry) from `queue` to the agent's results and
+    telemetry CSVs until a None arrives. A trial's checkpoint is removed only after its row is on disk.
+    """
+    files = {}
+    checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            task_key, row, telemetry = item
+            if task_key not in files:
+                files[task_key] = (
+                    open_results(os.path.join(output_dir, f"{task_key}_team_results.csv")),
+                    open_results(os.path.join(output_dir, f"{task_key}_team_telemetry.csv"), TELEMETRY_HEADER),
+                )
+            (f, writer), (tf, telemetry_writer) = files[task_key]
+            append_result(tf, telemetry_writer, telemetry_row(row, telemetry))
+            append_result(f, writer, row)
+            if checkpoints is not None:
+                checkpoints.clear(checkpoint_key(task_key, row[0], row[1]))
+    finally:
+        for (f, _), (tf, _) in files.values():
+            f.close()
+            tf.close()
+
+def parse_agent_values(items, value_type=int):
+    """['agent_rank_once_bfs_o3=2', ...] -> {'agent_rank_once_bfs_o3': 2}"""
+    values = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        if not value:
+            raise ValueError(f"Expected AGENT=N, got '{item}'")
+        values[key] = value_type(value)
+    return values
+
+def agent_rate_limits(requests_per_minute, tokens_per_minute):
+    """Merge the --agent-rpm / --agent-tpm dicts into agent -> (requests per minute, tokens per minute)."""
+    return {
+        key: (requests_per_minute.get(key), tokens_per_minute.get(key))
+        for key in {**requests_per_minute, **tokens_per_minute}
+    }
+
+def run_parallel(jobs, workers, concurrency, default_concurrency, options, agent_limits=None):
+    """
+    Run `jobs` on a process pool, keeping at most concurrency[agent] (default_concurrency) trials of
+    each agent in flight so slower agents do not crowd out the rest.
+
+    Args:
+        agent_limits: agent -> (requests per minute, tokens per minute) budgets shared by all workers
+            (see agent_rate_limits), on top of the OPENAI_RPM / OPENAI_TPM caps
+
+    Returns:
+        (results, usage, prompt_tokens): dict task_key -> list of (steps, optimal, failed, collisions)
+        for the successful trials, and dicts task_key -> TokenUsage / PromptTokens summed over all its trials
+    """
+    ctx = mp.get_context("spawn")
+    options = dict(options, rate_limits=shared_rate_limits(ctx, agent_limits))
+    queue = ctx.Queue()
+    writer = ctx.Process(target=result_writer, args=(queue, options["output_dir"], options["checkpoint_dir"]))
+    writer.start()
+
+    pending = {}
+    for job in jobs:
+        pending.setdefault(job[0], deque()).append(job)
+    in_flight = {key: 0 for key in pending}
+    results = {key: [] for key in pending}
+    usage = {key: TokenUsage() for key in pending}
+    prompt_tokens = {key: PromptTokens() for key in pending}
+    order = deque(pending)
+    running = {}
+    done_count, failures, misses = 0, 0, 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(options,)) as pool:
+            while pending or running:
+                # Fill free worker slots round-robin across agents, within each agent's concurrency cap
+                stalled = 0
+                while len(running) < workers and pending and stalled < len(order):
+                    key = order[0]
+                    order.rotate(-1)
+                    if key not in pending or in_flight[key] >= concurrency.get(key, default_concurrency):
+                        stalled += 1
+                        continue
+                    stalled = 0
+                    job = pending[key].popleft()
+                    if not pending[key]:
+                        del pending[key]
+                    in_flight[key] += 1
+                    running[pool.submit(run_job, job)] = job
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = running.pop(future)
+                    in_flight[job[0]] -= 1
+                    done_count += 1
+                    outcome = future.result()
+                    usage[job[0]].merge(outcome["usage"])
+                    prompt_tokens[job[0]].merge(outcome["prompt_tokens"])
+                    misses += outcome["trace_misses"]
+                    if outcome["error"] is not None:
+                        failures += 1
+                        print(f"[{done_count}/{len(jobs)}] {job[0]} {job[2]} t{job[4]} ERROR\n{outcome['error']}")
+                        continue
+                    steps, optimal, failed, collisions = outcome["result"]
+                    queue.put((job[0], [job[2], job[4], steps, optimal, int(failed), collisions], outcome["telemetry"]))
+                    results[job[0]].append(outcome["result"])
+                    print(f"[{done_count}/{len(jobs)}] {job[0]} {job[2]} t{job[4]}: steps={steps} optimal={optimal} "
+                          f"failed={int(failed)} collisions={collisions} ({outcome['seconds']:.1f}s)")
+    finally:
+        queue.put(None)
+        writer.join()
+
+    if failures:
+        print(f"{failures} trial(s) raised errors; they were not recorded and will be retried on the next run.")
+    miss_summary = trace_miss_summary(misses, options["llm_trace_fallback"])
+    if miss_summary:
+        print(miss_summary)
+    return results, usage, prompt_tokens
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate multi-agent systems on coordination scenarios in parallel.")
+    parser.add_argument("--agents", type=str, choices=[t[0] for t in TASKS], nargs="+", default=[t[0] for t in TASKS])
+    parser.add_argument("--config-dir", type=str, default="configs/difficult", help="Directory containing configuration YAML files")
+    parser.add_argument("--output-dir", type=str, default=OUTPUT_DIR, help="Where results CSVs, logs and summaries are written")
+    parser.add_argument("--trials", type=int, default=TRIALS_PER_CASE, help="Number of trials per case")
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS, help="Maximum steps per trial")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--max-per-agent", type=int, default=None, help="Default cap on concurrent trials per agent (default: --workers)")
+    parser.add_argument("--agent-concurrency", type=str, nargs="+", default=None, metavar="AGENT=N", help="Per-agent cap on concurrent trials, e.g. agent_rank_once_bfs_o3=2")
+    parser.add_argument("--agent-rpm", type=str, nargs="+", default=None, metavar="AGENT=N", help="Per-agent request budget per minute, shared by all workers, e.g. agent_rank_once_bfs_o3=30")
+    parser.add_argument("--agent-tpm", type=str, nargs="+", default=None, metavar="AGENT=N", help="Per-agent token budget per minute (estimated), shared by all workers")
+    parser.add_argument("--visualize", action="store_true", help="Save visualizations for each scenario")
+    parser.add_argument("--renderer", type=str, choices=RENDERERS, default="matplotlib", help="Grid image backend (raster = fast NumPy/PIL drawing)")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' per-step output (interleaved across workers)")
+    add_llm_cache_args(parser)
+    add_llm_backend_args(parser)
+    add_scoring_args(parser)
+    add_prompt_args(parser)
+    parser.add_argument("--checkpoint-dir", type=str, default=None, help="Save per-step episode state here so interrupted episodes resume mid-run")
+    args = parser.parse_args()
+
+    cases = load_cases(args.config_dir)
+    selected_agents = {key: mod for (key, mod) in TASKS if key in args.agents}
+    os.makedirs(args.output_dir, exist_ok=True)
+    completed = load_completed(selected_agents, args.output_dir)
+
+    jobs = [
+        (key, module_path, case_name, config_path, trial)
+        for key, module_path in selected_agents.items()
+        for case_name, config_path in cases.items()
+        for trial in range(1, args.trials + 1)
+        if (case_name, trial) not in completed[key]
+    ]
+    print(f"Found {len(cases)} cases in {args.config_dir}; {len(jobs)} trials to run "
+          f"({sum(len(v) for v in completed.values())} already recorded) on {args.workers} workers")
+
+    options = {
+        "output_dir": args.output_dir,
+        "max_steps": args.max_steps,
+        "visualize": args.visualize,
+        "renderer": args.renderer,
+        "quiet": not args.verbose,
+        "llm_cache": args.llm_cache,
+        "llm_cache_mode": args.llm_cache_mode,
+        "llm_cache_max_mb": args.llm_cache_max_mb,
+        "llm_backend": args.llm_backend,
+        "llm_trace": args.llm_trace,
+        "llm_trace_fallback": args.llm_trace_fallback,
+        "llm_latency": args.llm_latency,
+        "checkpoint_dir": args.checkpoint_dir,
+        "direction_scoring": parse_scoring(args.direction_scoring),
+        "prompt_encoding": args.prompt_encoding,
+        "prompt_token_log": args.prompt_token_log,
+        "prompt_tokens": args.prompt_tokens,
+    }
+    start = time.perf_counter()
+    agent_limits = agent_rate_limits(parse_agent_values(args.agent_rpm, float), parse_agent_values(args.agent_tpm, float))
+    results, usage, prompt_tokens = run_parallel(
+        jobs, args.workers, parse_agent_values(args.agent_concurrency), args.max_per_agent or args.workers, options, agent_limits
+    )
+    print(f"\nFinished {sum(len(r) for r in results.values())} trials in {time.perf_counter() - start:.1f}s")
+
+    for key, agent_results in results.items():
+        if agent_results:
+            print(f"\n=== {key} ===")
+            write_summary(key, agent_results, len({job[2] for job in jobs if job[0] == key}), args.output_dir,
+                          usage=usage[key], prompt_tokens=prompt_tokens[key])
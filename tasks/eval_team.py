@@ -3,10 +3,10 @@ import os
 import argparse
 import importlib
 from core.environment import GridWorld
-from core.plot import plot_grid_unassigned_labeled
+from core.plot import plot_grid_unassigned_labeled, set_renderer, RENDERERS
 
 # Constants
-IMAGE_PATH = "data/grid.png"
+IMAGE_PATH = None  # render in memory; set a path to also write the grid PNG
 OUTPUT_DIR = "results_team"
 VISUALIZE = False  # set to True if you want to save visuals
 GRID_SIZE = 8
@@ -102,9 +102,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate multi-agent systems on coordination scenarios.")
     parser.add_argument("--agents", type=str, choices=[t[0] for t in TASKS], nargs="+", default=[t[0] for t in TASKS])
     parser.add_argument("--visualize", action="store_true", help="Save visualizations for each scenario")
+    parser.add_argument("--renderer", type=str, choices=RENDERERS, default="matplotlib", help="Grid image backend (raster = fast NumPy/PIL drawing)")
 
     args = parser.parse_args()
     VISUALIZE = args.visualize
+    set_renderer(args.renderer)
 
     selected_agents = {key: mod for (key, mod) in TASKS if key in args.agents}
     for key, module_path in selected_agents.items():
@@ -0,0 +1,41 @@
+import pickle
+from core.checkpoint import RowLog
+
+def make_row(step):
+    return {"step": step, "agent_id": 1, "position_before": (0, step), "chosen_direction": "right"}
+
+def write_rows(log, steps):
+    for step in steps:
+        log.append(make_row(step))
+
+def test_row_log_resume_drops_rows_after_the_checkpoint(tmp_path):
+    expected = tmp_path / "expected.csv"
+    log = RowLog(str(expected))
+    write_rows(log, range(6))
+    log.close()
+
+    path = tmp_path / "log.csv"
+    log = RowLog(str(path))
+    write_rows(log, range(3))
+    saved = pickle.loads(pickle.dumps(log.state()))
+    write_rows(log, range(3, 5))  # lost to the crash: rewritten after resuming
+    log.close()
+
+    resumed = RowLog(str(path), saved)
+    write_rows(resumed, range(3, 6))
+    resumed.close()
+    assert path.read_text() == expected.read_text()
+
+def test_row_log_state_does_not_grow_with_the_rows(tmp_path):
+    log = RowLog(str(tmp_path / "log.csv"))
+    write_rows(log, range(2))
+    small = len(pickle.dumps(log.state()))
+    write_rows(log, range(2, 500))
+    assert len(pickle.dumps(log.state())) <= small + 8  # only the size field widens
+    log.close()
+
+def test_row_log_without_path_writes_nothing(tmp_path):
+    log = RowLog(None)
+    write_rows(log, range(3))
+    assert log.state() == {"fieldnames": None, "size": 0}
+    log.close()
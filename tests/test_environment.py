@@ -0,0 +1,38 @@
+import copy
+import pickle
+import numpy as np
+import pytest
+from core.environment import AGENT, GOAL, OBSTACLE, GridWorld
+
+def make_env():
+    env = GridWorld(5, obstacles=[(1, 1), (2, 3)])
+    env.agents = [(0, 0), (4, 4), None]
+    env.goals = [(0, 4), None, (4, 0)]
+    env.distance((0, 0), (0, 4))  # fill the distance field cache
+    return env
+
+@pytest.mark.parametrize("clone", [
+    lambda env: pickle.loads(pickle.dumps(env)),
+    lambda env: pickle.loads(pickle.dumps(env, protocol=pickle.HIGHEST_PROTOCOL)),
+    copy.deepcopy,
+], ids=["pickle", "pickle-highest", "deepcopy"])
+def test_gridworld_round_trip(clone):
+    env = make_env()
+    restored = clone(env)
+
+    assert restored.size == env.size
+    assert restored.obstacles == env.obstacles
+    assert restored.agents == env.agents
+    assert restored.goals == env.goals
+    assert np.array_equal(restored.occupancy, env.occupancy)
+    assert restored.occupancy[1, 1] == OBSTACLE
+    assert restored.is_valid((0, 1)) and not restored.is_valid((2, 3))
+    assert restored.distance((0, 0), (0, 4)) == env.distance((0, 0), (0, 4))
+
+    # The restored lists keep tracking the occupancy, independently of the original
+    restored.agents[0] = (0, 1)
+    restored.goals.pop()
+    assert restored.occupancy[0, 0] == 0 and restored.occupancy[0, 1] == AGENT
+    assert restored.occupancy[4, 0] == 0
+    assert env.agents[0] == (0, 0) and env.occupancy[0, 0] == AGENT
+    assert env.occupancy[4, 0] == GOAL
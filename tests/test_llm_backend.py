@@ -0,0 +1,25 @@
+import json
+import pytest
+from core.llm_backend import SyntheticBackend, TraceBackend, make_backend
+from core.response_cache import ReplayMiss
+
+PARAMS = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Should Agent 1 move **up**?"}]}
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    path.write_text(json.dumps({"key": "not-a-recorded-request", "text": "YES", "logprobs": None}) + "\n")
+    return str(path)
+
+def test_trace_replay_raises_on_miss_by_default(trace_path):
+    backend = make_backend("trace", trace_path)
+    assert isinstance(backend, TraceBackend) and backend.fallback is None
+    with pytest.raises(ReplayMiss):
+        backend.respond("chat.completions", PARAMS)
+    assert backend.misses == 1
+
+def test_trace_replay_synthetic_fallback_is_opt_in(trace_path):
+    backend = make_backend("trace", trace_path, trace_fallback="synthetic")
+    assert isinstance(backend.fallback, SyntheticBackend)
+    backend.respond("chat.completions", PARAMS)
+    assert backend.misses == 1
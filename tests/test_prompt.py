@@ -0,0 +1,28 @@
+import pytest
+from benchmarks.run import Scenario, prompt_kwargs
+from core import prompt
+
+# The yes/no builders the agents score directions with (core.direction_scoring)
+SCORED_BUILDERS = [
+    (prompt.build_yesno_prompt_single_obs_v2, "the agent"),
+    (prompt.build_yesno_prompt_multiagent, "Agent A1"),
+    (prompt.build_yesno_prompt_unassigned_goals, "Agent 1"),
+    (prompt.build_direction_selection_prompt, "Agent 1"),
+]
+
+def choice_prompt(builder):
+    kwargs = prompt_kwargs(Scenario(8, 4), builder)
+    kwargs.pop("direction")
+    return prompt.build_direction_choice_prompt(builder, ["up", "left"], kwargs.pop("agent_pos"), **kwargs)
+
+@pytest.mark.parametrize("builder, subject", SCORED_BUILDERS, ids=lambda item: getattr(item, "__name__", item))
+def test_direction_choice_prompt_reuses_yesno_context(builder, subject):
+    text = choice_prompt(builder)
+    assert text.count("### Question") == 1
+    assert f"Which direction should {subject} move next?" in text
+    assert "YES" not in text and "Should " not in text
+    assert text.count(prompt.PROMPT_BREAK) == 1
+
+def test_direction_choice_prompt_rejects_builders_without_a_question():
+    with pytest.raises(ValueError):
+        choice_prompt(prompt.build_yesno_prompt_single_obs)
@@ -0,0 +1,44 @@
+import contextlib
+import glob
+import io
+import pytest
+import agents.agent_rank_top2 as agent_rank_top2
+from core.llm_backend import SyntheticBackend
+from core.request import set_backend, set_response_cache
+
+CONFIGS = sorted(glob.glob("configs/difficult/*.yaml"))
+
+@pytest.fixture
+def synthetic_backend():
+    set_response_cache(None)
+    set_backend(SyntheticBackend())
+    yield
+    set_backend(None)
+
+def run_recording_negotiations(monkeypatch, tmp_path, config_path, max_steps=10):
+    """Run agent_rank_top2 on `config_path`; returns the episode result and every negotiation outcome."""
+    outcomes = []
+    run_negotiation = agent_rank_top2.run_negotiation
+
+    def recording_negotiation(*args, **kwargs):
+        outcome = run_negotiation(*args, **kwargs)
+        outcomes.append(outcome)
+        return outcome
+
+    monkeypatch.setattr(agent_rank_top2, "run_negotiation", recording_negotiation)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = agent_rank_top2.run(
+            config_path=config_path, log_path=str(tmp_path / "log.csv"), image_path=None, max_steps=max_steps
+        )
+    return result, outcomes
+
+@pytest.mark.parametrize("config_path", CONFIGS)
+def test_agent_rank_top2_runs_offline(synthetic_backend, monkeypatch, tmp_path, config_path):
+    (steps, optimal, failed, collisions), outcomes = run_recording_negotiations(monkeypatch, tmp_path, config_path)
+    assert steps <= 10
+    for outcome in outcomes:
+        assert outcome is None or len(set(outcome.values())) == len(outcome)
+
+def test_agent_rank_top2_negotiates(synthetic_backend, monkeypatch, tmp_path):
+    _, outcomes = run_recording_negotiations(monkeypatch, tmp_path, "configs/difficult/case_8_goal_stealing.yaml")
+    assert any(outcome is not None for outcome in outcomes)
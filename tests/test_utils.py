@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+import pytest
+from core.environment import GridWorld
+from core.utils import shortest_path, shortest_paths, shortest_path_length
+
+OBSTACLES = [(1, 1), (2, 3), (3, 1)]
+
+def path_length(path):
+    return len(path) - 1 if path is not None else float('inf')
+
+@pytest.mark.parametrize("env", [
+    GridWorld(5, obstacles=OBSTACLES),
+    SimpleNamespace(size=5, obstacles=set(OBSTACLES)),  # no distance fields: plain BFS
+], ids=["gridworld", "plain"])
+@pytest.mark.parametrize("start", [(-1, 0), (0, -1), (5, 2), (2, 5), (1, 1), (-1, -1), (7, 7), (0, 0)])
+def test_shortest_path_agrees_with_distance(env, start):
+    goals = [(4, 4), (0, 0), (2, 2), (2, 3)]
+    for goal, path in zip(goals, shortest_paths(start, goals, env)):
+        expected = shortest_path_length(start, goal, env)
+        assert path_length(shortest_path(start, goal, env)) == expected
+        assert path_length(path) == expected
+        if path is not None and len(path) > 1:
+            assert path[0] == start and path[-1] == goal
+            for (r0, c0), (r1, c1) in zip(path[1:], path[2:]):
+                assert abs(r0 - r1) + abs(c0 - c1) == 1 and (r1, c1) not in env.obstacles